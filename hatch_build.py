@@ -0,0 +1,30 @@
+"""Hatch build hook to regenerate the template index before building."""
+
+from __future__ import annotations
+
+import importlib.util
+from pathlib import Path
+from typing import Any
+
+from hatchling.builders.hooks.plugin.interface import BuildHookInterface
+
+
+class TemplateIndexBuildHook(BuildHookInterface):  # type: ignore[misc]
+    """Make sure 'lice2/template_index.py' matches the bundled templates."""
+
+    PLUGIN_NAME = "template-index"
+
+    def initialize(self, version: str, build_data: dict[str, Any]) -> None:  # noqa: ARG002
+        """Run 'lice2/build_index.py' without importing the 'lice2' package.
+
+        The package '__init__' needs our runtime dependencies, which are not
+        available in the isolated build environment.
+        """
+        path = Path(self.root) / "lice2" / "build_index.py"
+        spec = importlib.util.spec_from_file_location("build_index", path)
+        if spec is None or spec.loader is None:  # pragma: no cover
+            msg = f"Unable to load the template index builder from {path}"
+            raise RuntimeError(msg)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.write_index()
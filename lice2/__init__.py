@@ -1,7 +1,29 @@
 """Package initialisation."""
 
-from pathlib import Path
+from __future__ import annotations
 
-from single_source import get_version
+import sys
+import time
 
-__version__ = get_version(__name__, Path(__file__).parent.parent)
+# when the package was first imported, so '--profile' can show how long the
+# imports took before the command started
+IMPORT_STARTED = (time.perf_counter_ns(), sys.getallocatedblocks())
+
+
+def __getattr__(name: str) -> str | None:
+    """Look up the version only when it is asked for.
+
+    Finding it goes through 'importlib.metadata', which is slow to import, so
+    this keeps 'import lice2.api' quick for library users, and 'lice2.client'
+    quick to start.
+    """
+    if name == "__version__":
+        from pathlib import Path  # noqa: PLC0415
+
+        from single_source import get_version  # noqa: PLC0415
+
+        version = get_version(__name__, Path(__file__).parent.parent)
+        globals()["__version__"] = version
+        return version
+    message = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(message)
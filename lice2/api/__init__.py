@@ -1,5 +1,27 @@
 """Module to implement the public API of the package."""
 
+from typing import TYPE_CHECKING, Any
+
 from .api import Lice
+from .observers import LiceEvent, add_observer, remove_observer
+
+if TYPE_CHECKING:
+    from .async_api import AsyncLice
+
+__all__ = [
+    "AsyncLice",
+    "Lice",
+    "LiceEvent",
+    "add_observer",
+    "remove_observer",
+]
+
+
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    """Import 'AsyncLice' when first used, as 'asyncio' is slow to import."""
+    if name == "AsyncLice":
+        from .async_api import AsyncLice  # noqa: PLC0415
 
-__all__ = ["Lice"]
+        return AsyncLice
+    message = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(message)
@@ -2,19 +2,53 @@
 
 from __future__ import annotations
 
+import time
+from io import StringIO
+from typing import TYPE_CHECKING, TextIO
+
 from lice2.api.exceptions import (
     HeaderNotFoundError,
     InvalidYearError,
     LanguageNotFoundError,
     LicenseNotFoundError,
 )
+from lice2.api.observers import LiceEvent, notify, process_observers
+from lice2.cache import template_cache
 from lice2.constants import LANGS, LICENSES
-from lice2.helpers import (
+from lice2.rendering import (
     format_license,
-    generate_license,
     get_local_year,
-    load_package_template,
+    iter_format_license,
+    iter_lines,
 )
+from lice2.template_index import TEMPLATE_INDEX
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from lice2.api.observers import Observer
+    from lice2.template import CompiledTemplate
+
+
+def check_request(
+    license_name: str, language: str = "", *, header: bool = False
+) -> None:
+    """Make sure a license (or header) can be generated in a language.
+
+    Raises:
+        LicenseNotFoundError: If the license is unknown.
+        HeaderNotFoundError: If a header is wanted but there is none.
+        LanguageNotFoundError: If the language is unknown.
+    """
+    info = TEMPLATE_INDEX.get(license_name)
+    if header:
+        if info is None or not info.header:
+            raise HeaderNotFoundError(license_name)
+    elif info is None:
+        raise LicenseNotFoundError(license_name)
+
+    if language and language not in LANGS:
+        raise LanguageNotFoundError(language)
 
 
 class Lice:
@@ -52,6 +86,8 @@ class Lice:
         if len(self.year) != 4:  # noqa: PLR2004
             raise InvalidYearError(year) from None
 
+        self._observers: list[Observer] = []
+
     def get_licenses(self) -> list[str]:
         """Return a list of all licenses in the system.
 
@@ -80,6 +116,53 @@ class Lice:
         """
         return list(LANGS.keys())
 
+    def identify_license(self, text: str) -> str | None:
+        """Return the name of the bundled license the text is, or None.
+
+        The text can have any organization, project and year in it, be
+        commented for any of the supported languages and be wrapped
+        differently, but must otherwise be the whole license.
+
+        Args:
+            text: The text of a LICENSE or COPYING file.
+
+        Example:
+            >>> lice = Lice(organization="Awesome Co.", project="my_project")
+            >>> with open("vendor/foo/LICENSE") as f:
+            ...     lice.identify_license(f.read())
+            'mit'
+        """
+        # this pulls in the header and walker modules, which most users of
+        # the API never need
+        from lice2.identify import identify_text  # noqa: PLC0415
+
+        return identify_text(text)
+
+    def similar_licenses(
+        self, text: str, top: int = 3
+    ) -> list[tuple[str, float]]:
+        """Return the bundled licenses most like the text, with their scores.
+
+        Use this when 'identify_license' finds no exact match, such as for a
+        license with a clause reworded. The scores go from 0 to 1, and are
+        the share of runs of a few words that the text and the license have
+        in common. Licenses with less than about a fifth in common are left
+        out, so there may be fewer than 'top' of them.
+
+        Args:
+            text: The text of a LICENSE or COPYING file.
+            top: The most licenses to return, best first.
+
+        Example:
+            >>> lice = Lice(organization="Awesome Co.", project="my_project")
+            >>> with open("vendor/foo/LICENSE") as f:
+            ...     lice.similar_licenses(f.read())
+            [('bsd3', 0.88), ('edl', 0.84), ('bsd2', 0.78)]
+        """
+        from lice2.identify import similar_licenses  # noqa: PLC0415
+
+        return similar_licenses(text, top)
+
     def get_license(self, license_name: str, language: str = "") -> str:
         """Return the text of the given license.
 
@@ -91,23 +174,7 @@ class Lice:
             >>> lice = Lice(organization="Awesome Co.", project="my_project")
             >>> licence_txt = Lice.get_license("mit")
         """
-        args = {
-            "year": self.year,
-            "organization": self.organization,
-            "project": self.project,
-        }
-        try:
-            template = load_package_template(license_name)
-        except FileNotFoundError:
-            raise LicenseNotFoundError(license_name) from None
-
-        content = generate_license(template, args)
-
-        try:
-            out = format_license(content, language)
-        except KeyError:
-            raise LanguageNotFoundError(language) from None
-        return out.getvalue()
+        return self._observe("get_license", license_name, language)
 
     def get_header(self, license_name: str, language: str = "") -> str:
         """Return the header of the given license suitable for source files.
@@ -127,20 +194,272 @@ class Lice:
             >>> lice = Lice(organization="Awesome Co.", project="my_project")
             >>> header_txt = Lice.get_header("mit", "py")
         """
-        args = {
+        return self._observe("get_header", license_name, language, header=True)
+
+    def write_license(
+        self, fp: TextIO, license_name: str, language: str = ""
+    ) -> None:
+        """Write the text of the given license to an open text file.
+
+        This gives the same text as 'get_license', but it is written out a
+        line at a time rather than built up as one string first.
+
+        Args:
+            fp: The file (or any object with a 'writelines' method) to write to.
+            license_name: The name of the license to write.
+            language: [OPTIONAL] If set, comment the license for that language.
+
+        Nothing is written if the license or language is unknown.
+
+        Example:
+            >>> lice = Lice(organization="Awesome Co.", project="my_project")
+            >>> with open("LICENSE", "w") as f:
+            ...     lice.write_license(f, "mit")
+        """
+        self._write(fp, "write_license", license_name, language)
+
+    def write_header(
+        self, fp: TextIO, license_name: str, language: str = ""
+    ) -> None:
+        """Write the header of the given license to an open text file.
+
+        This gives the same text as 'get_header', but it is written out a line
+        at a time rather than built up as one string first.
+
+        Args:
+            fp: The file (or any object with a 'writelines' method) to write to.
+            license_name: The name of the license to write the header for.
+            language: The language to format the header for.
+
+        Nothing is written if the license, header or language is unknown.
+
+        Example:
+            >>> lice = Lice(organization="Awesome Co.", project="my_project")
+            >>> with open("header.py", "w") as f:
+            ...     lice.write_header(f, "apache", "py")
+        """
+        self._write(fp, "write_header", license_name, language, header=True)
+
+    def render_many(
+        self, requests: Iterable[tuple[str, str, bool]]
+    ) -> dict[tuple[str, str, bool], str]:
+        """Return the text for many license / language combinations at once.
+
+        Each template is only loaded and rendered once, and the rendered text
+        is then reused for every language it is requested in. This is much
+        quicker than calling 'get_license' or 'get_header' in a loop when the
+        same license is needed for several languages.
+
+        Args:
+            requests: An iterable of (license_name, language, header) tuples.
+                Use an empty language for plain text, and set header to True
+                for the source file header instead of the full license.
+
+        Returns:
+            A dict mapping each requested tuple to the generated text.
+
+        Raises the same exceptions as 'get_license' and 'get_header' for the
+        first request that is invalid.
+
+        Example:
+            >>> lice = Lice(organization="Awesome Co.", project="my_project")
+            >>> texts = lice.render_many(
+            ...     [("apache", lang, True) for lang in ("py", "js", "rs")]
+            ... )
+            >>> texts[("apache", "js", True)]
+        """
+        observers = self._active_observers()
+        bodies: dict[tuple[str, bool], str] = {}
+        results: dict[tuple[str, str, bool], str] = {}
+        for request in requests:
+            if request in results:
+                continue
+            start = time.perf_counter_ns()
+            license_name, language, header = request
+            body = bodies.get((license_name, header))
+            cache_hit = True
+            if body is None:
+                body, cache_hit = self._render(license_name, header=header)
+                bodies[license_name, header] = body
+            text = results[request] = self._format(body, language)
+            if observers:
+                notify(
+                    observers,
+                    LiceEvent(
+                        "render_many",
+                        license_name,
+                        language,
+                        header,
+                        cache_hit,
+                        len(text.encode("utf-8")),
+                        time.perf_counter_ns() - start,
+                    ),
+                )
+        return results
+
+    def add_observer(self, observer: Observer) -> None:
+        """Call 'observer' with a 'LiceEvent' for every call on this object.
+
+        Use 'lice2.api.add_observer' instead to observe every object.
+
+        Example:
+            >>> lice = Lice(organization="Awesome Co.", project="my_project")
+            >>> lice.add_observer(lambda event: print(event.elapsed_ns))
+        """
+        self._observers.append(observer)
+
+    def remove_observer(self, observer: Observer) -> None:
+        """Stop calling an observer added with 'add_observer'.
+
+        Raises:
+            ValueError: If the observer was not added.
+        """
+        self._observers.remove(observer)
+
+    def _generate(
+        self, license_name: str, language: str = "", *, header: bool = False
+    ) -> tuple[str, bool]:
+        """Return the text, and whether the template was already cached.
+
+        This does the work of 'get_license' and 'get_header', without telling
+        the observers.
+
+        Raises:
+            LicenseNotFoundError: If the license is unknown.
+            HeaderNotFoundError: If a header is wanted but there is none.
+            LanguageNotFoundError: If the language is unknown.
+        """
+        body, cache_hit = self._render(license_name, header=header)
+        return self._format(body, language), cache_hit
+
+    def _active_observers(self) -> list[Observer]:
+        """Return the observers to tell about a call, both ours and global."""
+        if not process_observers:
+            return self._observers
+        return [*self._observers, *process_observers]
+
+    def _observe(
+        self,
+        operation: str,
+        license_name: str,
+        language: str,
+        *,
+        header: bool = False,
+    ) -> str:
+        """Generate the text, telling any observers how it went."""
+        observers = self._active_observers()
+        if not observers:
+            return self._generate(license_name, language, header=header)[0]
+
+        start = time.perf_counter_ns()
+        text, cache_hit = self._generate(license_name, language, header=header)
+        notify(
+            observers,
+            LiceEvent(
+                operation,
+                license_name,
+                language,
+                header,
+                cache_hit,
+                len(text.encode("utf-8")),
+                time.perf_counter_ns() - start,
+            ),
+        )
+        return text
+
+    def _lookup(
+        self, license_name: str, *, header: bool = False
+    ) -> tuple[CompiledTemplate, bool]:
+        """Return the compiled template, and whether it was already cached.
+
+        Raises:
+            LicenseNotFoundError: If the license is unknown.
+            HeaderNotFoundError: If a header is wanted but there is none.
+        """
+        check_request(license_name, header=header)
+        entry, cache_hit = template_cache.lookup(license_name, header=header)
+        return entry.compiled, cache_hit
+
+    def _context(self) -> dict[str, str]:
+        """Return the context to render the templates with."""
+        return {
             "year": self.year,
             "organization": self.organization,
             "project": self.project,
         }
-        try:
-            template = load_package_template(license_name, header=True)
-        except FileNotFoundError:
-            raise HeaderNotFoundError(license_name) from None
 
-        content = generate_license(template, args)
+    def _render(
+        self, license_name: str, *, header: bool = False
+    ) -> tuple[str, bool]:
+        """Render the given license template with our context.
+
+        Returns the text, and whether the template was already cached.
 
+        Raises:
+            LicenseNotFoundError: If the license is unknown.
+            HeaderNotFoundError: If a header is wanted but there is none.
+        """
+        compiled, cache_hit = self._lookup(license_name, header=header)
+        return compiled.render(self._context()), cache_hit
+
+    def _write(
+        self,
+        fp: TextIO,
+        operation: str,
+        license_name: str,
+        language: str,
+        *,
+        header: bool = False,
+    ) -> None:
+        """Render, format and write a template to the file a line at a time.
+
+        Raises:
+            LicenseNotFoundError: If the license is unknown.
+            HeaderNotFoundError: If a header is wanted but there is none.
+            LanguageNotFoundError: If the language is unknown.
+        """
+        start = time.perf_counter_ns()
+        check_request(license_name, language, header=header)
+        compiled, cache_hit = self._lookup(license_name, header=header)
+        lines = iter_lines(compiled.iter_render(self._context()))
+        out = iter_format_license(lines, language)
+
+        observers = self._active_observers()
+        if not observers:
+            fp.writelines(out)
+            return
+
+        size = 0
+
+        def counted(pieces: Iterator[str]) -> Iterator[str]:
+            nonlocal size
+            for piece in pieces:
+                size += len(piece.encode("utf-8"))
+                yield piece
+
+        fp.writelines(counted(out))
+        notify(
+            observers,
+            LiceEvent(
+                operation,
+                license_name,
+                language,
+                header,
+                cache_hit,
+                size,
+                time.perf_counter_ns() - start,
+            ),
+        )
+
+    @staticmethod
+    def _format(content: str, language: str) -> str:
+        """Format rendered text as a comment block for the given language.
+
+        Raises:
+            LanguageNotFoundError: If the language is unknown.
+        """
         try:
-            out = format_license(content, language)
+            out = format_license(StringIO(content), language)
         except KeyError:
             raise LanguageNotFoundError(language) from None
         return out.getvalue()
@@ -0,0 +1,270 @@
+"""An asyncio version of the API, for use from web services and the like.
+
+'AsyncLice' mirrors 'Lice', but never blocks the event loop. Text that has
+been generated before is served straight from memory. Anything else is loaded
+and formatted in a bounded thread pool, and concurrent requests for the same
+template (or the same text) share a single load instead of each doing their
+own.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar
+
+from lice2.api.api import Lice, check_request
+from lice2.api.observers import LiceEvent, notify, process_observers
+from lice2.cache import template_cache
+from lice2.rendering import get_local_year, load_compiled_template
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable, Iterable
+    from concurrent.futures import Executor
+    from types import TracebackType
+
+    from lice2.api.observers import Observer
+
+T = TypeVar("T")
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_TEXTS = 256
+
+TextKey = tuple[str, str, bool]
+
+
+class AsyncLice:
+    """List or Generate a License from many supported licenses, with asyncio."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        organization: str,
+        project: str,
+        year: str | int = get_local_year(),
+        *,
+        executor: Optional[Executor] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_texts: int = DEFAULT_MAX_TEXTS,
+    ) -> None:
+        """Initialize the AsyncLice object.
+
+        Args:
+            organization: The name of the organization that owns the project.
+            project: The name of the project.
+            year: The year to use in the license. Defaults to the current year.
+                (can be a string or an integer)
+            executor: [OPTIONAL] The executor to load and format templates in.
+                If not given, a thread pool of 'max_workers' threads is created
+                when first needed, and shut down by 'aclose'.
+            max_workers: The size of the thread pool, if we create it.
+            max_texts: How many generated texts to keep in memory.
+
+        Raises:
+            InvalidYearError: If the year is not valid.
+
+        Example:
+        >>> lice = AsyncLice(organization="Awesome Co.", project="my_project")
+        """
+        self._lice = Lice(organization, project, year)
+        self._executor = executor
+        self._own_executor = executor is None
+        self._max_workers = max_workers
+        self.max_texts = max_texts
+        self._texts: OrderedDict[TextKey, str] = OrderedDict()
+        self._loading: dict[Hashable, asyncio.Future[Any]] = {}
+        self._observers: list[Observer] = []
+
+    @property
+    def organization(self) -> str:
+        """The organization the licenses are generated for."""
+        return self._lice.organization
+
+    @property
+    def project(self) -> str:
+        """The project the licenses are generated for."""
+        return self._lice.project
+
+    @property
+    def year(self) -> str:
+        """The year used in the licenses."""
+        return self._lice.year
+
+    async def __aenter__(self) -> AsyncLice:  # noqa: PYI034
+        """Use the object as an async context manager."""
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Shut down the thread pool when leaving the context."""
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Shut down the thread pool, if we created it.
+
+        An executor passed in is left for its owner to shut down.
+        """
+        if self._own_executor and self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(
+                None, partial(executor.shutdown, wait=True)
+            )
+
+    async def get_licenses(self) -> list[str]:
+        """Return a list of all licenses in the system.
+
+        See 'Lice.get_licenses'.
+        """
+        return self._lice.get_licenses()
+
+    async def get_languages(self) -> list[str]:
+        """Return a list of all supported languages.
+
+        See 'Lice.get_languages'.
+        """
+        return self._lice.get_languages()
+
+    async def get_license(self, license_name: str, language: str = "") -> str:
+        """Return the text of the given license.
+
+        See 'Lice.get_license', this raises the same exceptions.
+
+        Example:
+            >>> lice = AsyncLice(organization="Awesome Co.", project="proj")
+            >>> licence_txt = await lice.get_license("mit")
+        """
+        return await self._text("get_license", (license_name, language, False))
+
+    async def get_header(self, license_name: str, language: str = "") -> str:
+        """Return the header of the given license suitable for source files.
+
+        See 'Lice.get_header', this raises the same exceptions.
+
+        Example:
+            >>> lice = AsyncLice(organization="Awesome Co.", project="proj")
+            >>> header_txt = await lice.get_header("apache", "py")
+        """
+        return await self._text("get_header", (license_name, language, True))
+
+    async def render_many(
+        self, requests: Iterable[tuple[str, str, bool]]
+    ) -> dict[tuple[str, str, bool], str]:
+        """Return the text for many license / language combinations at once.
+
+        The requests are worked on concurrently. See 'Lice.render_many', this
+        raises the same exceptions for the first request that is invalid.
+
+        Example:
+            >>> lice = AsyncLice(organization="Awesome Co.", project="proj")
+            >>> texts = await lice.render_many(
+            ...     [("apache", lang, True) for lang in ("py", "js", "rs")]
+            ... )
+        """
+        unique = list(dict.fromkeys(requests))
+        for license_name, language, header in unique:
+            check_request(license_name, language, header=header)
+        texts = await asyncio.gather(
+            *(self._text("render_many", key) for key in unique)
+        )
+        return dict(zip(unique, texts))
+
+    def add_observer(self, observer: Observer) -> None:
+        """Call 'observer' with a 'LiceEvent' for every call on this object.
+
+        See 'Lice.add_observer'. The time in each event includes any wait for
+        the thread pool.
+        """
+        self._observers.append(observer)
+
+    def remove_observer(self, observer: Observer) -> None:
+        """Stop calling an observer added with 'add_observer'.
+
+        Raises:
+            ValueError: If the observer was not added.
+        """
+        self._observers.remove(observer)
+
+    async def _text(self, operation: str, key: TextKey) -> str:
+        """Return the generated text for a request, from memory if we can."""
+        start = time.perf_counter_ns()
+        license_name, language, header = key
+        text = self._texts.get(key)
+        cache_hit = True
+        if text is not None:
+            self._texts.move_to_end(key)
+        else:
+            check_request(license_name, language, header=header)
+
+            # make sure the template is loaded first, so requests for the same
+            # template in different languages share the one load
+            if template_cache.peek(license_name, header=header) is None:
+                cache_hit = False
+                await self._shared(
+                    (license_name, header),
+                    partial(
+                        load_compiled_template, license_name, header=header
+                    ),
+                )
+
+            generate = partial(
+                self._lice._generate,  # noqa: SLF001
+                license_name,
+                language,
+                header=header,
+            )
+            text = (await self._shared(key, generate))[0]
+            self._remember(key, text)
+
+        observers = self._observers
+        if process_observers:
+            observers = [*observers, *process_observers]
+        if observers:
+            notify(
+                observers,
+                LiceEvent(
+                    operation,
+                    license_name,
+                    language,
+                    header,
+                    cache_hit,
+                    len(text.encode("utf-8")),
+                    time.perf_counter_ns() - start,
+                ),
+            )
+        return text
+
+    async def _shared(self, key: Hashable, func: Callable[[], T]) -> T:
+        """Run 'func' in the executor, sharing the result with any others.
+
+        If the same key is already being worked on, we wait for that instead
+        of starting it again. The work is shielded, so one caller being
+        cancelled doesn't cancel it for the rest.
+        """
+        future: Optional[asyncio.Future[T]] = self._loading.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_executor(), func)
+            self._loading[key] = future
+            future.add_done_callback(lambda _: self._loading.pop(key, None))
+        return await asyncio.shield(future)
+
+    def _remember(self, key: TextKey, text: str) -> None:
+        """Keep a generated text, dropping the oldest if there are too many."""
+        self._texts[key] = text
+        self._texts.move_to_end(key)
+        while len(self._texts) > self.max_texts:
+            self._texts.popitem(last=False)
+
+    def _get_executor(self) -> Executor:
+        """Return the executor, creating our thread pool if needed."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="lice2"
+            )
+        return self._executor
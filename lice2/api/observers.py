@@ -0,0 +1,64 @@
+"""Observers that are told about every call of the API, for metrics.
+
+An observer is any callable that takes a 'LiceEvent'. They can be added to a
+single 'Lice' object, or for the whole process with 'add_observer'. When none
+are registered the API only pays for checking two empty lists.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+class LiceEvent(NamedTuple):
+    """What happened in one call of the API.
+
+    Attributes:
+        operation: The method called, such as 'get_license' or 'render_many'.
+        license_name: The license that was generated.
+        language: The language it was formatted for, empty for plain text.
+        header: True if it was the source header rather than the license.
+        cache_hit: True if no template had to be read from disk.
+        size: The size of the text produced, in UTF-8 bytes.
+        elapsed_ns: How long it took, in nanoseconds.
+    """
+
+    operation: str
+    license_name: str
+    language: str
+    header: bool
+    cache_hit: bool
+    size: int
+    elapsed_ns: int
+
+
+Observer = Callable[[LiceEvent], None]
+
+# the process-wide observers, only changed in place so it can be imported
+process_observers: list[Observer] = []
+
+
+def add_observer(observer: Observer) -> None:
+    """Call 'observer' with an event for every API call in this process."""
+    process_observers.append(observer)
+
+
+def remove_observer(observer: Observer) -> None:
+    """Stop calling a process-wide observer.
+
+    Raises:
+        ValueError: If the observer was not added.
+    """
+    process_observers.remove(observer)
+
+
+def notify(observers: Iterable[Observer], event: LiceEvent) -> None:
+    """Send an event to each of the observers in turn.
+
+    Exceptions from an observer are not caught, so a broken one is noticed.
+    """
+    for observer in observers:
+        observer(event)
@@ -0,0 +1,227 @@
+"""Generate many license files in one go, from a TOML manifest.
+
+This is for repositories with lots of packages that each need a license file
+of their own. The manifest lists an output path for each file, along with any
+of the license, organization, project, year and language that differ from the
+defaults:
+
+    [defaults]
+    license = "mit"
+    organization = "Awesome Co."
+
+    [[files]]
+    path = "packages/foo/LICENSE"
+    project = "foo"
+
+    [[files]]
+    path = "packages/bar/LICENSE.txt"
+    license = "apache"
+    year = "2019"
+
+Each template is only loaded once, and the text for each distinct set of
+values is only rendered and formatted once. The files are written from a
+thread pool, as that is where the time goes for a big manifest, and any that
+already have the right content are left alone.
+"""
+
+from __future__ import annotations
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional
+
+import rtoml
+
+from lice2.constants import LANGS, LICENSES
+from lice2.rendering import (
+    get_suffix,
+    iter_format_license,
+    iter_lines,
+    load_compiled_template,
+)
+from lice2.writer import write_if_changed
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from pathlib import Path
+
+# the possible outcomes for each file
+WRITTEN = "written"
+UNCHANGED = "unchanged"
+ERROR = "error"
+
+ENTRY_KEYS = frozenset(
+    {"path", "license", "organization", "project", "year", "language"}
+)
+DEFAULT_KEYS = ENTRY_KEYS - {"path"}
+
+YEAR_RE = re.compile(r"\d{4}")
+
+
+class ManifestError(ValueError):
+    """The manifest could not be read, or has an invalid entry in it."""
+
+
+class BatchEntry(NamedTuple):
+    """One license file to generate.
+
+    The organization is None if it is to be guessed, as that needs the git
+    config and is only worth doing once for the whole manifest.
+    """
+
+    path: Path
+    license_name: str
+    organization: Optional[str]
+    project: str
+    year: str
+    language: str
+
+
+def _check_table(
+    table: Any,  # noqa: ANN401
+    allowed: frozenset[str],
+    where: str,
+) -> dict[str, str]:
+    """Return a table from the manifest with all the values as strings.
+
+    Raises:
+        ManifestError: If it is not a table, or has a key we don't know.
+    """
+    if not isinstance(table, dict):
+        message = f"{where} must be a table"
+        raise ManifestError(message)
+    unknown = sorted(set(table) - allowed)
+    if unknown:
+        message = f"Unknown key(s) in {where}: {', '.join(unknown)}"
+        raise ManifestError(message)
+    return {key: str(value) for key, value in table.items()}
+
+
+def _make_entry(values: dict[str, str], base: Path, where: str) -> BatchEntry:
+    """Check the values for one file, filling in what we can from the path.
+
+    Raises:
+        ManifestError: If a value is missing or invalid.
+    """
+    if "path" not in values:
+        message = f"{where} has no 'path'"
+        raise ManifestError(message)
+    path = base / values["path"]
+    license_name = values["license"]
+    if license_name not in LICENSES:
+        message = f"{where} has an unknown license '{license_name}'"
+        raise ManifestError(message)
+    year = values["year"]
+    if not YEAR_RE.fullmatch(year):
+        message = f"{where} has an invalid year '{year}'"
+        raise ManifestError(message)
+    # like '--file', the suffix picks the language unless it is given
+    language = values.get("language", get_suffix(path.name) or "")
+    if language and language not in LANGS:
+        message = f"{where} has an unknown language '{language}'"
+        raise ManifestError(message)
+    return BatchEntry(
+        path,
+        license_name,
+        values.get("organization"),
+        values.get("project", path.resolve().parent.name),
+        year,
+        language,
+    )
+
+
+def load_manifest(
+    manifest: Path, *, license_name: str, year: str
+) -> list[BatchEntry]:
+    """Read the files to generate from a manifest.
+
+    Relative paths are taken from the folder the manifest is in. The license
+    and year given here are used if the manifest doesn't set them.
+
+    Raises:
+        ManifestError: If the manifest can't be read or is invalid.
+    """
+    try:
+        data = rtoml.loads(manifest.read_text(encoding="utf-8"))
+    except (OSError, UnicodeDecodeError, rtoml.TomlParsingError) as exc:
+        message = f"Could not read {manifest}: {exc}"
+        raise ManifestError(message) from None
+
+    defaults = {"license": license_name, "year": year}
+    defaults.update(
+        _check_table(data.get("defaults", {}), DEFAULT_KEYS, "[defaults]")
+    )
+    files = data.get("files", [])
+    if not isinstance(files, list) or not files:
+        message = f"{manifest} has no [[files]] to generate"
+        raise ManifestError(message)
+
+    base = manifest.parent
+    entries = []
+    for number, table in enumerate(files, start=1):
+        where = f"[[files]] entry {number}"
+        values = {**defaults, **_check_table(table, ENTRY_KEYS, where)}
+        entries.append(_make_entry(values, base, where))
+    return entries
+
+
+def render_entries(
+    entries: Iterable[BatchEntry], *, organization: str, legacy: bool = False
+) -> Iterator[tuple[BatchEntry, str]]:
+    """Yield the text of the license file for each entry.
+
+    'organization' is used for the entries that don't have one. Text that has
+    been rendered or formatted already is reused, so a license with the same
+    values is only rendered once however many languages it is wanted in.
+    """
+    bodies: dict[tuple[str, str, str, str], list[str]] = {}
+    texts: dict[tuple[str, str, str, str, str], str] = {}
+    for entry in entries:
+        org = organization if entry.organization is None else entry.organization
+        key = (entry.license_name, org, entry.project, entry.year)
+        text_key = (*key, entry.language)
+        text = texts.get(text_key)
+        if text is None:
+            lines = bodies.get(key)
+            if lines is None:
+                compiled = load_compiled_template(entry.license_name)
+                context = {
+                    "organization": org,
+                    "project": entry.project,
+                    "year": entry.year,
+                }
+                lines = bodies[key] = list(
+                    iter_lines(compiled.iter_render(context))
+                )
+            text = texts[text_key] = "".join(
+                iter_format_license(lines, entry.language, legacy=legacy)
+            )
+        yield entry, text
+
+
+def _write_file(path: Path, text: str) -> str:
+    """Write one license file if it has changed, making its folder if needed."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        written = write_if_changed(path, text.encode("utf-8"))
+    except OSError:
+        return ERROR
+    return WRITTEN if written else UNCHANGED
+
+
+def write_entries(
+    rendered: Iterable[tuple[BatchEntry, str]], *, workers: int = 8
+) -> Iterator[tuple[BatchEntry, str]]:
+    """Write out the rendered files, yielding the outcome for each entry.
+
+    The outcomes are yielded in the same order as the entries.
+    """
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="lice2-batch"
+    ) as pool:
+        futures = [
+            (entry, pool.submit(_write_file, entry.path, text))
+            for entry, text in rendered
+        ]
+        for entry, future in futures:
+            yield entry, future.result()
@@ -0,0 +1,108 @@
+"""Generate the static template index for LICE2.
+
+The index lists every bundled license along with the variables its template
+uses, whether a source header template is available and the size of the
+template in bytes. It is written out as a plain Python module
+('lice2/template_index.py') so that importing it is just a cheap load of a
+cached '.pyc', whether we are installed as files, a wheel or a zip.
+
+This is run automatically by the build hook in 'hatch_build.py', or can be run
+by hand after adding or changing a template:
+
+    python -m lice2.build_index
+
+Note that this module must only use the standard library, as it is loaded by
+the build backend before any of our dependencies are installed.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+from pathlib import Path
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+INDEX_FILE = Path(__file__).parent / "template_index.py"
+
+LICENSE_RE = re.compile(r"template-(?P<name>[a-z0-9_]+)\.txt")
+VARIABLE_RE = re.compile(r"\{\{ (?P<key>\w+) \}\}")
+MAX_LINE_LENGTH = 80
+
+INDEX_HEADER = '''\
+"""Static index of the license templates bundled with LICE2.
+
+DO NOT EDIT - this file is generated by 'lice2/build_index.py', run
+'python -m lice2.build_index' to regenerate it after changing the templates.
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple
+
+
+class LicenseInfo(NamedTuple):
+    """Details of a single bundled license template."""
+
+    name: str
+    variables: tuple[str, ...]
+    header: bool
+    size: int
+
+
+TEMPLATE_INDEX: dict[str, LicenseInfo] = {
+'''
+
+
+def build_index(
+    template_dir: Path = TEMPLATE_DIR,
+) -> dict[str, tuple[tuple[str, ...], bool, int]]:
+    """Scan the template folder and return the index data.
+
+    Returns a dict mapping the license name to a tuple of (variables, header
+    available, size in bytes), sorted by license name.
+    """
+    index: dict[str, tuple[tuple[str, ...], bool, int]] = {}
+    for path in sorted(template_dir.iterdir()):
+        match = LICENSE_RE.fullmatch(path.name)
+        if not match or not path.is_file():
+            continue
+        content = path.read_bytes()
+        variables = tuple(
+            sorted(set(VARIABLE_RE.findall(content.decode("utf-8"))))
+        )
+        name = match["name"]
+        header = (template_dir / f"template-{name}-header.txt").is_file()
+        index[name] = (variables, header, len(content))
+    return index
+
+
+def render_index(index: dict[str, tuple[tuple[str, ...], bool, int]]) -> str:
+    """Return the source code of the index module for the given index."""
+    lines = [INDEX_HEADER]
+    for name, (variables, header, size) in index.items():
+        args = f"{name!r}, {variables!r}, {header!r}, {size!r}"
+        entry = f"    {name!r}: LicenseInfo({args}),\n"
+        if len(entry) > MAX_LINE_LENGTH + 1:
+            # wrap the same way 'ruff format' would
+            entry = f"    {name!r}: LicenseInfo(\n        {args}\n    ),\n"
+        lines.append(entry.replace("'", '"'))
+    lines.append("}\n")
+    return "".join(lines)
+
+
+def write_index(
+    template_dir: Path = TEMPLATE_DIR, index_file: Path = INDEX_FILE
+) -> bool:
+    """Regenerate the index module, returning True if it was changed."""
+    source = render_index(build_index(template_dir))
+    if index_file.is_file() and index_file.read_text("utf-8") == source:
+        return False
+    index_file.write_text(source, encoding="utf-8")
+    return True
+
+
+if __name__ == "__main__":  # pragma: no cover
+    changed = write_index()
+    sys.stdout.write(
+        f"{'Updated' if changed else 'Unchanged'}: {INDEX_FILE.name}\n"
+    )
@@ -0,0 +1,197 @@
+"""Process-wide cache for the license templates bundled with the package.
+
+Templates are read from the package resources and compiled the first time they
+are needed, then kept in a bounded LRU cache keyed by (license_name, header).
+This saves re-opening and decoding the same files on every call, which matters
+for long-running users of the API.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from importlib import resources
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from lice2.template import CompiledTemplate
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+
+CacheKey = tuple[str, bool]
+
+
+class CachedTemplate(NamedTuple):
+    """A template held in the cache, both raw and compiled."""
+
+    text: str
+    compiled: CompiledTemplate
+    size: int
+
+
+class CacheStats(NamedTuple):
+    """A snapshot of the cache counters."""
+
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes_held: int
+    max_entries: int
+    max_bytes: int
+
+
+def read_package_template(license_name: str, *, header: bool = False) -> str:
+    """Read a license template from the package resources.
+
+    Raises:
+        FileNotFoundError: If the template doesn't exist
+    """
+    filename = (
+        f"template-{license_name}-header.txt"
+        if header
+        else f"template-{license_name}.txt"
+    )
+    package_name = __package__ or __name__.split(".")[0]
+    template_file = resources.files(package_name) / "templates" / filename
+    return template_file.read_text(encoding="utf-8")
+
+
+class TemplateCache:
+    """A thread-safe LRU cache of templates, bounded by entries and bytes."""
+
+    def __init__(
+        self,
+        loader: Callable[..., str] = read_package_template,
+        *,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        """Create an empty cache.
+
+        Args:
+            loader: Called as 'loader(license_name, header=header)' to read a
+                template that is not in the cache.
+            max_entries: The maximum number of templates to hold.
+            max_bytes: The maximum total size (UTF-8 bytes) of the templates.
+        """
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[CacheKey, CachedTemplate] = OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self) -> int:
+        """Return the number of templates in the cache."""
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        """Check if a (license_name, header) key is cached."""
+        return key in self._entries
+
+    def lookup(
+        self, license_name: str, *, header: bool = False
+    ) -> tuple[CachedTemplate, bool]:
+        """Return the template and whether it was served from the cache.
+
+        Raises:
+            FileNotFoundError: If the template doesn't exist
+        """
+        key = (license_name, header)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry, True
+            self._misses += 1
+
+        # load outside the lock so a slow read doesn't hold up other lookups
+        text = self._loader(license_name, header=header)
+        entry = CachedTemplate(
+            text, CompiledTemplate(text), len(text.encode("utf-8"))
+        )
+
+        with self._lock:
+            if key not in self._entries and entry.size <= self.max_bytes:
+                self._entries[key] = entry
+                self._bytes += entry.size
+                self._evict()
+        return entry, False
+
+    def get(self, license_name: str, *, header: bool = False) -> CachedTemplate:
+        """Return the template, loading it into the cache if needed.
+
+        Raises:
+            FileNotFoundError: If the template doesn't exist
+        """
+        return self.lookup(license_name, header=header)[0]
+
+    def peek(
+        self, license_name: str, *, header: bool = False
+    ) -> Optional[CachedTemplate]:
+        """Return the template if already cached, without loading it."""
+        with self._lock:
+            return self._entries.get((license_name, header))
+
+    def configure(
+        self,
+        *,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        """Change the size limits, evicting templates if needed."""
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self) -> None:
+        """Remove all templates from the cache, keeping the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def reset_stats(self) -> None:
+        """Zero the hit, miss and eviction counters."""
+        with self._lock:
+            self._hits = self._misses = self._evictions = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=len(self._entries),
+                bytes_held=self._bytes,
+                max_entries=self.max_entries,
+                max_bytes=self.max_bytes,
+            )
+
+    def _evict(self) -> None:
+        """Drop the least recently used templates until within the limits.
+
+        Must be called with the lock held.
+        """
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or self._bytes > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self._evictions += 1
+
+
+template_cache = TemplateCache()
@@ -0,0 +1,153 @@
+"""The 'lice' command, run in the background daemon when there is one.
+
+Starting Python and importing 'lice2.core' takes far longer than the work in
+most commands, which matters when 'lice' is run from git hooks and editors.
+'lice --daemon' starts a server that has done all of that already (see
+'lice2.daemon'). This module is what the 'lice' script runs: it imports only
+a few standard modules, sends the arguments to the daemon over a Unix socket
+and writes out what comes back.
+
+If the daemon isn't running, or can't run the command, the command is run in
+this process instead, exactly as if there were no daemon.
+
+Each message to the daemon is its length as 4 bytes followed by that much
+JSON. The replies are frames of a kind byte and a 4 byte length followed by
+the data, see the kinds below.
+
+Even 'typing' is slow to import next to the rest, so it isn't used here.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import struct
+import sys
+
+# the kinds of frame the daemon sends back
+STDOUT = b"o"
+STDERR = b"e"
+EXIT = b"x"
+# the daemon can't run this command, so run it here instead
+FALLBACK = b"f"
+
+FRAME = struct.Struct(">cI")
+LENGTH = struct.Struct(">I")
+
+# options that must run here, as they manage the daemon or look at the shell
+LOCAL_OPTIONS = frozenset(
+    {"--daemon", "--stop-daemon", "--install-completion", "--show-completion"}
+)
+
+
+def get_socket_path() -> str:
+    """Return the path of the daemon's socket.
+
+    This is '$LICE_DAEMON_SOCKET' if set, otherwise 'lice/daemon.sock' in the
+    runtime folder, or in the cache folder if there isn't one.
+    """
+    path = os.environ.get("LICE_DAEMON_SOCKET")
+    if path:
+        return path
+    folder = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get(
+        "XDG_CACHE_HOME",
+        os.path.join(os.path.expanduser("~"), ".cache"),  # noqa: PTH111, PTH118
+    )
+    return os.path.join(folder, "lice", "daemon.sock")  # noqa: PTH118
+
+
+def pack_message(message: dict[str, object]) -> bytes:
+    """Return a message to the daemon, ready to be sent."""
+    data = json.dumps(message).encode("utf-8")
+    return LENGTH.pack(len(data)) + data
+
+
+def connect(path: str) -> socket.socket | None:
+    """Return a connection to the daemon, or None if it isn't running."""
+    family = getattr(socket, "AF_UNIX", None)
+    if family is None or not os.path.exists(path):  # noqa: PTH110
+        return None
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def build_request(argv: list[str]) -> dict[str, object]:
+    """Return the request to run a command, with what it needs from here.
+
+    If our output is a terminal, the daemon is told to use colour and our
+    width, as it can't find out for itself.
+    """
+    env = dict(os.environ)
+    if sys.stdout.isatty():
+        if "NO_COLOR" not in env:
+            env.setdefault("FORCE_COLOR", "1")
+        try:  # noqa: SIM105 - 'contextlib' is slow to import
+            env.setdefault("COLUMNS", str(os.get_terminal_size().columns))
+        except OSError:
+            pass
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return {
+        "argv": argv,
+        "cwd": os.getcwd(),  # noqa: PTH109
+        "env": env,
+        "umask": umask,
+        "package": os.path.dirname(os.path.abspath(__file__)),  # noqa: PTH100, PTH120
+    }
+
+
+def run_in_daemon(argv: list[str], path: str | None = None) -> int | None:
+    """Run the command in the daemon, streaming its output to ours.
+
+    Returns the exit status, or None if the daemon isn't running or can't run
+    the command, so it should be run here instead.
+    """
+    sock = connect(path or get_socket_path())
+    if sock is None:
+        return None
+    with sock, sock.makefile("rb") as replies:
+        try:
+            sock.sendall(pack_message(build_request(argv)))
+        except OSError:
+            return None
+        started = False
+        while True:
+            header = replies.read(FRAME.size)
+            if len(header) < FRAME.size:
+                break
+            kind, size = FRAME.unpack(header)
+            data = replies.read(size)
+            if kind == FALLBACK:
+                return None
+            started = True
+            if kind == EXIT:
+                return int(data)
+            stream = sys.stdout if kind == STDOUT else sys.stderr
+            stream.buffer.write(data)
+            stream.buffer.flush()
+    if not started:
+        return None
+    sys.stderr.write("The lice daemon stopped before the command finished.\n")
+    return 1
+
+
+def main() -> None:
+    """Run 'lice', in the daemon if possible.
+
+    Set 'LICE_NO_DAEMON' to always run it in this process.
+    """
+    argv = sys.argv[1:]
+    if not os.environ.get("LICE_NO_DAEMON") and LOCAL_OPTIONS.isdisjoint(argv):
+        status = run_in_daemon(argv)
+        if status is not None:
+            sys.exit(status)
+
+    from lice2.core import app  # noqa: PLC0415
+
+    app()
@@ -1,10 +1,9 @@
 """Setup configuration for lice2."""
 
-from rich.console import Console
-from rich.panel import Panel
 from simple_toml_settings import TOMLSettings
 
 from lice2.constants import LICENSES
+from lice2.profiling import SETTINGS_STAGE, profiler
 
 
 class Settings(TOMLSettings):
@@ -25,6 +24,10 @@ def check_default_license() -> str:
     automatically by 'Typer'
     """
     if settings.default_license not in LICENSES:
+        # only load 'rich' when there is something to show
+        from rich.console import Console  # noqa: PLC0415
+        from rich.panel import Panel  # noqa: PLC0415
+
         console = Console(width=80)
         error_text = (
             f"[red]Invalid default license '[b]{settings.default_license}"
@@ -47,10 +50,11 @@ def check_default_license() -> str:
     return settings.default_license
 
 
-settings = Settings.get_instance(
-    "lice",
-    xdg_config=True,
-    auto_create=False,
-    allow_missing_file=True,
-    schema_version="1",
-)
+with profiler.stage(SETTINGS_STAGE):
+    settings = Settings.get_instance(
+        "lice",
+        xdg_config=True,
+        auto_create=False,
+        allow_missing_file=True,
+        schema_version="1",
+    )
@@ -1,7 +1,6 @@
 """Define constants for the LICE2 package."""
 
-import re
-from importlib import resources
+from lice2.template_index import TEMPLATE_INDEX, LicenseInfo
 
 # To extend language formatting sopport with a new language, add an item in
 # LANGS dict:
@@ -98,27 +97,25 @@ LANG_CMT = {
 
 
 def get_available_licenses() -> list[str]:
-    """Get a sorted list of available license names from template files.
+    """Get a sorted list of available license names.
 
-    Searches for templates in the current package's 'templates' directory
-    with pattern 'template-{name}.txt'.
+    This is read from the static template index which is generated from the
+    'templates' directory when the package is built (see 'build_index.py'), so
+    we don't need to scan the templates on every import.
 
     Returns:
         List of license names sorted alphabetically
     """
-    # Get the current package name
-    package_name = __package__ or __name__.split(".")[0]
+    return list(TEMPLATE_INDEX)
 
-    template_path = resources.files(package_name).joinpath("templates")
-    licenses = []
 
-    for file in template_path.iterdir():
-        if file.is_file():
-            match = re.match(r"template-([a-z0-9_]+)\.txt", file.name)
-            if match:
-                licenses.append(match.groups()[0])
+def get_license_info(license_name: str) -> LicenseInfo:
+    """Return the indexed details of a bundled license.
 
-    return sorted(licenses)
+    Raises:
+        KeyError: If there is no such license
+    """
+    return TEMPLATE_INDEX[license_name]
 
 
 LICENSES = get_available_licenses()
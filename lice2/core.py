@@ -1,67 +1,142 @@
-"""Main core of the application."""
+"""Main core of the application.
+
+The commands other than 'generate' import the modules they need when they
+run, so those modules don't slow down starting every other command.
+"""
 
 from __future__ import annotations
 
 import sys
+from collections import Counter
 from pathlib import Path
 from types import SimpleNamespace
 from typing import Any, Callable, Optional
 
 import typer
-from rich import print as rprint
-from rich.markup import escape
+from typer.core import TyperCommand, TyperGroup
 
+import lice2
 from lice2 import __version__
 from lice2.config import check_default_license, settings
-from lice2.constants import LANGS, LICENSES
+from lice2.constants import LANGS, LICENSES, get_license_info
 from lice2.helpers import (
-    copy_to_clipboard,
-    format_license,
+    ListFormat,
     generate_header,
-    generate_license,
     get_context,
     get_lang,
     get_local_year,
     get_metadata,
+    get_organization,
     get_suffix,
-    guess_organization,
     list_languages,
     list_licenses,
     list_vars,
-    load_file_template,
-    load_package_template,
+    load_compiled_template,
+    render_file_template,
+    render_package_template,
     validate_license,
     validate_year,
+    write_output,
 )
+from lice2.profiling import profiler
+
+CONTEXT_SETTINGS = {"help_option_names": ["-h", "--help"]}
+
+# set in the context's meta when 'LiceGroup' put in the default command
+DEFAULT_COMMAND_META = "lice2.default_command"
+
+
+class LiceContext(typer.Context):
+    """Leave the default command out of the command path, unless typed.
+
+    So usage and error messages for 'lice mit' or 'lice -h' show 'lice' and
+    not 'lice generate', which the user never typed.
+    """
+
+    @property
+    def command_path(self) -> str:
+        """Return the command path, as the user would have typed it."""
+        if self.parent is not None and self.meta.get(DEFAULT_COMMAND_META):
+            return self.parent.command_path
+        return super().command_path
+
+
+class LiceCommand(TyperCommand):
+    """The default command, see 'LiceContext'."""
 
-app = typer.Typer(rich_markup_mode="rich")
+    context_class = LiceContext
+
+
+class LiceGroup(TyperGroup):
+    """Run the 'generate' command unless another command is named.
+
+    This keeps 'lice mit', 'lice --header' and so on working exactly as they
+    always have, while allowing extra commands such as 'lice apply'.
+    """
+
+    context_class = LiceContext
+    default_command = "generate"
+
+    # the context is always a 'LiceContext', whichever click typer uses
+    def parse_args(self, ctx: typer.Context, args: list[str]) -> list[str]:  # type: ignore[override]
+        """Insert the default command name if no other command was given."""
+        group_options = {
+            opt
+            for param in self.get_params(ctx)
+            for opt in param.opts
+            if opt not in ctx.help_option_names
+        }
+        if not args or (
+            args[0] not in self.commands and args[0] not in group_options
+        ):
+            args = [self.default_command, *args]
+            ctx.meta[DEFAULT_COMMAND_META] = True
+        return super().parse_args(ctx, args)
+
+
+app = typer.Typer(
+    cls=LiceGroup, rich_markup_mode="rich", context_settings=CONTEXT_SETTINGS
+)
 
 
 @app.command(
+    name=LiceGroup.default_command,
+    cls=LiceCommand,
     help=(
         "Generates a license template with context variables, and "
         "optionally write this to a file."
     ),
-    context_settings={"help_option_names": ["-h", "--help"]},
+    epilog=(
+        "Other commands: [b]lice apply[/b] (add headers to source files), "
+        "[b]lice check[/b] (check source files have headers), "
+        "[b]lice update-year[/b] (bring the years in headers up to date), "
+        "[b]lice relicense[/b] (swap the headers for another license's), "
+        "[b]lice batch[/b] (generate many license files from a manifest). "
+        "Run [b]lice <command> --help[/b] for their options."
+    ),
+    context_settings=CONTEXT_SETTINGS,
 )
 def main(  # noqa: PLR0913
+    ctx: typer.Context,
     license_name: str = typer.Argument(
         default=check_default_license(),
         help=f"The license to generate, one of: {', '.join(LICENSES)}",
         callback=validate_license,
         metavar="[license]",
     ),
-    organization: str = typer.Option(
-        guess_organization(),
+    organization: Optional[str] = typer.Option(
+        None,
         "--org",
         "-o",
         help='Organization, defaults to .gitconfig or os.environ["USER"]',
+        show_default=False,
     ),
-    project: str = typer.Option(
-        Path.cwd().name,
+    project: Optional[str] = typer.Option(
+        None,
         "--proj",
         "-p",
         help="Name of project, defaults to name of current directory",
+        show_default=False,
     ),
     template_path: Optional[str] = typer.Option(
         None,
@@ -83,7 +158,7 @@ def main(  # noqa: PLR0913
         help=(
             "Format output for language source file, one of: "
             f"{', '.join(LANGS.keys())} "
-            f"[dim]{escape('[default: txt]')}[/dim]"
+            "[dim]\\[default: txt][/dim]"
         ),
         show_default=False,
     ),
@@ -122,6 +197,15 @@ def main(  # noqa: PLR0913
         "--languages",
         help="List available source code formatting languages",
     ),
+    list_format: ListFormat = typer.Option(  # noqa: B008
+        ListFormat.TABLE,
+        "--format",
+        help=(
+            "How to show --licenses and --languages, 'tsv' and 'json' are "
+            "quicker for other tools to read"
+        ),
+        case_sensitive=False,
+    ),
     legacy: bool = typer.Option(
         False,
         "--legacy",
@@ -142,14 +226,56 @@ def main(  # noqa: PLR0913
             "languages This allows easy integration into other tools."
         ),
     ),
+    profile: bool = typer.Option(
+        False,
+        "--profile",
+        envvar="LICE_PROFILE",
+        help="Show the time taken by each stage on stderr",
+    ),
+    profile_json: Optional[str] = typer.Option(
+        None,
+        "--profile-json",
+        envvar="LICE_PROFILE_JSON",
+        help="Write the time taken by each stage to a JSON file",
+        show_default=False,
+    ),
+    profile_pstats: Optional[str] = typer.Option(
+        None,
+        "--profile-pstats",
+        envvar="LICE_PROFILE_PSTATS",
+        help="Write a cProfile '.pstats' file for the run",
+        show_default=False,
+    ),
+    start_daemon: bool = typer.Option(
+        False,
+        "--daemon",
+        help=(
+            "Start a background server that keeps lice loaded, so later "
+            "commands start quicker"
+        ),
+    ),
+    stop_daemon: bool = typer.Option(
+        False,
+        "--stop-daemon",
+        help="Stop the background server started with --daemon",
+    ),
 ) -> None:
     """Generate a license file.
 
     Can generate a license file, a source file header, or list available
     licenses, template variables, and source code formatting.
     """
+    profiler.mark_started(*lice2.IMPORT_STARTED)
+    if profile or profile_json or profile_pstats:
+        profiler.configure(
+            table=profile, json_path=profile_json, pstats_path=profile_pstats
+        )
+        ctx.call_on_close(profiler.report)
+
     # deal with the '--version' flag first
     if version:
+        from rich import print as rprint  # noqa: PLC0415
+
         rprint(
             "\n[green]Lice2 - Generate license files for your projects."
             f"\n[/green]Version: {__version__} "
@@ -157,12 +283,15 @@ def main(  # noqa: PLR0913
         )
         raise typer.Exit(0)
 
+    if start_daemon or stop_daemon:
+        manage_daemon(start=start_daemon)
+
     # get the args into a dict to avoid refactoring all the code...
     args_base: dict[str, str | bool | None] = {
         "license": license_name,
         "header": header,
         "organization": organization,
-        "project": project,
+        "project": project or Path.cwd().name,
         "template_path": template_path,
         "year": year,
         "language": language,
@@ -181,8 +310,8 @@ def main(  # noqa: PLR0913
 
     actions: list[tuple[bool, Callable[..., None], list[Any]]] = [
         (metadata, get_metadata, [args]),
-        (args.list_licenses, list_licenses, []),
-        (args.list_languages, list_languages, []),
+        (args.list_licenses, list_licenses, [list_format]),
+        (args.list_languages, list_languages, [list_format]),
         (header, generate_header, [args, lang]),
         (args.list_vars, list_vars, [args, license_name]),
     ]
@@ -194,37 +323,779 @@ def main(  # noqa: PLR0913
         if condition:
             func(*func_args)
 
-    # create context
+    # render the license a line at a time, so it can be written out as it is
+    # produced instead of being copied around in memory
     if args.template_path:
-        template = load_file_template(args.template_path)
+        lines = render_file_template(args.template_path, args)
+    else:
+        with profiler.stage("template load"):
+            compiled = load_compiled_template(license_name)
+        lines = render_package_template(compiled, args)
+
+    if args.ofile == "stdout":
+        write_output(lines, lang, args)
+    elif ext := get_suffix(args.ofile):
+        # format license by file suffix
+        write_output(lines, ext, args, args.ofile)
     else:
-        template = load_package_template(license_name)
+        output = f"{args.ofile}.{lang}" if lang else args.ofile
+        write_output(lines, lang, args, output)
+
 
-    content = generate_license(template, get_context(args))
+def manage_daemon(*, start: bool) -> None:
+    """Start or stop the background server, then exit.
 
-    if args.ofile != "stdout":
-        ext = get_suffix(args.ofile)
-        if ext:
-            output = args.ofile
-            out = format_license(
-                content, ext, legacy=args.legacy
-            )  # format license by file suffix
+    See 'lice2.daemon'. This is only imported when asked for, so it doesn't
+    slow down the other commands.
+    """
+    from lice2.daemon import DaemonError  # noqa: PLC0415
+    from lice2.daemon import start_daemon as start_server  # noqa: PLC0415
+    from lice2.daemon import stop_daemon as stop_server  # noqa: PLC0415
+
+    if not start:
+        if stop_server():
+            sys.stdout.write("Stopped the lice daemon.\n")
         else:
-            output = f"{args.ofile}.{lang}" if lang else args.ofile
-            out = format_license(content, lang, legacy=args.legacy)
+            sys.stdout.write("The lice daemon is not running.\n")
+        raise typer.Exit(0)
+    try:
+        path = start_server()
+    except DaemonError as exc:
+        sys.stderr.write(f"{exc}\n")
+        raise typer.Exit(1) from None
+    sys.stdout.write(f"Started the lice daemon, listening on {path}\n")
+    raise typer.Exit(0)
 
-        out.seek(0)
-        with Path(output).open(mode="w") as f:
-            f.write(out.getvalue())
+
+def validate_header_license(license_name: Optional[str]) -> str:
+    """Validate a license for the header commands, using the default if None.
+
+    The license must also have a source header template.
+    """
+    if license_name is None:
+        license_name = validate_license(settings.default_license)
+        hint = " Choose a license with '--license'."
     else:
-        out = format_license(content, lang, legacy=args.legacy)
-        out.seek(0)
-        if not args.clipboard:
-            sys.stdout.write(out.getvalue())
-        else:
-            copy_to_clipboard(out)
+        license_name = validate_license(license_name)
+        hint = ""
+    if not get_license_info(license_name).header:
+        message = (
+            f"Sorry, no source headers are available for {license_name}.{hint}"
+        )
+        raise typer.BadParameter(message)
+    return license_name
+
+
+@app.command(
+    name="apply",
+    help=(
+        "Add the license header to every source file under the given paths "
+        "that doesn't already have one. The comment style is picked from "
+        "each file's extension."
+    ),
+    context_settings=CONTEXT_SETTINGS,
+)
+def apply(  # noqa: PLR0913
+    paths: list[str] = typer.Argument(  # noqa: B008
+        ...,
+        help="Files or folders to add the license header to",
+        show_default=False,
+    ),
+    license_name: str = typer.Option(
+        None,
+        "--license",
+        help=(
+            "The license to use, one of those with a header "
+            "[dim]\\[default: from the config file, or bsd3][/dim]"
+        ),
+        callback=validate_header_license,
+        show_default=False,
+    ),
+    organization: Optional[str] = typer.Option(
+        None,
+        "--org",
+        "-o",
+        help='Organization, defaults to .gitconfig or os.environ["USER"]',
+        show_default=False,
+    ),
+    project: Optional[str] = typer.Option(
+        None,
+        "--proj",
+        "-p",
+        help="Name of project, defaults to name of current directory",
+        show_default=False,
+    ),
+    year: str = typer.Option(
+        get_local_year(),
+        "--year",
+        "-y",
+        help="Copyright year",
+        callback=validate_year,
+    ),
+    *,
+    workers: int = typer.Option(
+        0,
+        "--workers",
+        "-w",
+        help="Number of worker processes, 0 for one per CPU",
+        min=0,
+    ),
+    legacy: bool = typer.Option(
+        False,
+        "--legacy",
+        help="Use legacy method to format the header",
+    ),
+    use_cache: bool = typer.Option(
+        True,
+        "--cache/--no-cache",
+        help="Skip files that haven't changed since the last run",
+    ),
+    use_git: bool = typer.Option(
+        True,
+        "--git/--no-git",
+        help=(
+            "List the files with git inside a repository, which skips "
+            "anything in .gitignore"
+        ),
+    ),
+    verbose: bool = typer.Option(
+        False,
+        "--verbose",
+        help="List every file that a header was added to",
+    ),
+) -> None:
+    """Add license headers to source files in bulk."""
+    from lice2.headers import (  # noqa: PLC0415
+        ERROR,
+        INSERTED,
+        PRESENT,
+        SKIPPED,
+        apply_headers,
+        build_header_specs,
+    )
+    from lice2.scan_cache import (  # noqa: PLC0415
+        ScanCache,
+        get_cache_file,
+        specs_signature,
+    )
+    from lice2.walker import iter_files  # noqa: PLC0415
+
+    args = SimpleNamespace(
+        organization=organization,
+        project=project or Path.cwd().name,
+        year=year,
+    )
+    compiled = load_compiled_template(license_name, header=True)
+    specs = build_header_specs(
+        compiled,
+        get_context(args, compiled.variables),
+        legacy=legacy or settings.legacy,
+    )
+
+    scan_cache = (
+        ScanCache(get_cache_file(), specs_signature(specs))
+        if use_cache
+        else None
+    )
+    counts: Counter[str] = Counter()
+    for path, outcome in apply_headers(
+        iter_files(paths, use_git=use_git),
+        specs,
+        workers=workers,
+        cache=scan_cache,
+    ):
+        counts[outcome] += 1
+        if outcome == INSERTED and verbose:
+            sys.stdout.write(f"Added header: {path}\n")
+        elif outcome == ERROR:
+            sys.stderr.write(f"Could not process: {path}\n")
+
+    if scan_cache is not None:
+        scan_cache.save()
+
+    sys.stdout.write(
+        f"Added the {license_name} header to {counts[INSERTED]} file(s), "
+        f"{counts[PRESENT]} already had one, {counts[SKIPPED]} skipped.\n"
+    )
+    if counts[ERROR]:
+        raise typer.Exit(1)
+
+
+@app.command(
+    name="check",
+    help=(
+        "Check that every source file under the given paths has the license "
+        "header, whatever organization, project and year it was written "
+        "with. Nothing is changed. Lists the files that are missing it, and "
+        "exits with a status of 1 if there are any."
+    ),
+    context_settings=CONTEXT_SETTINGS,
+)
+def check(  # noqa: PLR0913
+    paths: list[str] = typer.Argument(  # noqa: B008
+        ...,
+        help="Files or folders to check for the license header",
+        show_default=False,
+    ),
+    license_name: str = typer.Option(
+        None,
+        "--license",
+        help=(
+            "The license to use, one of those with a header "
+            "[dim]\\[default: from the config file, or bsd3][/dim]"
+        ),
+        callback=validate_header_license,
+        show_default=False,
+    ),
+    *,
+    workers: int = typer.Option(
+        0,
+        "--workers",
+        "-w",
+        help="Number of worker processes, 0 for one per CPU",
+        min=0,
+    ),
+    legacy: bool = typer.Option(
+        False,
+        "--legacy",
+        help="Use legacy method to format the header",
+    ),
+    use_cache: bool = typer.Option(
+        True,
+        "--cache/--no-cache",
+        help="Skip files that haven't changed since the last run",
+    ),
+    use_git: bool = typer.Option(
+        True,
+        "--git/--no-git",
+        help=(
+            "List the files with git inside a repository, which skips "
+            "anything in .gitignore"
+        ),
+    ),
+) -> None:
+    """Check source files have license headers, for use in CI."""
+    from lice2.headers import (  # noqa: PLC0415
+        ERROR,
+        MISSING,
+        PRESENT,
+        SKIPPED,
+        build_header_specs,
+        check_headers,
+    )
+    from lice2.scan_cache import (  # noqa: PLC0415
+        ScanCache,
+        get_cache_file,
+        specs_signature,
+    )
+    from lice2.walker import iter_files  # noqa: PLC0415
+
+    # the header is recognised whatever values its variables have, so there
+    # is no need to look them up
+    compiled = load_compiled_template(license_name, header=True)
+    specs = build_header_specs(
+        compiled,
+        dict.fromkeys(compiled.variables, ""),
+        legacy=legacy or settings.legacy,
+    )
+
+    scan_cache = (
+        ScanCache(get_cache_file(), specs_signature(specs))
+        if use_cache
+        else None
+    )
+    counts: Counter[str] = Counter()
+    for path, outcome in check_headers(
+        iter_files(paths, use_git=use_git),
+        specs,
+        workers=workers,
+        cache=scan_cache,
+    ):
+        counts[outcome] += 1
+        if outcome == MISSING:
+            sys.stdout.write(f"Missing header: {path}\n")
+        elif outcome == ERROR:
+            sys.stderr.write(f"Could not process: {path}\n")
+
+    if scan_cache is not None:
+        scan_cache.save()
+
+    sys.stdout.write(
+        f"Checked {counts[PRESENT] + counts[MISSING]} file(s) for the "
+        f"{license_name} header, {counts[MISSING]} missing, "
+        f"{counts[SKIPPED]} skipped.\n"
+    )
+    if counts[MISSING] or counts[ERROR]:
+        raise typer.Exit(1)
+
+
+def validate_year_license(license_name: Optional[str]) -> str:
+    """Validate a license for 'update-year', its header must have a year."""
+    license_name = validate_header_license(license_name)
+    compiled = load_compiled_template(license_name, header=True)
+    if "year" not in compiled.variables:
+        message = f"The {license_name} header has no year to update."
+        raise typer.BadParameter(message)
+    return license_name
+
+
+@app.command(
+    name="update-year",
+    help=(
+        "Bring the copyright year up to date in the license header of every "
+        "source file under the given paths, so '2023' becomes '2023-2024'. "
+        "Only the year is changed, and only in files that need it."
+    ),
+    context_settings=CONTEXT_SETTINGS,
+)
+def update_year(  # noqa: PLR0913
+    paths: list[str] = typer.Argument(  # noqa: B008
+        ...,
+        help="Files or folders to update the year in",
+        show_default=False,
+    ),
+    license_name: str = typer.Option(
+        None,
+        "--license",
+        help=(
+            "The license of the headers, one of those with a year in its "
+            "header [dim]\\[default: from the config file, or bsd3][/dim]"
+        ),
+        callback=validate_year_license,
+        show_default=False,
+    ),
+    year: str = typer.Option(
+        get_local_year(),
+        "--year",
+        "-y",
+        help="The year to bring the headers up to",
+        callback=validate_year,
+    ),
+    *,
+    workers: int = typer.Option(
+        0,
+        "--workers",
+        "-w",
+        help="Number of worker processes, 0 for one per CPU",
+        min=0,
+    ),
+    legacy: bool = typer.Option(
+        False,
+        "--legacy",
+        help="The headers were formatted with the legacy method",
+    ),
+    use_git: bool = typer.Option(
+        True,
+        "--git/--no-git",
+        help=(
+            "List the files with git inside a repository, which skips "
+            "anything in .gitignore"
+        ),
+    ),
+    verbose: bool = typer.Option(
+        False,
+        "--verbose",
+        help="List every file that was updated",
+    ),
+) -> None:
+    """Update the copyright year in existing license headers."""
+    from lice2.headers import (  # noqa: PLC0415
+        ERROR,
+        MISSING,
+        PRESENT,
+        SKIPPED,
+        UPDATED,
+        build_header_specs,
+        update_years,
+    )
+    from lice2.walker import iter_files  # noqa: PLC0415
+
+    # the header is recognised whatever values its variables have, so there
+    # is no need to look them up
+    compiled = load_compiled_template(license_name, header=True)
+    specs = build_header_specs(
+        compiled,
+        dict.fromkeys(compiled.variables, ""),
+        legacy=legacy or settings.legacy,
+    )
+
+    counts: Counter[str] = Counter()
+    for path, outcome in update_years(
+        iter_files(paths, use_git=use_git), specs, year, workers=workers
+    ):
+        counts[outcome] += 1
+        if outcome == UPDATED and verbose:
+            sys.stdout.write(f"Updated year: {path}\n")
+        elif outcome == ERROR:
+            sys.stderr.write(f"Could not process: {path}\n")
+
+    sys.stdout.write(
+        f"Updated the year to {year} in {counts[UPDATED]} file(s), "
+        f"{counts[PRESENT]} already up to date, {counts[MISSING]} without "
+        f"the {license_name} header, {counts[SKIPPED]} skipped.\n"
+    )
+    if counts[ERROR]:
+        raise typer.Exit(1)
+
+
+def validate_source_licenses(
+    license_names: Optional[list[str]],
+) -> Optional[list[str]]:
+    """Validate the licenses given with '--from', they must have headers."""
+    if license_names is None:
+        return None
+    return [validate_header_license(name) for name in license_names]
+
+
+def validate_optional_year(year: Optional[str]) -> Optional[str]:
+    """Validate the year, if one was given."""
+    return None if year is None else validate_year(year)
+
+
+@app.command(
+    name="relicense",
+    help=(
+        "Replace the existing license header in every source file under the "
+        "given paths with the header of another license. The organization, "
+        "project and year are kept from the old header unless given."
+    ),
+    context_settings=CONTEXT_SETTINGS,
+)
+def relicense(  # noqa: PLR0913
+    paths: list[str] = typer.Argument(  # noqa: B008
+        ...,
+        help="Files or folders to change the license header in",
+        show_default=False,
+    ),
+    license_name: str = typer.Option(
+        None,
+        "--license",
+        help=(
+            "The new license, one of those with a header "
+            "[dim]\\[default: from the config file, or bsd3][/dim]"
+        ),
+        callback=validate_header_license,
+        show_default=False,
+    ),
+    from_licenses: Optional[list[str]] = typer.Option(  # noqa: B008
+        None,
+        "--from",
+        help=(
+            "An old license to replace, can be given more than once "
+            "[dim]\\[default: any other license with a header][/dim]"
+        ),
+        callback=validate_source_licenses,
+        show_default=False,
+    ),
+    organization: Optional[str] = typer.Option(
+        None,
+        "--org",
+        "-o",
+        help=(
+            "Organization, if not in the old header defaults to .gitconfig "
+            'or os.environ["USER"]'
+        ),
+        show_default=False,
+    ),
+    project: Optional[str] = typer.Option(
+        None,
+        "--proj",
+        "-p",
+        help=(
+            "Name of project, if not in the old header defaults to name of "
+            "current directory"
+        ),
+        show_default=False,
+    ),
+    *,
+    year: Optional[str] = typer.Option(
+        None,
+        "--year",
+        "-y",
+        help="Copyright year, if not in the old header defaults to this year",
+        callback=validate_optional_year,
+        show_default=False,
+    ),
+    workers: int = typer.Option(
+        0,
+        "--workers",
+        "-w",
+        help="Number of worker processes, 0 for one per CPU",
+        min=0,
+    ),
+    legacy: bool = typer.Option(
+        False,
+        "--legacy",
+        help="Use legacy method to format the headers",
+    ),
+    use_git: bool = typer.Option(
+        True,
+        "--git/--no-git",
+        help=(
+            "List the files with git inside a repository, which skips "
+            "anything in .gitignore"
+        ),
+    ),
+    verbose: bool = typer.Option(
+        False,
+        "--verbose",
+        help="List every file that the header was replaced in",
+    ),
+) -> None:
+    """Swap one license header for another across a tree, when relicensing."""
+    from lice2.headers import (  # noqa: PLC0415
+        ERROR,
+        MISSING,
+        PRESENT,
+        REPLACED,
+        SKIPPED,
+        build_relicense_specs,
+        relicense_headers,
+    )
+    from lice2.walker import iter_files  # noqa: PLC0415
+
+    target = load_compiled_template(license_name, header=True)
+    sources = [
+        load_compiled_template(name, header=True)
+        for name in from_licenses or LICENSES
+        if name != license_name and get_license_info(name).header
+    ]
+    specs = build_relicense_specs(
+        target, sources, legacy=legacy or settings.legacy
+    )
+
+    overrides = {
+        key: value
+        for key, value in (
+            ("organization", organization),
+            ("project", project),
+            ("year", year),
+        )
+        if value is not None
+    }
+    defaults = {"project": Path.cwd().name, "year": get_local_year()}
+    # only look in the git config if the new header could need it
+    if "organization" in target.variables and organization is None:
+        defaults["organization"] = get_organization(
+            SimpleNamespace(organization=None)
+        )
+
+    counts: Counter[str] = Counter()
+    for path, outcome in relicense_headers(
+        iter_files(paths, use_git=use_git),
+        specs,
+        target,
+        defaults,
+        overrides,
+        legacy=legacy or settings.legacy,
+        workers=workers,
+    ):
+        counts[outcome] += 1
+        if outcome == REPLACED and verbose:
+            sys.stdout.write(f"Replaced header: {path}\n")
+        elif outcome == ERROR:
+            sys.stderr.write(f"Could not process: {path}\n")
+
+    sys.stdout.write(
+        f"Replaced the header with {license_name} in {counts[REPLACED]} "
+        f"file(s), {counts[PRESENT]} already had it, {counts[MISSING]} had "
+        f"no license header, {counts[SKIPPED]} skipped.\n"
+    )
+    if counts[ERROR]:
+        raise typer.Exit(1)
+
+
+@app.command(
+    name="identify",
+    help=(
+        "Work out which of the bundled licenses each license file is, "
+        "whatever organization, project and year it was written with. "
+        "Folders are searched for files named like LICENSE, LICENCE, COPYING "
+        "or UNLICENSE. Use --similar to find the closest licenses to those "
+        "that have been edited."
+    ),
+    context_settings=CONTEXT_SETTINGS,
+)
+def identify(
+    paths: list[str] = typer.Argument(  # noqa: B008
+        ...,
+        help="License files, or folders to search for them",
+        show_default=False,
+    ),
+    *,
+    similar: int = typer.Option(
+        0,
+        "--similar",
+        "-s",
+        help=(
+            "For files that are not an exact match, list up to this many of "
+            "the most similar licenses with their scores"
+        ),
+        min=0,
+    ),
+    workers: int = typer.Option(
+        0,
+        "--workers",
+        "-w",
+        help="Number of worker processes, 0 for one per CPU",
+        min=0,
+    ),
+    use_git: bool = typer.Option(
+        True,
+        "--git/--no-git",
+        help=(
+            "List the files with git inside a repository, which skips "
+            "anything in .gitignore"
+        ),
+    ),
+) -> None:
+    """Identify the license in LICENSE or COPYING files, for audits."""
+    from lice2.headers import ERROR  # noqa: PLC0415
+    from lice2.identify import (  # noqa: PLC0415
+        UNKNOWN,
+        find_license_files,
+        identify_files,
+    )
+
+    counts: Counter[str] = Counter()
+    for path, found in identify_files(
+        find_license_files(paths, use_git=use_git),
+        top=similar,
+        workers=workers,
+    ):
+        if found.outcome == ERROR:
+            counts[ERROR] += 1
+            sys.stderr.write(f"Could not process: {path}\n")
+            continue
+        counts[UNKNOWN if found.outcome == UNKNOWN else "identified"] += 1
+        scores = ", ".join(
+            f"{name} {score:.2f}" for name, score in found.similar
+        )
+        sys.stdout.write(
+            f"{found.outcome}: {path}"
+            f"{f' (similar to {scores})' if scores else ''}\n"
+        )
+
+    sys.stdout.write(
+        f"Identified {counts['identified']} of "
+        f"{counts['identified'] + counts[UNKNOWN]} license file(s), "
+        f"{counts[UNKNOWN]} unknown.\n"
+    )
+    if counts[ERROR]:
+        raise typer.Exit(1)
+
+
+@app.command(
+    name="batch",
+    help=(
+        "Generate every license file listed in a TOML manifest, in one go. "
+        "Each entry gives the output path, and any of the license, "
+        "organization, project, year and language that differ from the "
+        "manifest's [defaults] table or the options below."
+    ),
+    context_settings=CONTEXT_SETTINGS,
+)
+def batch(  # noqa: PLR0913
+    manifest: str = typer.Argument(
+        ...,
+        help="The TOML manifest listing the license files to generate",
+        show_default=False,
+    ),
+    license_name: str = typer.Option(
+        None,
+        "--license",
+        help=(
+            "The license for entries that don't name one "
+            "[dim]\\[default: from the config file, or bsd3][/dim]"
+        ),
+        show_default=False,
+    ),
+    organization: Optional[str] = typer.Option(
+        None,
+        "--org",
+        "-o",
+        help=(
+            "Organization for entries that don't give one, defaults to "
+            '.gitconfig or os.environ["USER"]'
+        ),
+        show_default=False,
+    ),
+    year: str = typer.Option(
+        get_local_year(),
+        "--year",
+        "-y",
+        help="Copyright year for entries that don't give one",
+        callback=validate_year,
+    ),
+    *,
+    workers: int = typer.Option(
+        8,
+        "--workers",
+        "-w",
+        help="Number of threads writing the files",
+        min=1,
+    ),
+    legacy: bool = typer.Option(
+        False,
+        "--legacy",
+        help="Use legacy method to format the licenses",
+    ),
+    verbose: bool = typer.Option(
+        False,
+        "--verbose",
+        help="List every file that was written",
+    ),
+) -> None:
+    """Generate many license files from a manifest, for monorepos."""
+    from lice2.batch import (  # noqa: PLC0415
+        ERROR,
+        UNCHANGED,
+        WRITTEN,
+        ManifestError,
+        load_manifest,
+        render_entries,
+        write_entries,
+    )
+
+    license_name = validate_license(license_name or settings.default_license)
+    try:
+        entries = load_manifest(
+            Path(manifest), license_name=license_name, year=year
+        )
+    except ManifestError as exc:
+        raise typer.BadParameter(str(exc), param_hint="manifest") from None
+
+    # only look in the git config if a template needs the organization
+    args = SimpleNamespace(organization=organization)
+    if any(
+        entry.organization is None
+        and "organization" in get_license_info(entry.license_name).variables
+        for entry in entries
+    ):
+        get_organization(args)
+
+    counts: Counter[str] = Counter()
+    for entry, outcome in write_entries(
+        render_entries(
+            entries,
+            organization=args.organization or "",
+            legacy=legacy or settings.legacy,
+        ),
+        workers=workers,
+    ):
+        counts[outcome] += 1
+        if outcome == ERROR:
+            sys.stderr.write(f"Could not write: {entry.path}\n")
+        elif outcome == WRITTEN and verbose:
+            sys.stdout.write(f"Wrote {entry.license_name}: {entry.path}\n")
 
-    out.close()
+    sys.stdout.write(
+        f"Wrote {counts[WRITTEN]} license file(s) from {manifest}, "
+        f"{counts[UNCHANGED]} already up to date"
+        f"{f', {counts[ERROR]} failed' if counts[ERROR] else ''}.\n"
+    )
+    if counts[ERROR]:
+        raise typer.Exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,475 @@
+"""A background server that keeps 'lice' loaded, so commands start quickly.
+
+Started with 'lice --daemon', this imports everything, loads the settings and
+compiles all of the bundled templates once, then listens on a Unix socket for
+commands from 'lice2.client'. Each command runs in a child forked from the
+server, so it starts with everything already loaded, and anything it changes
+is thrown away when it is done. The child takes on the working folder,
+environment and umask of the client, and its output is sent back to the
+client as it is written.
+
+Some things are only read when the server starts. If the settings file, the
+installed package or the date has changed since then, the server asks the
+client to run the command itself and restarts to pick up the change. A client
+with a different home or config folder, or using another copy of the package,
+runs its commands itself too. The server stops once it has been idle for an
+hour, or when asked to with 'lice --stop-daemon'.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import gc
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import traceback
+from functools import cache
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    NoReturn,
+    Optional,
+    Union,
+    cast,
+)
+
+import lice2
+from lice2.client import (
+    EXIT,
+    FALLBACK,
+    FRAME,
+    LENGTH,
+    STDERR,
+    STDOUT,
+    connect,
+    get_socket_path,
+    pack_message,
+)
+from lice2.profiling import profiler
+
+if TYPE_CHECKING:
+    from _typeshed import ReadableBuffer
+    from typer.core import TyperGroup
+
+# stop after this many seconds without a command
+IDLE_TIMEOUT = 60 * 60
+
+# how long a client has to send its request, so one can't hang the server
+REQUEST_TIMEOUT = 5
+
+# the largest request the server will read
+MAX_REQUEST_SIZE = 1024 * 1024
+
+# a client with different values for these finds a different settings file
+# or git config, so must run its commands itself
+SHARED_ENV = ("HOME", "XDG_CONFIG_HOME")
+
+PACKAGE_DIR = Path(lice2.__file__).parent
+
+
+class DaemonError(Exception):
+    """The daemon could not be started."""
+
+
+class FrameWriter(io.RawIOBase):
+    """Send everything written to the client, as frames of one kind."""
+
+    def __init__(self, conn: socket.socket, kind: bytes) -> None:
+        """Write frames of 'kind' to the connection."""
+        super().__init__()
+        self.conn = conn
+        self.kind = kind
+
+    def writable(self) -> bool:
+        """Return True, as this can always be written to."""
+        return True
+
+    def write(self, data: ReadableBuffer) -> int:
+        """Send the data as one frame."""
+        chunk = bytes(data)
+        self.conn.sendall(FRAME.pack(self.kind, len(chunk)) + chunk)
+        return len(chunk)
+
+
+def _frame(kind: bytes, data: bytes = b"") -> bytes:
+    """Return a frame to send to the client."""
+    return FRAME.pack(kind, len(data)) + data
+
+
+def _receive(conn: socket.socket, size: int) -> bytes:
+    """Return exactly 'size' bytes from the connection.
+
+    Raises:
+        OSError: If the connection closed first.
+    """
+    data = bytearray()
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            message = "The connection closed during the request"
+            raise ConnectionError(message)
+        data += chunk
+    return bytes(data)
+
+
+def _read_request(conn: socket.socket) -> dict[str, Any]:
+    """Return the request sent by a client.
+
+    Raises:
+        OSError: If it could not be read.
+        ValueError: If it isn't valid JSON.
+        TypeError: If it isn't a JSON object.
+    """
+    (size,) = LENGTH.unpack(_receive(conn, LENGTH.size))
+    if size > MAX_REQUEST_SIZE:
+        message = f"The request is too big, at {size} bytes"
+        raise ValueError(message)
+    request = json.loads(_receive(conn, size))
+    if not isinstance(request, dict):
+        message = "The request is not a JSON object"
+        raise TypeError(message)
+    return request
+
+
+def _stamp(path: Path) -> Optional[tuple[int, int]]:
+    """Return the modification time and size of a file, None if missing."""
+    try:
+        info = path.stat()
+    except OSError:
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+def _package_stamp() -> tuple[Optional[tuple[int, int]], ...]:
+    """Return the stamps of the package and its modules.
+
+    Installing another version changes the folder, and editing a module in a
+    development install changes that module.
+    """
+    return (
+        _stamp(PACKAGE_DIR),
+        *(_stamp(path) for path in sorted(PACKAGE_DIR.glob("*.py"))),
+    )
+
+
+@cache
+def get_command() -> TyperGroup:
+    """Return the click command for 'lice', which is slow to build.
+
+    It is a group, as 'lice' has several commands.
+    """
+    from typer.main import get_command as get_click_command  # noqa: PLC0415
+
+    from lice2.core import app  # noqa: PLC0415
+
+    return cast("TyperGroup", get_click_command(app))
+
+
+def run_command(argv: list[str], stdout: BinaryIO, stderr: BinaryIO) -> int:
+    """Run 'lice' with the arguments, writing its output to the streams.
+
+    This is what each child forked by the server does, once it has taken on
+    the client's working folder and environment. The profile starts now, as
+    that is when the client is waiting for.
+
+    Returns the exit status.
+    """
+    command = get_command()
+    started = (time.perf_counter_ns(), sys.getallocatedblocks())
+    lice2.IMPORT_STARTED = started
+    profiler.reset()
+    profiler.started_ns, profiler.started_blocks = started
+
+    saved = sys.stdout, sys.stderr
+    sys.stdout = io.TextIOWrapper(stdout, encoding="utf-8")
+    sys.stderr = io.TextIOWrapper(stderr, encoding="utf-8", line_buffering=True)
+    status: Union[str, int, None] = 0
+    try:
+        command.main(args=argv, prog_name="lice")
+    except SystemExit as exc:
+        status = exc.code
+    except Exception:  # noqa: BLE001 - reported to the client like Python would
+        traceback.print_exc()
+        status = 1
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            stream.flush()
+            stream.detach()
+        sys.stdout, sys.stderr = saved
+
+    if isinstance(status, int):
+        return status
+    if status is not None:
+        stderr.write(f"{status}\n".encode())
+        stderr.flush()
+        return 1
+    return 0
+
+
+def _set_environ(env: dict[str, str]) -> None:
+    """Make the environment the same as 'env'.
+
+    Only the variables that differ are changed, as most will be the same and
+    changing them is slower than comparing them.
+    """
+    for key in os.environ.keys() - env.keys():
+        del os.environ[key]
+    for key, value in env.items():
+        if os.environ.get(key) != value:
+            os.environ[key] = value
+
+
+def _run_child(  # pragma: no cover
+    conn: socket.socket, request: dict[str, Any]
+) -> NoReturn:
+    """Run a command for the client in a forked child, then exit.
+
+    This only runs in the child, so is not seen by the coverage.
+    """
+    code = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        conn.settimeout(None)
+        os.chdir(request["cwd"])
+        _set_environ(request["env"])
+        os.umask(request["umask"])
+        sys.argv = ["lice", *request["argv"]]
+        status = run_command(
+            request["argv"],
+            io.BufferedWriter(FrameWriter(conn, STDOUT)),
+            io.BufferedWriter(FrameWriter(conn, STDERR)),
+        )
+        conn.sendall(_frame(EXIT, str(status).encode()))
+        code = 0
+    except BaseException:  # noqa: BLE001, S110 - the client sees it has stopped
+        pass
+    finally:
+        os._exit(code)
+
+
+class Server:
+    """Listen for commands on the socket, running each in a forked child."""
+
+    def __init__(self, path: str) -> None:
+        """Bind to the socket at 'path', replacing one left behind.
+
+        Raises:
+            OSError: If the socket could not be created.
+        """
+        from lice2.config import settings  # noqa: PLC0415
+        from lice2.rendering import get_local_year  # noqa: PLC0415
+
+        self.path = path
+        self.settings_file = (
+            settings.get_settings_folder() / settings.settings_file_name
+        )
+        self.settings_stamp = _stamp(self.settings_file)
+        self.package_stamp = _package_stamp()
+        self.year = get_local_year()
+        self.env = {key: os.environ.get(key) for key in SHARED_ENV}
+
+        Path(path).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if connect(path) is not None:
+            message = f"A daemon is already running on {path}"
+            raise DaemonError(message)
+        Path(path).unlink(missing_ok=True)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only we can connect to the socket
+        umask = os.umask(0o077)
+        try:
+            self.listener.bind(path)
+            self.listener.listen()
+        except OSError:
+            self.listener.close()
+            raise
+        finally:
+            os.umask(umask)
+        # another server may replace the socket, which is then left alone
+        self.inode = Path(path).stat().st_ino
+
+    def is_stale(self) -> bool:
+        """Return True if anything read at start up has changed since."""
+        from lice2.rendering import get_local_year  # noqa: PLC0415
+
+        return (
+            get_local_year() != self.year
+            or _stamp(self.settings_file) != self.settings_stamp
+            or _package_stamp() != self.package_stamp
+        )
+
+    def can_run(self, request: dict[str, Any]) -> bool:
+        """Return True if the command can be run here, as it would be there."""
+        return request.get("package") == str(PACKAGE_DIR) and all(
+            request["env"].get(key) == value for key, value in self.env.items()
+        )
+
+    def serve(self, idle_timeout: float = IDLE_TIMEOUT) -> bool:
+        """Run commands until stopped, idle or stale.
+
+        Returns True if the server should restart to pick up a change.
+        """
+        # the children are reaped for us
+        previous = signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        self.listener.settimeout(idle_timeout)
+        try:
+            while True:
+                try:
+                    conn, _ = self.listener.accept()
+                except socket.timeout:
+                    return False
+                with conn:
+                    outcome = self._handle(conn)
+                if outcome is not None:
+                    return outcome
+        finally:
+            signal.signal(signal.SIGCHLD, previous)
+            self.close()
+
+    def _handle(self, conn: socket.socket) -> Optional[bool]:
+        """Deal with one connection.
+
+        Returns None to carry on, or whether to restart if the server should
+        stop.
+        """
+        conn.settimeout(REQUEST_TIMEOUT)
+        try:
+            request = _read_request(conn)
+            # stop listening before replying, so the client knows we have
+            if request.get("stop"):
+                self.close()
+                conn.sendall(_frame(EXIT, b"0"))
+                return False
+            if self.is_stale():
+                self.close()
+                conn.sendall(_frame(FALLBACK))
+                return True
+            if not self.can_run(request):
+                conn.sendall(_frame(FALLBACK))
+                return None
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            return None
+        if os.fork() == 0:  # pragma: no cover - the child never returns
+            self.listener.close()
+            _run_child(conn, request)
+        return None
+
+    def close(self) -> None:
+        """Stop listening and remove the socket, if it is still ours."""
+        with contextlib.suppress(OSError):
+            if Path(self.path).stat().st_ino == self.inode:
+                Path(self.path).unlink()
+        self.listener.close()
+
+
+def warm_up() -> None:
+    """Import everything a command might need, and build what it would.
+
+    The click command is built, all the templates are compiled, and the
+    indexes for 'lice identify' are built. Then a license is generated and
+    thrown away, so whatever is done the first time is done here rather than
+    in every child.
+    """
+    import rich.console  # noqa: PLC0415
+    import rich.panel  # noqa: PLC0415
+    import rich.table  # noqa: F401, PLC0415
+    import typer.rich_utils  # noqa: F401, PLC0415
+
+    import lice2.batch  # noqa: PLC0415
+    import lice2.scan_cache  # noqa: F401, PLC0415
+    from lice2.identify import (  # noqa: PLC0415
+        get_license_index,
+        get_similarity_index,
+    )
+    from lice2.rendering import load_compiled_template  # noqa: PLC0415
+    from lice2.template_index import TEMPLATE_INDEX  # noqa: PLC0415
+
+    get_command()
+    for info in TEMPLATE_INDEX.values():
+        load_compiled_template(info.name)
+        if info.header:
+            load_compiled_template(info.name, header=True)
+    get_license_index()
+    get_similarity_index()
+    run_command(
+        ["mit", "--org", "lice", "--proj", "lice", "--year", "2000"],
+        io.BytesIO(),
+        io.BytesIO(),
+    )
+
+
+def start_daemon(path: Optional[str] = None) -> str:
+    """Start the daemon in the background, returning its socket path.
+
+    This returns once the daemon is ready for commands.
+
+    Raises:
+        DaemonError: If it could not be started.
+    """
+    if not hasattr(os, "fork") or not hasattr(socket, "AF_UNIX"):
+        message = "The daemon is not supported on this platform"
+        raise DaemonError(message)
+    path = path or get_socket_path()
+    process = subprocess.Popen(  # noqa: S603
+        [sys.executable, "-m", "lice2.daemon", path],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        cwd="/",
+        start_new_session=True,
+        text=True,
+    )
+    with process.stdout as ready:  # type: ignore[union-attr]
+        line = ready.readline().strip()
+    if line != "ready":
+        process.wait()
+        raise DaemonError(line or "The daemon stopped while starting")
+    return path
+
+
+def stop_daemon(path: Optional[str] = None) -> bool:
+    """Ask the daemon to stop, returning False if it wasn't running."""
+    sock = connect(path or get_socket_path())
+    if sock is None:
+        return False
+    with sock:
+        sock.sendall(pack_message({"stop": True}))
+        sock.recv(FRAME.size)
+    return True
+
+
+def main() -> None:
+    """Run the daemon on the socket path given on the command line.
+
+    'ready' is written to stdout once it is listening, or the reason it could
+    not start. It restarts itself to pick up changes, see 'Server.is_stale'.
+    """
+    path = sys.argv[1]
+    try:
+        warm_up()
+        server = Server(path)
+    except (DaemonError, OSError) as exc:
+        sys.stdout.write(f"Could not start the daemon: {exc}\n")
+        sys.exit(1)
+    # keep the collector away from everything loaded so far, so the children
+    # don't copy the memory it is in when they run it
+    gc.freeze()
+    sys.stdout.write("ready\n")
+    sys.stdout.flush()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+
+    if server.serve():
+        os.execv(sys.executable, [sys.executable, "-m", "lice2.daemon", path])  # noqa: S606
+
+
+if __name__ == "__main__":
+    main()
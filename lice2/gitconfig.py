@@ -0,0 +1,353 @@
+"""Read values from the git configuration files without running 'git'.
+
+This is a small reader for the subset of the git configuration format that we
+actually need (sections, subsections, quoted values and 'include' /
+'includeIf "gitdir:..."' directives), so that looking up 'user.name' does not
+cost us a fork and exec of the 'git' binary on every run.
+
+Parsed results are cached for the life of the process, keyed on the
+modification time, size and inode of every file that was read. The values
+looked up with 'get_config_value' are also saved in a JSON file under the XDG
+cache folder with those stamps, so the next run can skip the parsing too.
+Only the values asked for are saved, not the whole configuration, as that can
+hold credentials.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+MAX_INCLUDE_DEPTH = 10
+
+# bump this if the layout of the cache file changes
+CACHE_VERSION = 1
+
+# how many sets of config files the cache file remembers, one for each
+# repository 'lice' was run in
+MAX_SAVED = 32
+
+# a config file changed this close to now may be changed again within the
+# same mtime tick without it showing, so values read from it are not saved
+RACY_WINDOW_NS = 2_000_000_000
+
+Stamp = tuple[str, Optional[tuple[int, int, int]]]
+
+_cache: dict[tuple[str, ...], tuple[tuple[Stamp, ...], dict[str, str]]] = {}
+
+_ESCAPES = {"n": "\n", "t": "\t", "b": "\b", '"': '"', "\\": "\\"}
+
+
+def clear_cache() -> None:
+    """Forget all previously parsed git configuration files.
+
+    This is only the cache for this process, the cache file is left alone.
+    """
+    _cache.clear()
+
+
+def get_cache_file() -> Path:
+    """Return the file the looked up values are saved in between runs."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "lice" / "gitconfig.json"
+
+
+def find_git_dir(start: Optional[Path] = None) -> Optional[Path]:
+    """Return the '.git' directory for the repository containing 'start'.
+
+    This honours '$GIT_DIR' and also understands the 'gitdir: <path>' files
+    used by worktrees and submodules. Returns None if not inside a repository.
+    """
+    if os.environ.get("GIT_DIR"):
+        return Path(os.environ["GIT_DIR"]).expanduser().absolute()
+
+    current = (start or Path.cwd()).absolute()
+    for folder in (current, *current.parents):
+        candidate = folder / ".git"
+        if candidate.is_dir():
+            return candidate
+        if candidate.is_file():
+            try:
+                content = candidate.read_text(encoding="utf-8").strip()
+            except OSError:
+                return None
+            if content.startswith("gitdir:"):
+                gitdir = Path(content[len("gitdir:") :].strip())
+                return gitdir if gitdir.is_absolute() else folder / gitdir
+            return None
+    return None
+
+
+def _repo_config(git_dir: Path) -> Path:
+    """Return the config file for a git dir, following 'commondir' links."""
+    commondir = git_dir / "commondir"
+    if commondir.is_file():
+        try:
+            common = Path(commondir.read_text(encoding="utf-8").strip())
+        except OSError:
+            return git_dir / "config"
+        return (common if common.is_absolute() else git_dir / common) / "config"
+    return git_dir / "config"
+
+
+def config_files(
+    cwd: Optional[Path] = None,
+) -> tuple[list[Path], Optional[Path]]:
+    """Return the config files git would read, lowest priority first.
+
+    Also returns the git directory (if any), which is needed to evaluate
+    'includeIf "gitdir:..."' sections.
+    """
+    files: list[Path] = []
+    if os.environ.get("GIT_CONFIG_GLOBAL"):
+        files.append(Path(os.environ["GIT_CONFIG_GLOBAL"]).expanduser())
+    else:
+        xdg = os.environ.get("XDG_CONFIG_HOME") or str(Path.home() / ".config")
+        files.append(Path(xdg) / "git" / "config")
+        files.append(Path.home() / ".gitconfig")
+
+    git_dir = find_git_dir(cwd)
+    if git_dir is not None:
+        files.append(_repo_config(git_dir))
+    return files, git_dir
+
+
+def _stamp(path: Path) -> Stamp:
+    """Return a cache stamp for the given file, None if it does not exist."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return str(path), None
+    return str(path), (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _parse_value(raw: str) -> str:
+    """Parse the value part of a 'key = value' line.
+
+    Handles double quotes, backslash escapes and trailing comments.
+    """
+    out: list[str] = []
+    in_quotes = False
+    escaped = False
+    for char in raw.strip():
+        if escaped:
+            out.append(_ESCAPES.get(char, char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            in_quotes = not in_quotes
+        elif char in "#;" and not in_quotes:
+            break
+        else:
+            out.append(char)
+    return "".join(out).strip()
+
+
+def _parse_section(header: str) -> str:
+    """Return the normalised name of a '[section "subsection"]' header."""
+    name, _, subsection = header.strip().partition(" ")
+    if subsection:
+        return f"{name.lower()}.{_parse_value(subsection)}"
+    # the deprecated '[section.subsection]' syntax
+    section, _, subsection = name.partition(".")
+    if subsection:
+        return f"{section.lower()}.{subsection.lower()}"
+    return name.lower()
+
+
+def _include_applies(section: str, git_dir: Optional[Path], base: Path) -> bool:
+    """Check the condition of an 'includeIf' section.
+
+    Only the 'gitdir:' and 'gitdir/i:' conditions are supported, anything else
+    is treated as not matching. 'base' is the folder of the config file that
+    contains the section, used to resolve './' patterns.
+    """
+    if section == "include":
+        return True
+    condition = section[len("includeif.") :]
+    kind, _, pattern = condition.partition(":")
+    if kind not in {"gitdir", "gitdir/i"} or git_dir is None:
+        return False
+
+    if pattern.startswith("~/"):
+        pattern = os.path.expanduser(pattern)  # noqa: PTH111
+    elif pattern.startswith("./"):
+        pattern = f"{base.as_posix()}/{pattern[2:]}"
+    elif not pattern.startswith("/"):
+        pattern = f"**/{pattern}"
+    if pattern.endswith("/"):
+        pattern = f"{pattern}**"
+
+    target = f"{git_dir.as_posix()}/"
+    if kind == "gitdir/i":
+        return fnmatch.fnmatch(target.lower(), pattern.lower())
+    return fnmatch.fnmatchcase(target, pattern) or fnmatch.fnmatchcase(
+        git_dir.as_posix(), pattern
+    )
+
+
+def _read_config(
+    path: Path,
+    values: dict[str, str],
+    stamps: list[Stamp],
+    git_dir: Optional[Path],
+    depth: int = 0,
+) -> None:
+    """Parse a single config file into 'values', following includes."""
+    stamps.append(_stamp(path))
+    try:
+        text = path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return
+
+    section = ""
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if line.startswith("["):
+            end = line.find("]")
+            if end == -1:
+                continue
+            section = _parse_section(line[1:end])
+            line = line[end + 1 :].strip()
+        if not line or line[0] in "#;":
+            continue
+
+        key, sep, value = line.partition("=")
+        key = key.strip().lower()
+        value = _parse_value(value) if sep else "true"
+
+        if (
+            key == "path"
+            and (section == "include" or section.startswith("includeif."))
+            and depth < MAX_INCLUDE_DEPTH
+            and _include_applies(section, git_dir, path.parent)
+        ):
+            include = Path(value).expanduser()
+            if not include.is_absolute():
+                include = path.parent / include
+            _read_config(include, values, stamps, git_dir, depth + 1)
+            continue
+
+        values[f"{section}.{key}"] = value
+
+
+def _unchanged(stamps: tuple[Stamp, ...]) -> bool:
+    """Return True if none of the files have changed since they were read."""
+    return all(_stamp(Path(name)) == (name, info) for name, info in stamps)
+
+
+def _parse_files(
+    files: list[Path], git_dir: Optional[Path]
+) -> tuple[tuple[Stamp, ...], dict[str, str]]:
+    """Return the stamps and merged values of the files, parsing if needed."""
+    key = tuple(str(path) for path in files)
+    cached = _cache.get(key)
+    if cached is not None and _unchanged(cached[0]):
+        return cached
+
+    values: dict[str, str] = {}
+    stamps: list[Stamp] = []
+    for path in files:
+        _read_config(path, values, stamps, git_dir)
+    _cache[key] = (tuple(stamps), values)
+    return _cache[key]
+
+
+def read_git_config(cwd: Optional[Path] = None) -> dict[str, str]:
+    """Return the merged git configuration as a flat 'section.key' dict.
+
+    Later files (and later values in a file) override earlier ones, matching
+    how 'git config --get' resolves a key.
+    """
+    files, git_dir = config_files(cwd)
+    return _parse_files(files, git_dir)[1]
+
+
+def _load_saved() -> dict[str, Any]:
+    """Return the saved entries for each set of config files, if any."""
+    try:
+        data = json.loads(get_cache_file().read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        return {}
+    entries = data.get("entries")
+    return entries if isinstance(entries, dict) else {}
+
+
+def _saved_stamps(entry: Any) -> Optional[tuple[Stamp, ...]]:  # noqa: ANN401
+    """Return the stamps of a saved entry, or None if it is malformed."""
+    try:
+        return tuple(
+            (name, None if info is None else tuple(info))
+            for name, info in entry["stamps"]
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _save(entries: dict[str, Any]) -> None:
+    """Write the entries to the cache file, replacing it atomically.
+
+    Failing to save is not an error, the files are just parsed next time.
+    """
+    path = get_cache_file()
+    data = {"version": CACHE_VERSION, "entries": entries}
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(
+            dir=path.parent, prefix=".gitconfig-", suffix=".tmp"
+        )
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as outfile:
+            json.dump(data, outfile, separators=(",", ":"))
+        os.replace(temp_name, path)  # noqa: PTH105
+    except OSError:
+        Path(temp_name).unlink(missing_ok=True)
+
+
+def get_config_value(name: str, cwd: Optional[Path] = None) -> Optional[str]:
+    """Return the value of a git config key such as 'user.name', or None.
+
+    The value is taken from the cache file if none of the config files have
+    changed since it was saved, otherwise they are parsed and it is saved.
+    """
+    section, _, key = name.rpartition(".")
+    # only the section and key names are case-insensitive, not subsections
+    head, dot, subsection = section.partition(".")
+    normalised = f"{head.lower()}{dot}{subsection}.{key.lower()}"
+
+    files, git_dir = config_files(cwd)
+    cached = _cache.get(tuple(str(path) for path in files))
+    if cached is not None and _unchanged(cached[0]):
+        return cached[1].get(normalised)
+
+    entries = _load_saved()
+    files_key = "\n".join(str(path) for path in files)
+    entry = entries.pop(files_key, None)
+    saved = _saved_stamps(entry)
+    if saved is not None and _unchanged(saved):
+        if normalised in entry["values"]:
+            return entry["values"][normalised]
+        looked_up = entry["values"]
+    else:
+        looked_up = {}
+
+    stamps, values = _parse_files(files, git_dir)
+    value = values.get(normalised)
+    racy = time.time_ns() - RACY_WINDOW_NS
+    if all(info is None or info[0] < racy for _, info in stamps):
+        entries[files_key] = {
+            "stamps": stamps,
+            "values": {**looked_up, normalised: value},
+        }
+        _save(dict(list(entries.items())[-MAX_SAVED:]))
+    return value
@@ -0,0 +1,651 @@
+"""Insert or check for license headers in the source files across a tree.
+
+The header for each comment style is rendered and formatted once up front,
+along with a regular expression that recognises that header whatever values
+were used for its variables. Each file then only needs the start of it read to
+see if a header is already there, and the work is spread over a process pool.
+"""
+
+from __future__ import annotations
+
+import codecs
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import FileIO, StringIO
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple, Optional, TypeVar
+
+from lice2.constants import LANGS
+from lice2.rendering import format_license
+from lice2.scan_cache import stat_file
+from lice2.walker import get_extension
+from lice2.writer import atomic_write
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Mapping
+
+    from lice2.scan_cache import ScanCache
+    from lice2.template import CompiledTemplate
+
+# the possible outcomes for each file
+INSERTED = "inserted"
+UPDATED = "updated"
+REPLACED = "replaced"
+MISSING = "missing"
+PRESENT = "present"
+SKIPPED = "skipped"
+ERROR = "error"
+
+# plain text has no comment markers, so we can't add a header to it
+UNSUPPORTED_LANGS = frozenset({"txt"})
+
+# extra bytes to read past the length of the header, to allow for a preamble
+# and variables that are longer than the ones we rendered with
+HEADER_SLACK = 4096
+
+# how much of the rest of a file to copy at a time when rewriting it
+COPY_CHUNK_SIZE = 64 * 1024
+
+T = TypeVar("T")
+
+# how many files to send to each worker process at a time, at most
+CHUNK_SIZE = 256
+
+# starting worker processes costs more than checking this many files
+POOL_THRESHOLD = 64
+
+# lines that must stay at the very top of a file, before the header. The
+# last one may have no newline, if it is all there is in the file
+PREAMBLE_RE = re.compile(
+    r"\ufeff?(?:(?:#!|<\?xml|<\?php|<!doctype)[^\n]*(?:\n|\Z)"
+    r"|[ \t\f]*#[^\n]*coding[:=][^\n]*(?:\n|\Z)){0,2}",
+    re.IGNORECASE,
+)
+# the blank lines allowed before a header, see 'header_pattern'
+BLANK_LINES = r"\s*"
+SENTINEL_RE = re.compile("\x00(\\w+)\x00")
+
+# a year or range of years, as found at the start of the 'year' variable
+YEAR_RANGE_RE = re.compile(
+    r"(?P<first>\d{4})(?:[ \t]*[-\u2013][ \t]*(?P<last>\d{4}))?"
+)
+
+
+class HeaderSpec(NamedTuple):
+    """A formatted header for one language, and how to recognise it."""
+
+    text: str
+    pattern: re.Pattern[str]
+    limit: int
+
+
+class RelicenseSpec(NamedTuple):
+    """How to find the old headers for one language, and the new one.
+
+    'lang' is one of the languages with this comment style, for formatting
+    the new header.
+    """
+
+    lang: str
+    sources: tuple[re.Pattern[str], ...]
+    target: re.Pattern[str]
+    limit: int
+
+
+def _literal_regex(text: str, *, loose_end: bool = False) -> str:
+    """Return a regex for literal header text.
+
+    Line endings may be either LF or CRLF, and trailing whitespace on a line
+    is ignored. With 'loose_end', whitespace at the very end may also be
+    missing if nothing else follows on the line. This is for text just before
+    a variable that ends its line, as the whitespace will have been stripped
+    if that variable was empty.
+    """
+    lines = text.split("\n")
+    parts = [
+        re.escape(line.rstrip(" \t")) + "[ \\t]*\\r?\\n" for line in lines[:-1]
+    ]
+    last = lines[-1]
+    stripped = last.rstrip(" \t")
+    if loose_end and stripped != last:
+        parts.append(
+            f"{re.escape(stripped)}"
+            f"(?:{re.escape(last[len(stripped) :])}|[ \\t]*(?=\\r?\\n|$))"
+        )
+    else:
+        parts.append(re.escape(last))
+    return "".join(parts)
+
+
+def header_pattern(
+    compiled: CompiledTemplate, lang: str, *, legacy: bool = False
+) -> re.Pattern[str]:
+    """Return a regex matching the formatted header with any variable values.
+
+    Each template variable becomes a named group that matches the rest of its
+    line, so the values used in an existing header can be read back.
+
+    Any blank lines before the header are part of the match. Legacy headers
+    for some comment styles start with one, and it may have been removed or
+    doubled since the header was added.
+    """
+    sentinels = {key: f"\x00{key}\x00" for key in compiled.variables}
+    formatted = format_license(
+        StringIO(compiled.render(sentinels)), lang, legacy=legacy
+    ).getvalue()
+    formatted = formatted.lstrip("\n")
+
+    pieces = SENTINEL_RE.split(formatted)
+    regex: list[str] = []
+    seen: set[str] = set()
+    for index, piece in enumerate(pieces):
+        if index % 2 == 0:
+            after = pieces[index + 2] if index + 2 < len(pieces) else "\n"
+            regex.append(
+                _literal_regex(piece, loose_end=after.startswith("\n"))
+            )
+        elif piece in seen:
+            regex.append(f"(?P={piece})")
+        else:
+            seen.add(piece)
+            regex.append(f"(?P<{piece}>[^\\r\\n]*?)")
+    return re.compile(BLANK_LINES + "".join(regex))
+
+
+def build_header_specs(
+    compiled: CompiledTemplate,
+    context: Mapping[str, str],
+    *,
+    legacy: bool = False,
+) -> dict[str, HeaderSpec]:
+    """Render and format the header once for each supported language.
+
+    Languages that share a comment style share the same 'HeaderSpec'. The
+    result maps each file extension to its spec.
+    """
+    rendered = compiled.render(context)
+    by_style: dict[str, HeaderSpec] = {}
+    specs: dict[str, HeaderSpec] = {}
+    for lang, style in LANGS.items():
+        if lang in UNSUPPORTED_LANGS:
+            continue
+        if style not in by_style:
+            text = format_license(
+                StringIO(rendered), lang, legacy=legacy
+            ).getvalue()
+            by_style[style] = HeaderSpec(
+                text,
+                header_pattern(compiled, lang, legacy=legacy),
+                len(text.encode("utf-8")) + HEADER_SLACK,
+            )
+        specs[lang] = by_style[style]
+    return specs
+
+
+def header_start(text: str) -> int:
+    """Return where a header should start, after any preamble lines."""
+    match = PREAMBLE_RE.match(text)
+    return match.end() if match else 0
+
+
+def find_header(text: str, pattern: re.Pattern[str]) -> Optional[re.Match[str]]:
+    """Look for the header at the start of the text, after any preamble.
+
+    Blank lines before the header are allowed, and are part of the match.
+    """
+    return pattern.match(text, header_start(text))
+
+
+# the buffer each thread reads the start of the files into, see 'read_prefix'
+_buffers = threading.local()
+
+
+def read_prefix(infile: FileIO, limit: int) -> memoryview:
+    """Read up to 'limit' bytes from the start of an open file.
+
+    The bytes go into a buffer that is reused for every file this thread
+    reads, growing to the limit for the longest header, so however big the
+    files are a scan never holds more than that. The view is only valid until
+    the next call.
+    """
+    buffer: Optional[bytearray] = getattr(_buffers, "buffer", None)
+    if buffer is None or len(buffer) < limit:
+        buffer = _buffers.buffer = bytearray(limit)
+    view = memoryview(buffer)[:limit]
+    size = 0
+    while size < limit and (count := infile.readinto(view[size:])):
+        size += count
+    return view[:size]
+
+
+def _decode_prefix(prefix: memoryview) -> str:
+    """Return the text of a prefix read by 'read_prefix'.
+
+    The prefix may end part way through a character, which is left off.
+
+    Raises:
+        UnicodeDecodeError: If the prefix is not valid UTF-8.
+    """
+    return codecs.getincrementaldecoder("utf-8")().decode(prefix)
+
+
+def _byte_span(text: str, span: tuple[int, int]) -> tuple[int, int]:
+    """Return where a span of characters in the decoded prefix is in bytes."""
+    start, end = span
+    offset = len(text[:start].encode("utf-8"))
+    return offset, offset + len(text[start:end].encode("utf-8"))
+
+
+def _splice(
+    path: str,
+    infile: FileIO,
+    prefix: memoryview,
+    span: tuple[int, int],
+    new: str,
+) -> None:
+    """Atomically rewrite a file with a span of its prefix replaced by 'new'.
+
+    The span is in bytes, see '_byte_span'. The rest of the file is copied
+    across from 'infile' a chunk at a time, so it is never all held in memory
+    and is kept byte for byte.
+    """
+    start, end = span
+
+    def chunks() -> Iterator[bytes]:
+        yield prefix[:start].tobytes()
+        yield new.encode("utf-8")
+        yield prefix[end:].tobytes()
+        while chunk := infile.read(COPY_CHUNK_SIZE):
+            yield chunk
+
+    atomic_write(Path(path), chunks())
+
+
+def _insert(
+    path: str, infile: FileIO, prefix: memoryview, text: str, header: str
+) -> None:
+    """Insert the header into an open file whose prefix has been read."""
+    start = header_start(text)
+    first_line_end = text.find("\n")
+    if first_line_end > 0 and text[first_line_end - 1] == "\r":
+        newline = "\r\n"
+        header = header.replace("\n", newline)
+    else:
+        newline = "\n"
+
+    separator = "" if text.startswith(("\n", "\r\n"), start) else newline
+    # a preamble that ends the file needs a newline before the header
+    before = newline if start and text[start - 1] not in "\n\ufeff" else ""
+    span = _byte_span(text, (start, start))
+    _splice(path, infile, prefix, span, f"{before}{header}{separator}")
+
+
+def insert_header(path: str, header: str) -> None:
+    """Insert the header at the top of the file, after any preamble.
+
+    The header uses the same line endings as the file, and is followed by a
+    blank line unless the file already starts with one. The file is replaced
+    atomically, so it is never left half written.
+    """
+    with Path(path).open("rb", buffering=0) as infile:
+        prefix = read_prefix(infile, len(header.encode()) + HEADER_SLACK)
+        _insert(path, infile, prefix, _decode_prefix(prefix), header)
+
+
+def process_file(
+    path: str, specs: Mapping[str, HeaderSpec], *, insert: bool = True
+) -> str:
+    """Add the header to a single file if it doesn't already have one.
+
+    With 'insert' False the file is only checked, never written to. Only the
+    start of the file is read to check it.
+
+    Returns the outcome, one of INSERTED, MISSING, PRESENT, SKIPPED or ERROR.
+    """
+    spec = specs.get(get_extension(path))
+    if spec is None:
+        return SKIPPED
+    try:
+        with Path(path).open("rb", buffering=0) as infile:
+            prefix = read_prefix(infile, spec.limit)
+            text = _decode_prefix(prefix)
+            if not text.strip():
+                return SKIPPED
+            if find_header(text, spec.pattern):
+                return PRESENT
+            if not insert:
+                return MISSING
+            _insert(path, infile, prefix, text, spec.text)
+    except (OSError, UnicodeDecodeError):
+        return ERROR
+    return INSERTED
+
+
+# the task for a worker process, set up once by '_init_worker' so the header
+# specs are not sent over with every file. These functions only run in the
+# worker processes, so coverage can't see them.
+_worker_task: Callable[[str], Any]
+
+
+def _init_worker(task: Callable[[str], Any]) -> None:
+    """Store the task to run on each file in a new worker process."""
+    global _worker_task  # noqa: PLW0603
+    _worker_task = task  # pragma: no cover
+
+
+def _process_in_worker(path: str) -> Any:  # noqa: ANN401
+    """Run the stored task on a file in this worker."""
+    return _worker_task(path)  # pragma: no cover
+
+
+def default_workers() -> int:
+    """Return the default number of worker processes, one per CPU."""
+    return os.cpu_count() or 1
+
+
+def apply_headers(
+    paths: Iterable[str],
+    specs: Mapping[str, HeaderSpec],
+    *,
+    workers: int = 0,
+    insert: bool = True,
+    cache: Optional[ScanCache] = None,
+) -> Iterator[tuple[str, str]]:
+    """Add the license header to all the files that don't already have one.
+
+    Files with an extension we have no header for are skipped without being
+    opened. The rest are processed by a pool of 'workers' processes (0 means
+    one per CPU), or in this process if 'workers' is 1 or there are too few
+    files to be worth starting a pool for. With 'insert' False the files are
+    only checked, see 'check_headers'.
+
+    If a 'cache' is given, files that haven't changed since it last saw them
+    reuse their verdict without being opened, and the cache is updated with
+    the new verdicts. It is up to the caller to save it.
+
+    Yields (path, outcome) for every file.
+    """
+    # a missing header still needs inserting, whatever the cache says
+    reusable = {PRESENT, SKIPPED} if insert else {PRESENT, SKIPPED, MISSING}
+    wanted: list[str] = []
+    stats: dict[str, Optional[os.stat_result]] = {}
+    for path in paths:
+        # the cache only holds files with an extension we have a header for,
+        # so there is no need to check that again for them
+        cached = cache is not None and path in cache.files
+        if not cached and get_extension(path) not in specs:
+            yield path, SKIPPED
+            continue
+        if cache is not None:
+            stat = stat_file(path)
+            verdict = cache.lookup(path, stat)
+            if verdict in reusable:
+                yield path, verdict
+                continue
+            stats[path] = stat
+        wanted.append(path)
+
+    task = partial(process_file, specs=specs, insert=insert)
+    for path, outcome in process_files(wanted, task, workers):
+        if cache is not None:
+            if outcome == INSERTED:
+                cache.record(path, stat_file(path), PRESENT)
+            else:
+                cache.record(path, stats[path], outcome)
+        yield path, outcome
+
+
+def process_files(
+    wanted: list[str], task: Callable[[str], T], workers: int
+) -> Iterator[tuple[str, T]]:
+    """Run 'task' on each file, in this process or in a pool of 'workers'.
+
+    The task must be picklable, such as a 'partial' of a module function.
+    """
+    workers = workers or default_workers()
+    if workers == 1 or len(wanted) < POOL_THRESHOLD:
+        for path in wanted:
+            yield path, task(path)
+        return
+
+    # split the files evenly, without starting workers that would sit idle
+    chunksize = min(CHUNK_SIZE, -(-len(wanted) // workers))
+    workers = min(workers, -(-len(wanted) // chunksize))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(task,),
+    ) as executor:
+        yield from zip(
+            wanted,
+            executor.map(_process_in_worker, wanted, chunksize=chunksize),
+        )
+
+
+def check_headers(
+    paths: Iterable[str],
+    specs: Mapping[str, HeaderSpec],
+    *,
+    workers: int = 0,
+    cache: Optional[ScanCache] = None,
+) -> Iterator[tuple[str, str]]:
+    """Check which files are missing the license header, without changing any.
+
+    Works the same as 'apply_headers', but gives MISSING instead of adding the
+    header.
+    """
+    return apply_headers(
+        paths, specs, workers=workers, insert=False, cache=cache
+    )
+
+
+def _bump_year(first: str, last: Optional[str], year: str) -> Optional[str]:
+    """Return the year range to bring 'first' to 'last' up to 'year'.
+
+    Returns None if the range already reaches 'year'.
+    """
+    if (last or first) >= year:
+        return None
+    return f"{first}-{year}"
+
+
+def update_year(  # noqa: PLR0911
+    path: str, specs: Mapping[str, HeaderSpec], year: str
+) -> str:
+    """Bring the copyright year in a file's header up to 'year'.
+
+    A single year such as '2023' becomes the range '2023-2024', and a range
+    such as '2019-2023' has its end moved to '2019-2024'. Only the year is
+    changed, so the rest of the header and the line endings are kept. The
+    rest of the file is only read if it needs to be rewritten, which is done
+    atomically a chunk at a time.
+
+    Returns the outcome, one of UPDATED, PRESENT (the year is already up to
+    date), MISSING (there is no header), SKIPPED or ERROR.
+    """
+    spec = specs.get(get_extension(path))
+    if spec is None or "year" not in spec.pattern.groupindex:
+        return SKIPPED
+    try:
+        with Path(path).open("rb", buffering=0) as infile:
+            prefix = read_prefix(infile, spec.limit)
+            text = _decode_prefix(prefix)
+            if not text.strip():
+                return SKIPPED
+            header = find_header(text, spec.pattern)
+            if header is None:
+                return MISSING
+            match = YEAR_RANGE_RE.match(text, header.start("year"))
+            if match is None:
+                # the year has been replaced with something we don't know
+                return SKIPPED
+            new_year = _bump_year(match["first"], match["last"], year)
+            if new_year is None:
+                return PRESENT
+            _splice(
+                path,
+                infile,
+                prefix,
+                _byte_span(text, match.span()),
+                new_year,
+            )
+    except (OSError, UnicodeDecodeError):
+        return ERROR
+    return UPDATED
+
+
+def update_years(
+    paths: Iterable[str],
+    specs: Mapping[str, HeaderSpec],
+    year: str,
+    *,
+    workers: int = 0,
+) -> Iterator[tuple[str, str]]:
+    """Bring the copyright year up to 'year' in the headers of all the files.
+
+    The specs are from 'build_header_specs', and the files are shared out
+    between worker processes in the same way as 'apply_headers'. Files with an
+    extension we have no header for are skipped without being opened.
+
+    Yields (path, outcome) for every file, see 'update_year'.
+    """
+    wanted: list[str] = []
+    for path in paths:
+        if get_extension(path) in specs:
+            wanted.append(path)
+        else:
+            yield path, SKIPPED
+    task = partial(update_year, specs=specs, year=year)
+    yield from process_files(wanted, task, workers)
+
+
+def build_relicense_specs(
+    target: CompiledTemplate,
+    sources: Iterable[CompiledTemplate],
+    *,
+    legacy: bool = False,
+) -> dict[str, RelicenseSpec]:
+    """Build the patterns for the old headers and the new one, per language.
+
+    Languages that share a comment style share the same 'RelicenseSpec'. The
+    result maps each file extension to its spec.
+    """
+    target_specs = build_header_specs(
+        target, dict.fromkeys(target.variables, ""), legacy=legacy
+    )
+    source_specs = [
+        build_header_specs(
+            source, dict.fromkeys(source.variables, ""), legacy=legacy
+        )
+        for source in sources
+    ]
+    by_style: dict[str, RelicenseSpec] = {}
+    specs: dict[str, RelicenseSpec] = {}
+    for lang, target_spec in target_specs.items():
+        style = LANGS[lang]
+        if style not in by_style:
+            found = [spec[lang] for spec in source_specs]
+            by_style[style] = RelicenseSpec(
+                lang,
+                tuple(spec.pattern for spec in found),
+                target_spec.pattern,
+                max(spec.limit for spec in [target_spec, *found]),
+            )
+        specs[lang] = by_style[style]
+    return specs
+
+
+def relicense_file(  # noqa: PLR0913
+    path: str,
+    specs: Mapping[str, RelicenseSpec],
+    target: CompiledTemplate,
+    defaults: Mapping[str, str],
+    overrides: Mapping[str, str],
+    *,
+    legacy: bool = False,
+) -> str:
+    """Replace the old license header in a file with the 'target' header.
+
+    The new header is rendered with the values read from the old one where
+    it has them, so the copyright holder and year carry over. Values in
+    'overrides' are always used, and 'defaults' fills in any that are still
+    missing. The file is opened once, only its start is read to find the
+    header, and the rest is copied across a chunk at a time when it is
+    replaced atomically.
+
+    Returns the outcome, one of REPLACED, PRESENT (it already has the new
+    header), MISSING (it has none of the old headers), SKIPPED or ERROR.
+    """
+    spec = specs.get(get_extension(path))
+    if spec is None:
+        return SKIPPED
+    try:
+        with Path(path).open("rb", buffering=0) as infile:
+            prefix = read_prefix(infile, spec.limit)
+            text = _decode_prefix(prefix)
+            if not text.strip():
+                return SKIPPED
+            if find_header(text, spec.target):
+                return PRESENT
+            old = next(
+                (
+                    match
+                    for pattern in spec.sources
+                    if (match := find_header(text, pattern))
+                ),
+                None,
+            )
+            if old is None:
+                return MISSING
+
+            values = {
+                key: value for key, value in old.groupdict().items() if value
+            }
+            context = {**defaults, **values, **overrides}
+            header = format_license(
+                StringIO(target.render(context)), spec.lang, legacy=legacy
+            ).getvalue()
+            if "\r\n" in old[0]:
+                header = header.replace("\n", "\r\n")
+            _splice(path, infile, prefix, _byte_span(text, old.span()), header)
+    except (OSError, UnicodeDecodeError):
+        return ERROR
+    return REPLACED
+
+
+def relicense_headers(  # noqa: PLR0913
+    paths: Iterable[str],
+    specs: Mapping[str, RelicenseSpec],
+    target: CompiledTemplate,
+    defaults: Mapping[str, str],
+    overrides: Mapping[str, str],
+    *,
+    legacy: bool = False,
+    workers: int = 0,
+) -> Iterator[tuple[str, str]]:
+    """Swap the old license headers for the 'target' one in all the files.
+
+    The specs are from 'build_relicense_specs', and the files are shared out
+    between worker processes in the same way as 'apply_headers'. Files with an
+    extension we have no header for are skipped without being opened.
+
+    Yields (path, outcome) for every file, see 'relicense_file'.
+    """
+    wanted: list[str] = []
+    for path in paths:
+        if get_extension(path) in specs:
+            wanted.append(path)
+        else:
+            yield path, SKIPPED
+    task = partial(
+        relicense_file,
+        specs=specs,
+        target=target,
+        defaults=defaults,
+        overrides=overrides,
+        legacy=legacy,
+    )
+    yield from process_files(wanted, task, workers)
@@ -1,63 +1,120 @@
-"""Helper functions for LICE2."""
+"""Helper functions for LICE2.
+
+These are the helpers for the command line. The pure template functions live
+in 'lice2.rendering', and are imported here too so older code that uses them
+from this module keeps working.
+"""
 
 import getpass
 import json
-import os
 import re
-import subprocess
 import sys
-from contextlib import closing
-from datetime import datetime
-from importlib import resources
+from collections.abc import Iterable, Iterator
+from enum import Enum
 from io import StringIO
 from pathlib import Path
 from types import SimpleNamespace
-from typing import Union
+from typing import Optional
 
 import typer
-from rich.console import Console
-from rich.table import Table
-from rich.text import Text
 
 from lice2.config import settings
-from lice2.constants import LANG_CMT, LANGS, LICENSES
-
-
-def clean_path(p: str) -> str:
-    """Clean a path.
-
-    Expand user and environment variables anensuring absolute path.
-    """
-    expanded = os.path.expandvars(Path(p).expanduser())
-    return str(Path(expanded).resolve())
+from lice2.constants import LANG_CMT, LANGS, LICENSES, get_license_info
+from lice2.gitconfig import get_config_value
+from lice2.profiling import profiler
+from lice2.rendering import (
+    clean_path,
+    extract_file_vars,
+    extract_vars,
+    format_license,
+    generate_license,
+    get_comments,
+    get_local_year,
+    get_suffix,
+    get_template_content,
+    iter_file_template,
+    iter_format_license,
+    iter_lines,
+    load_compiled_template,
+    load_file_template,
+    load_package_template,
+)
+from lice2.template import CompiledTemplate, check_context, render_lines
+
+__all__ = [
+    "ListFormat",
+    "clean_path",
+    "copy_to_clipboard",
+    "extract_file_vars",
+    "extract_vars",
+    "format_license",
+    "generate_header",
+    "generate_license",
+    "get_comments",
+    "get_context",
+    "get_lang",
+    "get_local_year",
+    "get_metadata",
+    "get_organization",
+    "get_suffix",
+    "get_template_content",
+    "guess_organization",
+    "iter_file_template",
+    "iter_format_license",
+    "iter_lines",
+    "list_languages",
+    "list_licenses",
+    "list_vars",
+    "load_compiled_template",
+    "load_file_template",
+    "load_package_template",
+    "render_file_template",
+    "render_package_template",
+    "validate_license",
+    "validate_year",
+    "write_output",
+]
 
 
 def guess_organization() -> str:
     """First, try to get fom the settings file.
 
-    If this is blank, guess the organization from `git config`.
-    If that can't be found, fall back to $USER environment variable.
+    If this is blank, guess the organization from the 'user.name' in the git
+    configuration files (read directly, we do not run 'git' for this). If that
+    can't be found, fall back to $USER environment variable.
     """
     if settings.organization:
         return settings.organization
 
-    try:
-        stdout = subprocess.check_output(
-            ["git", "config", "--get", "user.name"]  # noqa: S607
-        )
-        org = stdout.strip().decode("UTF-8")
-    except subprocess.CalledProcessError:
-        org = getpass.getuser()
-    return org
-
-
-def get_context(args: SimpleNamespace) -> dict[str, str]:
-    """Return the context vars from the provided args."""
-    return {
-        "year": args.year,
-        "organization": args.organization,
-        "project": args.project,
-    }
+    return get_config_value("user.name") or getpass.getuser()
+
+
+def get_organization(args: SimpleNamespace) -> str:
+    """Return the organization, guessing it the first time it is needed.
+
+    The '--org' option defaults to None so that we only go looking in the git
+    config when a template actually uses the organization.
+    """
+    if args.organization is None:
+        with profiler.stage("organization guess"):
+            args.organization = guess_organization()
+    organization: str = args.organization
+    return organization
+
+
+def get_context(
+    args: SimpleNamespace, variables: Optional[Iterable[str]] = None
+) -> dict[str, str]:
+    """Return the context vars from the provided args.
+
+    If 'variables' is given, the organization is only resolved if it is one
+    of them, otherwise it is always included.
+    """
+    context = {"year": args.year}
+    if variables is None or "organization" in variables:
+        context["organization"] = get_organization(args)
+    context["project"] = args.project
+    return context
 
 
 def get_lang(args: SimpleNamespace) -> str:
@@ -74,193 +131,113 @@ def get_lang(args: SimpleNamespace) -> str:
     return lang
 
 
-def list_licenses() -> None:
-    """List available licenses and their template variables."""
-    table = Table(title="Available Licenses")
-    table.add_column("License Name")
-    table.add_column("Variables")
-    for license_name in LICENSES:
-        template = load_package_template(license_name)
-        var_list = extract_vars(template)
-        table.add_row(license_name, ", ".join(var_list))
+class ListFormat(str, Enum):
+    """How to show the lists of licenses and languages."""
 
-    console = Console()
-    console.print(table)
+    TABLE = "table"
+    TSV = "tsv"
+    JSON = "json"
 
-    raise typer.Exit(0)
 
+def list_licenses(list_format: ListFormat = ListFormat.TABLE) -> None:
+    """List available licenses and their template variables.
 
-def list_languages() -> None:
-    """List available source code formatting languages."""
-    console = Console(width=80)
-    languages = sorted(LANGS.keys())
-    text = Text(", ".join(languages))
-    console.print(
-        "The following source code formatting languages are supported:\n"
-    )
-    console.print(text)
-
-    raise typer.Exit(0)
-
-
-def load_file_template(path: str) -> StringIO:
-    """Load template from the specified filesystem path."""
-    template = StringIO()
-    if not Path(path).exists():
-        message = f"path does not exist: {path}"
-        raise ValueError(message)
-    with Path(clean_path(path)).open(mode="rb") as infile:  # opened as binary
-        for line in infile:
-            template.write(line.decode("utf-8"))  # ensure utf-8
-    return template
-
-
-def get_template_content(license_name: str, *, header: bool = False) -> str:
-    """Get the content of a license template as a string.
-
-    Args:
-        license_name: Name of the license template to load
-        header: If True, load the header template instead of the full license
-
-    Returns:
-        The template content as a string
-
-    Raises:
-        FileNotFoundError: If the template doesn't exist
+    This comes from the template index, so no templates are read. The TSV and
+    JSON formats are for other tools, and don't load 'rich' at all. As well
+    as the variables, these show if the license has a source header.
     """
-    filename = (
-        f"template-{license_name}-header.txt"
-        if header
-        else f"template-{license_name}.txt"
-    )
-    package_name = __package__ or __name__.split(".")[0]
-    template_file = resources.files(package_name) / "templates" / filename
-    return template_file.read_text(encoding="utf-8")
-
-
-def load_package_template(
-    license_name: str, *, header: bool = False
-) -> StringIO:
-    """Load license template distributed with package.
-
-    Args:
-        license_name: Name of the license template to load
-        header: If True, load the header template instead of the full license
-
-    Returns:
-        StringIO object containing the template content
-
-    Raises:
-        FileNotFoundError: If the template doesn't exist
-    """
-    content = StringIO()
-    content.write(get_template_content(license_name, header=header))
-    return content
+    infos = {name: get_license_info(name) for name in LICENSES}
+    if list_format is ListFormat.JSON:
+        licenses = [
+            {
+                "name": name,
+                "variables": list(info.variables),
+                "header": info.header,
+            }
+            for name, info in infos.items()
+        ]
+        sys.stdout.write(json.dumps(licenses) + "\n")
+    elif list_format is ListFormat.TSV:
+        sys.stdout.writelines(
+            f"{name}\t{','.join(info.variables)}\t"
+            f"{'true' if info.header else 'false'}\n"
+            for name, info in infos.items()
+        )
+    else:
+        from rich.console import Console  # noqa: PLC0415
+        from rich.table import Table  # noqa: PLC0415
 
+        table = Table(title="Available Licenses")
+        table.add_column("License Name")
+        table.add_column("Variables")
+        for name, info in infos.items():
+            table.add_row(name, ", ".join(info.variables))
 
-def extract_vars(template: StringIO) -> list[str]:
-    """Extract variables from template.
-
-    Variables are enclosed in double curly braces.
-    """
-    keys: set[str] = set()
-    for match in re.finditer(r"\{\{ (?P<key>\w+) \}\}", template.getvalue()):
-        keys.add(match.groups()[0])
-    return sorted(keys)
+        console = Console()
+        console.print(table)
 
+    raise typer.Exit(0)
 
-def generate_license(template: StringIO, context: dict[str, str]) -> StringIO:
-    """Generate a license.
 
-    We extract variables from the template and replace them with the
-    corresponding values in the given context.
+def list_languages(list_format: ListFormat = ListFormat.TABLE) -> None:
+    """List available source code formatting languages."""
+    languages = sorted(LANGS.keys())
+    if list_format is ListFormat.JSON:
+        sys.stdout.write(json.dumps(languages) + "\n")
+    elif list_format is ListFormat.TSV:
+        sys.stdout.writelines(f"{lang}\n" for lang in languages)
+    else:
+        from rich.console import Console  # noqa: PLC0415
+        from rich.text import Text  # noqa: PLC0415
 
-    This could be done with a template engine like 'Jinja2, but we're keeping it
-    simple.
-    """
-    out = StringIO()
-    with closing(template):
-        content = template.getvalue()
-        for key in extract_vars(template):
-            if key not in context:
-                message = f"{key} is missing from the template context"
-                raise ValueError(message)
-            content = content.replace(f"{{{{ {key} }}}}", context[key])
-        out.write(content)
-    return out
-
-
-def get_comments(lang: str, *, legacy: bool) -> tuple[str, str, str]:
-    """Adjust the comment strings for the given language.
-
-    The way it was done previously, extra whitespace was added to the start of
-    the comment lines if the comment was a block comment. This tries to fix
-    that.
-    """
-    prefix, comment, postfix = LANG_CMT[LANGS[lang]]
-    if legacy:
-        return (
-            f"{prefix}\n",
-            f"{comment} ",
-            f"{postfix}\n",
+        console = Console(width=80)
+        text = Text(", ".join(languages))
+        console.print(
+            "The following source code formatting languages are supported:\n"
         )
+        console.print(text)
 
-    if comment:
-        comment = f"{comment} "
-    prefix = f"{prefix}\n" if prefix else ""
-    postfix = f"{postfix}\n" if postfix else ""
-    return prefix, comment, postfix
-
-
-def format_license(
-    template: StringIO, lang: str, *, legacy: bool = False
-) -> StringIO:
-    """Format the StringIO template object for specified lang string.
-
-    Return StringIO object formatted
-    """
-    if not lang:
-        lang = "txt"
+    raise typer.Exit(0)
 
-    prefix, comment, postfix = get_comments(lang, legacy=legacy)
 
-    out = StringIO()
+def render_file_template(path: str, args: SimpleNamespace) -> Iterator[str]:
+    """Render a template file one line at a time, with context from the args.
 
-    with closing(template):
-        template.seek(0)  # from the start of the buffer
-        out.write(prefix)
-        for line in template:
-            # ensure no extra whitespace is added for blank lines
-            out.write(comment if line.strip() else comment.rstrip())
-            out.write(line)
-        out.write(postfix)
+    The file is read through once up front to find the variables it uses, so
+    any that are missing are reported before the output is started.
 
-    return out
+    Raises:
+        ValueError: If the path doesn't exist, or a variable is missing.
+    """
+    with profiler.stage("variable extraction"):
+        variables = extract_file_vars(path)
+    context = get_context(args, variables)
+    check_context(variables, context)
+    return render_lines(iter_file_template(path), context)
 
 
-def get_suffix(name: str) -> Union[str, None]:
-    """Check if file name have valid suffix for formatting.
+def render_package_template(
+    compiled: CompiledTemplate, args: SimpleNamespace
+) -> Iterator[str]:
+    """Render a compiled template one line at a time, with context from args.
 
-    If have suffix, return it else return None.
+    Raises:
+        ValueError: If a variable is missing from the context.
     """
-    a = name.count(".")
-    if a:
-        ext = name.rsplit(".", maxsplit=1)[-1]
-        if ext in LANGS:
-            return ext
-    return None
+    context = get_context(args, compiled.variables)
+    check_context(compiled.variables, context)
+    return iter_lines(compiled.iter_render(context))
 
 
 def list_vars(args: SimpleNamespace, license_name: str) -> None:
     """List the variables for the given template."""
-    context = get_context(args)
-
     if args.template_path:
         template = load_file_template(args.template_path)
     else:
         template = load_package_template(license_name)
 
     var_list = extract_vars(template)
+    context = get_context(args, var_list)
 
     if var_list:
         sys.stdout.write(
@@ -284,40 +261,55 @@ def list_vars(args: SimpleNamespace, license_name: str) -> None:
 def generate_header(args: SimpleNamespace, lang: str) -> None:
     """Generate a file header for the given license and language."""
     if args.template_path:
-        template = load_file_template(args.template_path)
+        lines = render_file_template(args.template_path, args)
     else:
         try:
-            template = load_package_template(args.license, header=True)
+            with profiler.stage("template load"):
+                compiled = load_compiled_template(args.license, header=True)
         except OSError:
             sys.stderr.write(
                 f"Sorry, no source headers are available for {args.license}.\n"
             )
             raise typer.Exit(1) from None
+        lines = render_package_template(compiled, args)
 
-    with closing(template):
-        content = generate_license(template, get_context(args))
-        out = format_license(content, lang, legacy=args.legacy)
-        out.seek(0)
-        if not args.clipboard:
-            sys.stdout.write(out.getvalue())
-        else:
-            try:
-                import pyperclip  # noqa: PLC0415
-
-                pyperclip.copy(out.getvalue())
-                typer.secho(
-                    "License text copied to clipboard",
-                    fg=typer.colors.BRIGHT_GREEN,
-                )
-            except pyperclip.PyperclipException as exc:
-                typer.secho(
-                    f"Error copying to clipboard: {exc}",
-                    fg=typer.colors.BRIGHT_RED,
-                )
-                raise typer.Exit(2) from None
+    write_output(lines, lang, args)
     raise typer.Exit(0)
 
 
+def write_output(
+    lines: Iterable[str],
+    lang: str,
+    args: SimpleNamespace,
+    output: Optional[str] = None,
+) -> None:
+    """Format the rendered lines for 'lang' and write them out.
+
+    They go to the 'output' file if given, otherwise to stdout or the
+    clipboard as the args say. The lines are streamed straight through to
+    stdout or the file, unless the stages are being profiled.
+
+    The 'output' file is replaced atomically, and is left untouched if it
+    already has the same content so its modification time doesn't change.
+    """
+    lines = profiler.collect("render", lines)
+    out = profiler.collect(
+        "format", iter_format_license(lines, lang, legacy=args.legacy)
+    )
+    with profiler.stage("output"):
+        if output:
+            # only needed for a file, and slow to import for the hashing
+            from lice2.writer import write_if_changed  # noqa: PLC0415
+
+            write_if_changed(
+                Path(output), (chunk.encode("utf-8") for chunk in out)
+            )
+        elif not args.clipboard:
+            sys.stdout.writelines(out)
+        else:
+            copy_to_clipboard(StringIO("".join(out)))
+
+
 def validate_year(string: str) -> str:
     """Validate the year is a four-digit number."""
     if not re.match(r"^\d{4}$", string):
@@ -356,10 +348,17 @@ def copy_to_clipboard(out: StringIO) -> None:
 
 
 def get_metadata(args: SimpleNamespace) -> None:
-    """Return metadata for the package as a JSON string."""
+    """Return metadata for the package as a JSON string.
+
+    As well as the lists of license and language names, this has the details
+    of each license (its variables, if it has a source header and the size of
+    the template in bytes) and the comment style used for each language. These
+    all come from the template index and the tables in 'lice2.constants', so
+    no templates are read.
+    """
     licenses = LICENSES
     languages = list(LANGS.keys())
-    organization = args.organization
+    organization = get_organization(args)
     project = args.project
 
     metadata = {
@@ -367,13 +366,20 @@ def get_metadata(args: SimpleNamespace) -> None:
         "licenses": licenses,
         "organization": organization,
         "project": project,
+        "license_info": {
+            info.name: {
+                "variables": list(info.variables),
+                "header": info.header,
+                "size": info.size,
+            }
+            for info in map(get_license_info, licenses)
+        },
+        "language_info": {
+            lang: {"comment_style": style, "comment": LANG_CMT[style]}
+            for lang, style in LANGS.items()
+        },
     }
 
     sys.stdout.write(json.dumps(metadata) + "\n")
 
     raise typer.Exit(0)
-
-
-def get_local_year() -> str:
-    """Return the current year using the local timezone."""
-    return f"{datetime.now().astimezone().year}"
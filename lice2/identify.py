@@ -0,0 +1,387 @@
+"""Work out which of the bundled licenses a LICENSE or COPYING file holds.
+
+Both the templates and the files are normalized the same way first: comment
+markers from 'LANG_CMT' are stripped from the start and end of each line, the
+text is lower cased and all runs of whitespace become a single space. So a
+license that was commented for a language, or rewrapped, still matches.
+
+The fingerprint index is built from the templates once per process. A
+template without variables is matched exactly, by looking the whole of the
+normalized text up in a dict. For the rest, the variables are masked as
+regular expression groups, and the last few words of the text (which hold no
+variable in any of the bundled templates) pick out the few templates it could
+be. Only those are checked in full, so a file is never compared with every
+template.
+
+A license that has been edited, even a little, won't match exactly. For
+those, the similarity index finds the closest templates instead. Each text is
+cut into overlapping runs of a few words (shingles), and a MinHash signature
+of these is split into bands for locality sensitive hashing (LSH). Only the
+templates that share a band with the text are likely to be similar, and only
+those are scored, by the Jaccard similarity of their shingles.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from functools import cache, partial
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from lice2.constants import LANG_CMT, LANGS, LICENSES
+from lice2.headers import ERROR, process_files
+from lice2.rendering import get_template_content
+from lice2.template import VARIABLE_RE
+from lice2.template_index import TEMPLATE_INDEX
+from lice2.walker import iter_files
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+# the outcome for a file that is none of the bundled licenses
+UNKNOWN = "unknown"
+
+# how many words from the end of the text make up its fingerprint
+TAIL_WORDS = 32
+
+# a file this much bigger than the largest template can't be one of them
+MAX_FILE_SIZE = 4 * max(info.size for info in TEMPLATE_INDEX.values())
+
+# the names of the files to look at when we are given a folder, such as
+# 'LICENSE', 'LICENCE-MIT', 'COPYING3' or 'COPYING.LESSER'. See
+# '_is_license_name'
+LICENSE_NAME_RE = re.compile(
+    r"(?:(?:un)?licen[cs]e|copying)\d*(?:[.-][\w.-]*)?", re.IGNORECASE
+)
+# the extensions a license file may have, even though they are also in LANGS
+LICENSE_EXTENSIONS = frozenset({"", ".txt", ".md", ".rst"})
+
+_MARKERS = "|".join(
+    re.escape(marker)
+    for marker in sorted(
+        {part.strip() for parts in LANG_CMT.values() for part in parts},
+        key=len,
+        reverse=True,
+    )
+    if marker
+)
+# any number of comment markers at the start or end of a line, each one
+# standing on its own so the 'C' of Fortran doesn't eat into 'Copyright'
+COMMENT_START_RE = re.compile(
+    rf"^[ \t]*(?:(?:{_MARKERS})(?=\s|$)[ \t]*)+", re.MULTILINE
+)
+# a line that was only markers is already empty, so those at the end always
+# come after a space
+COMMENT_END_RE = re.compile(rf"[ \t](?:(?:{_MARKERS})[ \t]*)+$", re.MULTILINE)
+
+# stands in for a variable while a template is normalized
+SLOT_RE = re.compile(r"\x00(\w+)\x00")
+
+# the words of a normalized text, for the similarity index
+WORD_RE = re.compile(r"\w+")
+
+# how many words in a row make up each shingle
+SHINGLE_WORDS = 4
+
+# the MinHash signature has one value for each bucket of shingle hashes, and
+# is split into bands of a few values for LSH. Two bands of two values finds
+# templates down to about a fifth of the shingles in common
+SIGNATURE_BITS = 6
+SIGNATURE_SIZE = 1 << SIGNATURE_BITS
+BAND_ROWS = 2
+
+# bigger than any value in a signature, for the buckets with no shingles
+_EMPTY = 1 << 64
+
+
+class Identification(NamedTuple):
+    """What was found in a license file.
+
+    'outcome' is the license name, UNKNOWN or ERROR. For an UNKNOWN file,
+    'similar' holds the closest licenses and their scores if they were asked
+    for, see 'similar_licenses'.
+    """
+
+    outcome: str
+    similar: tuple[tuple[str, float], ...] = ()
+
+
+class LicenseIndex(NamedTuple):
+    """The fingerprints of all the bundled license templates.
+
+    'exact' maps the normalized text of each template without variables to
+    its name. 'tails' maps the last words of the others to their names, and
+    'patterns' holds the expression to check each of those with. A template
+    with a variable in its last words can't have a fingerprint, so is in
+    'others' to be checked for every text.
+    """
+
+    exact: dict[str, str]
+    tails: dict[str, tuple[str, ...]]
+    patterns: dict[str, re.Pattern[str]]
+    others: tuple[str, ...]
+
+
+def normalize_text(text: str) -> str:
+    """Return the text as it is compared with the templates.
+
+    Comment markers are stripped from the start and end of each line, and
+    the text is lower cased with all runs of whitespace made a single space.
+    """
+    text = COMMENT_START_RE.sub("", text)
+    text = COMMENT_END_RE.sub("", text)
+    return " ".join(text.lower().split())
+
+
+def _tail(text: str) -> str:
+    """Return the last words of a normalized text, its fingerprint."""
+    return " ".join(text.rsplit(" ", TAIL_WORDS)[-TAIL_WORDS:])
+
+
+def _template_pattern(parts: list[str]) -> re.Pattern[str]:
+    """Return the expression for a normalized template split at its slots.
+
+    Each variable matches anything, and a variable used more than once has
+    to have the same value each time.
+    """
+    pieces: list[str] = []
+    seen: set[str] = set()
+    for index, part in enumerate(parts):
+        if index % 2 == 0:
+            pieces.append(re.escape(part))
+        elif part in seen:
+            pieces.append(f"(?P={part})")
+        else:
+            seen.add(part)
+            pieces.append(f"(?P<{part}>.+?)")
+    return re.compile("".join(pieces))
+
+
+@cache
+def get_license_index() -> LicenseIndex:
+    """Return the fingerprint index, building it the first time."""
+    exact: dict[str, str] = {}
+    tails: dict[str, list[str]] = {}
+    patterns: dict[str, re.Pattern[str]] = {}
+    others: list[str] = []
+    for name in LICENSES:
+        template = VARIABLE_RE.sub(
+            lambda match: f"\x00{match['key']}\x00",
+            get_template_content(name),
+        )
+        text = normalize_text(template)
+        parts = SLOT_RE.split(text)
+        if len(parts) == 1:
+            exact[text] = name
+            continue
+        patterns[name] = _template_pattern(parts)
+        if len(parts[-1].split()) < TAIL_WORDS:
+            others.append(name)
+        else:
+            tails.setdefault(_tail(parts[-1]), []).append(name)
+    return LicenseIndex(
+        exact,
+        {tail: tuple(names) for tail, names in tails.items()},
+        patterns,
+        tuple(others),
+    )
+
+
+class SimilarityIndex(NamedTuple):
+    """The shingles of all the bundled license templates, and their bands.
+
+    'bands' maps each band of a template's signature, along with where it is
+    in the signature, to the names of the templates that have it.
+    """
+
+    shingles: dict[str, frozenset[int]]
+    bands: dict[tuple[int, tuple[int, ...]], tuple[str, ...]]
+
+
+def _hash_shingle(words: tuple[str, ...]) -> int:
+    """Return a 64 bit hash of a shingle.
+
+    Python's own 'hash' is salted differently in each process, which would
+    change the signatures and so the matches from one run to the next.
+    """
+    digest = hashlib.blake2b(" ".join(words).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _shingles(text: str) -> frozenset[int]:
+    """Return the hashes of the shingles of a normalized text."""
+    words = WORD_RE.findall(text)
+    return frozenset(
+        map(
+            _hash_shingle,
+            zip(*(words[start:] for start in range(SHINGLE_WORDS))),
+        )
+    )
+
+
+def _signature(shingles: frozenset[int]) -> tuple[int, ...]:
+    """Return the MinHash signature of a set of shingles.
+
+    This is the one permutation version: the hashes are split into buckets by
+    their lowest bits, and the signature is the smallest of the rest in each
+    bucket. A bucket with no shingles takes the value from the next one that
+    has some, so texts with only a few shingles can still be compared.
+    """
+    values = [_EMPTY] * SIGNATURE_SIZE
+    for shingle in shingles:
+        bucket = shingle & (SIGNATURE_SIZE - 1)
+        values[bucket] = min(values[bucket], shingle >> SIGNATURE_BITS)
+
+    signature = values.copy()
+    following = _EMPTY
+    # go round twice so the last buckets can borrow from the first ones
+    for index in reversed(range(2 * SIGNATURE_SIZE)):
+        value = values[index % SIGNATURE_SIZE]
+        if value != _EMPTY:
+            following = value
+        elif index < SIGNATURE_SIZE:
+            signature[index] = following
+    return tuple(signature)
+
+
+def _bands(signature: tuple[int, ...]) -> Iterator[tuple[int, tuple[int, ...]]]:
+    """Yield the LSH bands of a signature, with where each one starts."""
+    for start in range(0, SIGNATURE_SIZE, BAND_ROWS):
+        yield start, signature[start : start + BAND_ROWS]
+
+
+@cache
+def get_similarity_index() -> SimilarityIndex:
+    """Return the similarity index, building it the first time."""
+    shingles: dict[str, frozenset[int]] = {}
+    bands: dict[tuple[int, tuple[int, ...]], list[str]] = {}
+    for name in LICENSES:
+        text = normalize_text(VARIABLE_RE.sub(" ", get_template_content(name)))
+        shingles[name] = _shingles(text)
+        for band in _bands(_signature(shingles[name])):
+            bands.setdefault(band, []).append(name)
+    return SimilarityIndex(
+        shingles, {band: tuple(names) for band, names in bands.items()}
+    )
+
+
+def _identify(text: str) -> Optional[str]:
+    """Return the name of the bundled license a normalized text is."""
+    index = get_license_index()
+    name = index.exact.get(text)
+    if name is not None:
+        return name
+    for name in (*index.tails.get(_tail(text), ()), *index.others):
+        if index.patterns[name].fullmatch(text):
+            return name
+    return None
+
+
+def _similar(text: str, top: int) -> list[tuple[str, float]]:
+    """Return the licenses most like a normalized text, with their scores."""
+    index = get_similarity_index()
+    shingles = _shingles(text)
+    if not shingles:
+        return []
+    candidates = {
+        name
+        for band in _bands(_signature(shingles))
+        for name in index.bands.get(band, ())
+    }
+    scores = []
+    for name in candidates:
+        common = len(shingles & index.shingles[name])
+        total = len(shingles) + len(index.shingles[name]) - common
+        scores.append((name, common / total))
+    scores.sort(key=lambda score: (-score[1], score[0]))
+    return scores[:top]
+
+
+def identify_text(text: str) -> Optional[str]:
+    """Return the name of the bundled license the text is, or None.
+
+    The text can have any values for the template variables, be commented
+    for any of the supported languages and be wrapped differently.
+    """
+    return _identify(normalize_text(text))
+
+
+def similar_licenses(text: str, top: int = 3) -> list[tuple[str, float]]:
+    """Return up to 'top' of the bundled licenses most like the text.
+
+    Each is returned with its score, from 0 to 1, best first. This is the
+    share of runs of a few words that the text and license have in common, so
+    a license with a clause reworded still scores highly. The text is
+    normalized in the same way as for 'identify_text', but the organization,
+    project and year in it count as a few words that differ.
+
+    Licenses with less than about a fifth in common are not found at all, so
+    there may be fewer than 'top' of them, or none.
+    """
+    return _similar(normalize_text(text), top)
+
+
+def identify_file(path: str, *, top: int = 0) -> Identification:
+    """Identify the license in a file.
+
+    If it isn't an exact match for any license and 'top' is given, up to that
+    many of the most similar licenses are found too. Files too big to be any
+    of the licenses are not read.
+    """
+    try:
+        if os.stat(path).st_size > MAX_FILE_SIZE:  # noqa: PTH116
+            return Identification(UNKNOWN)
+        text = Path(path).read_bytes().decode("utf-8", "replace")
+    except OSError:
+        return Identification(ERROR)
+    text = normalize_text(text)
+    name = _identify(text)
+    if name is not None:
+        return Identification(name)
+    return Identification(UNKNOWN, tuple(_similar(text, top) if top else ()))
+
+
+def _is_license_name(name: str) -> bool:
+    """Return True if the file name is one used for a license.
+
+    Anything after the name is allowed, as in 'COPYING.LESSER', except the
+    extension of a source file, so 'license.py' is skipped.
+    """
+    if not LICENSE_NAME_RE.fullmatch(name):
+        return False
+    extension = os.path.splitext(name)[1].lower()  # noqa: PTH122
+    return extension in LICENSE_EXTENSIONS or extension[1:] not in LANGS
+
+
+def find_license_files(
+    paths: Iterable[str], *, use_git: bool = True
+) -> Iterator[str]:
+    """Yield the license files under the given paths.
+
+    Paths that are files are yielded as-is. In folders, only the files named
+    like a license ('LICENSE', 'LICENCE.txt', 'COPYING', 'UNLICENSE' and so
+    on) are yielded.
+    """
+    for path in paths:
+        if not os.path.isdir(path):  # noqa: PTH112
+            yield path
+            continue
+        for found in iter_files([path], use_git=use_git):
+            if _is_license_name(os.path.basename(found)):  # noqa: PTH119
+                yield found
+
+
+def identify_files(
+    paths: Iterable[str], *, top: int = 0, workers: int = 0
+) -> Iterator[tuple[str, Identification]]:
+    """Identify the license in each file, see 'identify_file'.
+
+    The files are shared out over a pool of 'workers' processes like the
+    header commands, 0 meaning one per CPU. Each worker builds its own index.
+
+    Yields (path, identification) for every file.
+    """
+    task = partial(identify_file, top=top)
+    yield from process_files(list(paths), task, workers)
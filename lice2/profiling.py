@@ -0,0 +1,185 @@
+"""Time each stage of generating a license, to find out why 'lice' is slow.
+
+The stages are always timed, as that only costs a few calls to the clock,
+and means the settings loaded when 'lice2.config' is first imported are
+included. Nothing is reported unless asked for with the '--profile' options
+(or the matching 'LICE_PROFILE' environment variables), and only then are the
+lazy stages run to the end one at a time so they can be timed apart.
+
+For each stage we record the wall time and the net change in the number of
+live memory blocks, from 'sys.getallocatedblocks'. This is not the number of
+allocations: blocks allocated and freed again within a stage cancel out, so a
+stage can show fewer blocks than it allocated, or even a negative number.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, TextIO, TypeVar
+
+if TYPE_CHECKING:
+    import cProfile
+    from collections.abc import Iterable, Iterator
+
+T = TypeVar("T")
+
+# the stage covering everything before the command starts
+STARTUP_STAGE = "imports and options"
+SETTINGS_STAGE = "settings load"
+
+
+class Profiler:
+    """Collect the time taken by each stage, and report it if asked to."""
+
+    def __init__(self) -> None:
+        """Set up an empty profile, with nothing to be reported."""
+        self.started_ns = time.perf_counter_ns()
+        self.started_blocks = sys.getallocatedblocks()
+        # name -> [wall time in ns, net live blocks, number of calls]
+        self.stages: dict[str, list[int]] = {}
+        self.table = False
+        self.json_path: Optional[str] = None
+        self.pstats_path: Optional[str] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+
+    @property
+    def enabled(self) -> bool:
+        """Return True if the stage times are going to be reported."""
+        return self.table or self.json_path is not None
+
+    def configure(
+        self,
+        *,
+        table: bool = False,
+        json_path: Optional[str] = None,
+        pstats_path: Optional[str] = None,
+    ) -> None:
+        """Choose where the results go, starting 'cProfile' if wanted."""
+        self.table = self.table or table
+        self.json_path = json_path or self.json_path
+        if pstats_path and self._cprofile is None:
+            import cProfile  # noqa: PLC0415
+
+            self.pstats_path = pstats_path
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def record(self, name: str, wall_ns: int, blocks: int) -> None:
+        """Add the time and net live blocks for one run of a stage."""
+        entry = self.stages.setdefault(name, [0, 0, 0])
+        entry[0] += wall_ns
+        entry[1] += blocks
+        entry[2] += 1
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the code in the 'with' block as the named stage."""
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(
+                name,
+                time.perf_counter_ns() - start,
+                sys.getallocatedblocks() - blocks,
+            )
+
+    def collect(self, name: str, items: Iterable[T]) -> Iterable[T]:
+        """Run a lazy stage to the end as the named stage, if reporting.
+
+        Otherwise 'items' is returned untouched, so the output is still
+        streamed as usual.
+        """
+        if not self.enabled:
+            return items
+        with self.stage(name):
+            return list(items)
+
+    def mark_started(self, started_ns: int, started_blocks: int) -> None:
+        """Record the time from 'started_ns' up to now as the start up stage.
+
+        The settings load falls in this time too, so it is taken out to stop
+        it being counted twice.
+        """
+        settings = self.stages.get(SETTINGS_STAGE, [0, 0, 0])
+        self.started_ns = min(self.started_ns, started_ns)
+        self.started_blocks = min(self.started_blocks, started_blocks)
+        self.record(
+            STARTUP_STAGE,
+            time.perf_counter_ns() - started_ns - settings[0],
+            sys.getallocatedblocks() - started_blocks - settings[1],
+        )
+
+    def results(self) -> dict[str, Any]:
+        """Return the stages and the total so far, times in milliseconds."""
+        # the start up comes first, as it happened first
+        names = sorted(self.stages, key=lambda name: name != STARTUP_STAGE)
+        return {
+            "total_ms": (time.perf_counter_ns() - self.started_ns) / 1e6,
+            "total_net_blocks": (
+                sys.getallocatedblocks() - self.started_blocks
+            ),
+            "stages": [
+                {
+                    "name": name,
+                    "time_ms": self.stages[name][0] / 1e6,
+                    "net_blocks": self.stages[name][1],
+                    "calls": self.stages[name][2],
+                }
+                for name in names
+            ],
+        }
+
+    def write_table(self, out: TextIO) -> None:
+        """Write the results as a plain text table."""
+        results = self.results()
+        out.write(f"\n{'stage':<22}{'time (ms)':>12}{'net live blocks':>18}\n")
+        out.writelines(
+            f"{stage['name']:<22}{stage['time_ms']:>12.3f}"
+            f"{stage['net_blocks']:>+18}\n"
+            for stage in results["stages"]
+        )
+        out.write(
+            f"{'total':<22}{results['total_ms']:>12.3f}"
+            f"{results['total_net_blocks']:>+18}\n"
+        )
+
+    def reset(self) -> None:
+        """Forget the stages so far, and stop reporting them."""
+        self.stages.clear()
+        self.table = False
+        self.json_path = None
+
+    def report(self) -> None:
+        """Write out everything that was asked for, then reset.
+
+        Failing to write a file is reported, but is not an error.
+        """
+        if self._cprofile is not None and self.pstats_path:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.pstats_path)
+            self._cprofile = None
+        if self.table:
+            self.write_table(sys.stderr)
+        if self.json_path:
+            try:
+                Path(self.json_path).write_text(
+                    json.dumps(self.results(), indent=2) + "\n",
+                    encoding="utf-8",
+                )
+            except OSError as exc:
+                sys.stderr.write(f"Could not write the profile: {exc}\n")
+        self.reset()
+
+
+profiler = Profiler()
+
+# start 'cProfile' straight away if set from the environment, so the whole
+# run is covered instead of just the command
+profiler.configure(pstats_path=os.environ.get("LICE_PROFILE_PSTATS"))
@@ -0,0 +1,229 @@
+"""Load, render and format the license templates.
+
+These are the pure functions behind both the command line and the API. Nothing
+here imports the command line libraries or reads the user's settings, so the
+API stays quick to import for library users.
+"""
+
+import os
+from collections.abc import Iterable, Iterator
+from contextlib import closing
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+from typing import Union
+
+from lice2.cache import template_cache
+from lice2.constants import LANG_CMT, LANGS
+from lice2.template import VARIABLE_RE, CompiledTemplate
+
+
+def clean_path(p: str) -> str:
+    """Clean a path.
+
+    Expand user and environment variables anensuring absolute path.
+    """
+    expanded = os.path.expandvars(Path(p).expanduser())
+    return str(Path(expanded).resolve())
+
+
+def load_file_template(path: str) -> StringIO:
+    """Load template from the specified filesystem path."""
+    template = StringIO()
+    template.writelines(iter_file_template(path))
+    return template
+
+
+def iter_file_template(path: str) -> Iterator[str]:
+    """Return the lines of a template file, read one at a time as needed.
+
+    The path is checked straight away, not when the first line is read.
+    """
+    if not Path(path).exists():
+        message = f"path does not exist: {path}"
+        raise ValueError(message)
+    return _read_lines(clean_path(path))
+
+
+def _read_lines(path: str) -> Iterator[str]:
+    """Yield the lines of a file, decoded as UTF-8."""
+    with Path(path).open(mode="rb") as infile:  # opened as binary
+        for line in infile:
+            yield line.decode("utf-8")  # ensure utf-8
+
+
+def extract_file_vars(path: str) -> list[str]:
+    """Extract variables from a template file, without reading it all in."""
+    found: set[str] = set()
+    for line in iter_file_template(path):
+        if "{{" in line:
+            found.update(VARIABLE_RE.findall(line))
+    return sorted(found)
+
+
+def iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """Split pieces of text into lines, keeping the line endings.
+
+    Like iterating over a 'StringIO', this only splits after a line feed, not
+    on the other line breaks that 'str.splitlines' knows about.
+    """
+    pending = ""
+    for chunk in chunks:
+        start = 0
+        end = chunk.find("\n")
+        while end != -1:
+            yield pending + chunk[start : end + 1]
+            pending = ""
+            start = end + 1
+            end = chunk.find("\n", start)
+        pending += chunk[start:]
+    if pending:
+        yield pending
+
+
+def get_template_content(license_name: str, *, header: bool = False) -> str:
+    """Get the content of a license template as a string.
+
+    This is served from the process-wide template cache after the first read.
+
+    Args:
+        license_name: Name of the license template to load
+        header: If True, load the header template instead of the full license
+
+    Returns:
+        The template content as a string
+
+    Raises:
+        FileNotFoundError: If the template doesn't exist
+    """
+    return template_cache.get(license_name, header=header).text
+
+
+def load_compiled_template(
+    license_name: str, *, header: bool = False
+) -> CompiledTemplate:
+    """Return the compiled version of a license template from the cache.
+
+    Raises:
+        FileNotFoundError: If the template doesn't exist
+    """
+    return template_cache.get(license_name, header=header).compiled
+
+
+def load_package_template(
+    license_name: str, *, header: bool = False
+) -> StringIO:
+    """Load license template distributed with package.
+
+    Args:
+        license_name: Name of the license template to load
+        header: If True, load the header template instead of the full license
+
+    Returns:
+        StringIO object containing the template content
+
+    Raises:
+        FileNotFoundError: If the template doesn't exist
+    """
+    content = StringIO()
+    content.write(get_template_content(license_name, header=header))
+    return content
+
+
+def extract_vars(template: StringIO) -> list[str]:
+    """Extract variables from template.
+
+    Variables are enclosed in double curly braces.
+    """
+    return sorted(set(VARIABLE_RE.findall(template.getvalue())))
+
+
+def generate_license(template: StringIO, context: dict[str, str]) -> StringIO:
+    """Generate a license.
+
+    We compile the template into literal segments and variable slots, then
+    fill in the slots with the corresponding values in the given context.
+
+    This could be done with a template engine like 'Jinja2, but we're keeping it
+    simple.
+    """
+    with closing(template):
+        content = CompiledTemplate(template.getvalue()).render(context)
+    return StringIO(content)
+
+
+def get_comments(lang: str, *, legacy: bool) -> tuple[str, str, str]:
+    """Adjust the comment strings for the given language.
+
+    The way it was done previously, extra whitespace was added to the start of
+    the comment lines if the comment was a block comment. This tries to fix
+    that.
+    """
+    prefix, comment, postfix = LANG_CMT[LANGS[lang]]
+    if legacy:
+        return (
+            f"{prefix}\n",
+            f"{comment} ",
+            f"{postfix}\n",
+        )
+
+    if comment:
+        comment = f"{comment} "
+    prefix = f"{prefix}\n" if prefix else ""
+    postfix = f"{postfix}\n" if postfix else ""
+    return prefix, comment, postfix
+
+
+def format_license(
+    template: StringIO, lang: str, *, legacy: bool = False
+) -> StringIO:
+    """Format the StringIO template object for specified lang string.
+
+    Return StringIO object formatted
+    """
+    out = StringIO()
+
+    with closing(template):
+        template.seek(0)  # from the start of the buffer
+        out.writelines(iter_format_license(template, lang, legacy=legacy))
+
+    return out
+
+
+def iter_format_license(
+    lines: Iterable[str], lang: str, *, legacy: bool = False
+) -> Iterator[str]:
+    """Format lines of text for the specified lang string, a piece at a time.
+
+    This is the streaming version of 'format_license', so the output can be
+    written straight to a file as it is produced.
+
+    Raises:
+        KeyError: If the language is unknown, before anything is yielded.
+    """
+    prefix, comment, postfix = get_comments(lang or "txt", legacy=legacy)
+    blank_comment = comment.rstrip()
+
+    yield prefix
+    for line in lines:
+        # ensure no extra whitespace is added for blank lines
+        yield (comment if line.strip() else blank_comment) + line
+    yield postfix
+
+
+def get_suffix(name: str) -> Union[str, None]:
+    """Check if file name have valid suffix for formatting.
+
+    If have suffix, return it else return None.
+    """
+    a = name.count(".")
+    if a:
+        ext = name.rsplit(".", maxsplit=1)[-1]
+        if ext in LANGS:
+            return ext
+    return None
+
+
+def get_local_year() -> str:
+    """Return the current year using the local timezone."""
+    return f"{datetime.now().astimezone().year}"
@@ -0,0 +1,150 @@
+"""Remember the header verdict for each file between runs of the tree commands.
+
+The cache is a JSON file under the XDG cache folder, one for each working
+folder the commands are run from. For every file it holds the size, mtime_ns
+and inode the file had when it was last looked at, along with the verdict. A
+later run only needs to 'stat' a file, and can reuse the verdict if those are
+all unchanged.
+
+The whole cache is tied to a signature of the header patterns, so a different
+license, an edited template or a changed comment style throws it all away.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Union
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from lice2.headers import HeaderSpec
+
+# bump this if the layout of the cache file changes
+CACHE_VERSION = 1
+
+# files changed this close to the start of a run may be changed again within
+# the same mtime tick without it showing, so their verdicts are not kept
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def get_cache_folder() -> Path:
+    """Return the folder the scan caches are kept in."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "lice"
+
+
+def get_cache_file(cwd: Optional[Union[str, Path]] = None) -> Path:
+    """Return the scan cache file for runs from the given working folder."""
+    folder = os.path.abspath(cwd or Path.cwd())  # noqa: PTH100
+    digest = hashlib.sha256(folder.encode("utf-8")).hexdigest()[:16]
+    return get_cache_folder() / f"scan-{digest}.json"
+
+
+def specs_signature(specs: Mapping[str, HeaderSpec]) -> str:
+    """Return a signature of the header patterns used for each extension.
+
+    Only the patterns are used, not the header text, as a verdict holds
+    whatever values the header variables have.
+    """
+    digest = hashlib.sha256(str(CACHE_VERSION).encode("utf-8"))
+    for ext in sorted(specs):
+        digest.update(f"\x00{ext}\x00{specs[ext].pattern.pattern}".encode())
+    return digest.hexdigest()
+
+
+def stat_file(path: str) -> Optional[os.stat_result]:
+    """Return the result of 'os.stat' for the file, or None if it's gone."""
+    try:
+        return os.stat(path)  # noqa: PTH116
+    except OSError:
+        return None
+
+
+def _stamp(stat: os.stat_result) -> str:
+    """Return the part of a cache entry that identifies a version of a file."""
+    return f"{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}"
+
+
+class ScanCache:
+    """The verdicts from previous runs, for a single set of header specs.
+
+    Paths are stored as given, so runs should use the same form of path
+    (relative or absolute) to get the most out of the cache. Each entry is a
+    single 'size:mtime_ns:inode:verdict' string, as these load a lot faster
+    than nested lists for a big tree.
+    """
+
+    def __init__(self, path: Path, signature: str) -> None:
+        """Load the cache from 'path', unless it has a different signature."""
+        self.path = path
+        self.signature = signature
+        self.started_ns = time.time_ns()
+        self.files: dict[str, str] = {}
+        self.changed = False
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("signature") == signature:
+            self.files = data.get("files", {})
+
+    def lookup(
+        self, path: str, stat: Optional[os.stat_result]
+    ) -> Optional[str]:
+        """Return the last verdict for the file, if it hasn't changed since."""
+        entry = self.files.get(path)
+        if entry is None or stat is None:
+            return None
+        stamp, _, verdict = entry.rpartition(":")
+        # the same as '_stamp', written out as this is called for every file
+        if stamp != f"{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}":
+            return None
+        return verdict
+
+    def record(
+        self, path: str, stat: Optional[os.stat_result], verdict: str
+    ) -> None:
+        """Store the verdict for a file, as it was when 'stat' was taken.
+
+        Files modified too close to the start of this run are forgotten
+        instead, as a later change might not alter their size or mtime.
+        """
+        if stat is None or stat.st_mtime_ns >= self.started_ns - RACY_WINDOW_NS:
+            if self.files.pop(path, None) is not None:
+                self.changed = True
+            return
+        entry = f"{_stamp(stat)}:{verdict}"
+        if self.files.get(path) != entry:
+            self.files[path] = entry
+            self.changed = True
+
+    def save(self) -> None:
+        """Write the cache back to disk, if anything changed.
+
+        The file is replaced atomically, so a run that is interrupted can't
+        leave a broken cache behind. Failing to save is not an error.
+        """
+        if not self.changed:
+            return
+        data = {"signature": self.signature, "files": self.files}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_name = tempfile.mkstemp(
+                dir=self.path.parent, prefix=".scan-", suffix=".tmp"
+            )
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as outfile:
+                json.dump(data, outfile, separators=(",", ":"))
+            os.replace(temp_name, self.path)  # noqa: PTH105
+        except OSError:
+            Path(temp_name).unlink(missing_ok=True)
+            return
+        self.changed = False
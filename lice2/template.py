@@ -0,0 +1,100 @@
+"""Compiled representation of a license template.
+
+A template is parsed once into a list of literal text segments with the
+variable names in between, so rendering it is a single join of the segments
+and the context values instead of one full copy of the text per variable.
+
+Templates can also be rendered a piece or a line at a time, so the output can
+be written out as it is produced rather than built up in memory first.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Mapping
+
+VARIABLE_RE = re.compile(r"\{\{ (?P<key>\w+) \}\}")
+
+
+def check_context(variables: Iterable[str], context: Mapping[str, str]) -> None:
+    """Make sure the context has a value for every variable.
+
+    Raises:
+        ValueError: For the first variable that is not in the context.
+    """
+    for key in variables:
+        if key not in context:
+            message = f"{key} is missing from the template context"
+            raise ValueError(message)
+
+
+def render_lines(
+    lines: Iterable[str], context: Mapping[str, str]
+) -> Iterator[str]:
+    """Render a template one line at a time.
+
+    A variable can't span lines, so this lets a large template be rendered
+    without ever holding the whole of it in memory. Use 'check_context' first
+    to find any missing variables before the output is started.
+
+    Raises:
+        ValueError: If a line uses a variable that is not in the context.
+    """
+
+    def replace(match: re.Match[str]) -> str:
+        key = match["key"]
+        check_context((key,), context)
+        return context[key]
+
+    for line in lines:
+        yield VARIABLE_RE.sub(replace, line) if "{{" in line else line
+
+
+class CompiledTemplate:
+    """A license template split into literal segments and variable slots."""
+
+    __slots__ = ("_parts", "_slots", "variables")
+
+    def __init__(self, text: str) -> None:
+        """Parse the template text.
+
+        Args:
+            text: The raw template, with variables as '{{ name }}'.
+        """
+        # splitting on a pattern with one group alternates literal, variable,
+        # literal, ... always starting and ending with a (maybe empty) literal
+        self._parts: list[str] = VARIABLE_RE.split(text)
+        self._slots: list[str] = self._parts[1::2]
+        self.variables: tuple[str, ...] = tuple(sorted(set(self._slots)))
+
+    def render(self, context: Mapping[str, str]) -> str:
+        """Return the template with the variables replaced from the context.
+
+        Raises:
+            ValueError: If a variable used by the template is not in the
+                context.
+        """
+        check_context(self.variables, context)
+
+        if not self._slots:
+            return self._parts[0]
+
+        parts = self._parts.copy()
+        parts[1::2] = [context[key] for key in self._slots]
+        return "".join(parts)
+
+    def iter_render(self, context: Mapping[str, str]) -> Iterator[str]:
+        """Yield the rendered template in pieces, without joining them.
+
+        The context is checked before anything is yielded.
+
+        Raises:
+            ValueError: If a variable used by the template is not in the
+                context.
+        """
+        check_context(self.variables, context)
+        for index, part in enumerate(self._parts):
+            yield context[part] if index % 2 else part
@@ -0,0 +1,53 @@
+"""Static index of the license templates bundled with LICE2.
+
+DO NOT EDIT - this file is generated by 'lice2/build_index.py', run
+'python -m lice2.build_index' to regenerate it after changing the templates.
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple
+
+
+class LicenseInfo(NamedTuple):
+    """Details of a single bundled license template."""
+
+    name: str
+    variables: tuple[str, ...]
+    header: bool
+    size: int
+
+
+TEMPLATE_INDEX: dict[str, LicenseInfo] = {
+    "afl3": LicenseInfo(
+        "afl3", ("organization", "project", "year"), False, 10383
+    ),
+    "agpl3": LicenseInfo("agpl3", ("organization", "year"), True, 34527),
+    "al2": LicenseInfo("al2", ("organization", "year"), False, 8697),
+    "apache": LicenseInfo("apache", ("organization", "year"), True, 10902),
+    "bsd2": LicenseInfo("bsd2", ("organization", "year"), False, 1327),
+    "bsd3": LicenseInfo(
+        "bsd3", ("organization", "project", "year"), False, 1525
+    ),
+    "cc0": LicenseInfo("cc0", (), True, 7048),
+    "cc_by": LicenseInfo("cc_by", (), True, 19466),
+    "cc_by_nc": LicenseInfo("cc_by_nc", (), True, 20478),
+    "cc_by_nc_nd": LicenseInfo("cc_by_nc_nd", (), True, 18649),
+    "cc_by_nc_sa": LicenseInfo("cc_by_nc_sa", (), True, 22304),
+    "cc_by_nd": LicenseInfo("cc_by_nd", (), True, 17649),
+    "cc_by_sa": LicenseInfo("cc_by_sa", (), True, 22238),
+    "cddl": LicenseInfo("cddl", (), False, 17319),
+    "edl": LicenseInfo("edl", ("organization", "year"), False, 1562),
+    "epl": LicenseInfo("epl", (), False, 11624),
+    "eupl": LicenseInfo("eupl", ("organization", "year"), False, 13720),
+    "gpl2": LicenseInfo("gpl2", (), True, 14972),
+    "gpl3": LicenseInfo("gpl3", (), True, 32472),
+    "isc": LicenseInfo("isc", ("organization", "year"), False, 764),
+    "lgpl": LicenseInfo("lgpl", (), False, 7651),
+    "mit": LicenseInfo("mit", ("organization", "year"), False, 1090),
+    "mpl": LicenseInfo("mpl", (), True, 16725),
+    "ofl": LicenseInfo("ofl", ("organization", "year"), False, 4397),
+    "unlicense": LicenseInfo("unlicense", (), False, 1211),
+    "wtfpl": LicenseInfo("wtfpl", (), True, 478),
+    "zlib": LicenseInfo("zlib", ("organization", "year"), False, 877),
+}
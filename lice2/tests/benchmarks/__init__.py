@@ -0,0 +1 @@
+"""Benchmarks for the start up time of the 'lice' command."""
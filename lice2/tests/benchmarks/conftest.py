@@ -0,0 +1,15 @@
+"""Setup for the start up benchmarks."""
+
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def fake_config() -> None:
+    """Run the benchmarks on the real filesystem.
+
+    This replaces the fixture of the same name for the main tests, which puts
+    each test on a fake filesystem. The benchmarks run 'lice' in separate
+    processes, which can't see that.
+    """
@@ -0,0 +1,241 @@
+"""Guard the start up time of the 'lice' command against regressions.
+
+'lice' is run from git hooks and editor integrations, where starting up is
+nearly all of the time it takes. Each command here is run in a fresh
+interpreter and compared to the times recorded in 'baseline.json'. A test
+fails if it is slower than the baseline by more than the margin, which is a
+fraction of the baseline but never less than a couple of milliseconds.
+
+These are slow and the times depend on the machine, so they only run when
+'LICE_BENCHMARK' is set (use 'poe bench'). Set 'LICE_BENCHMARK_RECORD' too to
+write the times from this machine as the new baseline ('poe bench:record').
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+BASELINE_FILE = Path(__file__).with_name("baseline.json")
+
+# how many runs to take the median of, for warm and cold starts
+WARM_RUNS = int(os.environ.get("LICE_BENCHMARK_RUNS", "9"))
+COLD_RUNS = 3
+
+# how much slower than the baseline is allowed, as a fraction
+MARGIN = float(os.environ.get("LICE_BENCHMARK_MARGIN", "0.25"))
+# the least that is allowed, in ms, so the modules that import in well under
+# a millisecond don't fail on noise
+MIN_MARGIN_MS = float(os.environ.get("LICE_BENCHMARK_MIN_MARGIN_MS", "2"))
+# how many of each unit there are in a millisecond
+PER_MS = {"ms": 1, "us": 1000}
+
+RECORD = bool(os.environ.get("LICE_BENCHMARK_RECORD"))
+
+COMMANDS = {
+    "version": ["--version"],
+    "mit": ["mit"],
+    "header": ["--header", "-l", "py"],
+    "metadata": ["--metadata"],
+}
+
+MODULES = ("lice2.core", "lice2.helpers", "lice2.config", "lice2.constants")
+
+# run the app the same way as the 'lice' script does
+RUN_LICE = (
+    "import sys; sys.argv[0] = 'lice'; from lice2.client import main; main()"
+)
+
+IMPORTTIME_RE = re.compile(r"^import time:\s*\d+ \|\s*(\d+) \|\s*(\S+)$")
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("LICE_BENCHMARK"),
+    reason="set LICE_BENCHMARK to run the start up benchmarks",
+)
+
+
+class Sandbox:
+    """A home folder and bytecode caches for running 'lice' in.
+
+    The home folder has a settings file of its own, so the user's settings
+    and git config don't change the results.
+    """
+
+    def __init__(self, root: Path) -> None:
+        """Create the home folder and settings file under 'root'."""
+        self.root = root
+        self.home = root / "home"
+        settings = self.home / ".config/lice/config.toml"
+        settings.parent.mkdir(parents=True)
+        settings.write_text(
+            "[lice]\ndefault_license = 'apache'\norganization = 'Awesome Co.'\n"
+        )
+        self.warm_cache = root / "pycache"
+        self.cold_count = 0
+
+    def env(self) -> dict[str, str]:
+        """Return the environment to run 'lice' with."""
+        env = {
+            key: value
+            for key, value in os.environ.items()
+            if not key.startswith(("XDG_", "GIT_", "PYTHON"))
+        }
+        env["HOME"] = str(self.home)
+        # time starting up in full, not handing over to a running daemon
+        env["LICE_NO_DAEMON"] = "1"
+        return env
+
+    def run(self, args: list[str], *, cold: bool = False) -> float:
+        """Run 'python' with the given args, returning the time in ms.
+
+        A cold run uses an empty bytecode cache, so every module has to be
+        compiled as it would be the first time after installing.
+        """
+        if cold:
+            self.cold_count += 1
+            cache = self.root / f"cold-{self.cold_count}"
+        else:
+            cache = self.warm_cache
+        command = [sys.executable, "-X", f"pycache_prefix={cache}", *args]
+        start = time.perf_counter()
+        subprocess.run(  # noqa: S603
+            command,
+            cwd=self.root,
+            env=self.env(),
+            capture_output=True,
+            check=True,
+        )
+        return (time.perf_counter() - start) * 1000
+
+    def import_times(self) -> dict[str, int]:
+        """Return the cumulative import time of each module in microseconds.
+
+        This is from 'python -X importtime', with a warm bytecode cache.
+        """
+        result = subprocess.run(  # noqa: S603
+            [
+                sys.executable,
+                "-X",
+                f"pycache_prefix={self.warm_cache}",
+                "-X",
+                "importtime",
+                "-c",
+                "import lice2.core",
+            ],
+            cwd=self.root,
+            env=self.env(),
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        times: dict[str, int] = {}
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match and match[2] in MODULES:
+                times[match[2]] = int(match[1])
+        return times
+
+
+def load_baseline() -> dict[str, dict[str, float]]:
+    """Return the recorded baseline, or an empty one if there is none."""
+    try:
+        baseline: dict[str, dict[str, float]] = json.loads(
+            BASELINE_FILE.read_text(encoding="utf-8")
+        )
+    except FileNotFoundError:
+        return {"startup_ms": {}, "import_us": {}}
+    return baseline
+
+
+@pytest.fixture(scope="module")
+def sandbox(tmp_path_factory: pytest.TempPathFactory) -> Sandbox:
+    """Return a sandbox with the bytecode cache already warmed up."""
+    sandbox = Sandbox(tmp_path_factory.mktemp("lice-bench"))
+    for args in COMMANDS.values():
+        sandbox.run(["-c", RUN_LICE, *args])
+    return sandbox
+
+
+@pytest.fixture(scope="module")
+def results() -> Iterator[dict[str, dict[str, float]]]:
+    """Collect the times, writing them as the baseline if recording."""
+    collected: dict[str, dict[str, float]] = {"startup_ms": {}, "import_us": {}}
+    yield collected
+    if RECORD:
+        BASELINE_FILE.write_text(
+            json.dumps(collected, indent=2, sort_keys=True) + "\n",
+            encoding="utf-8",
+        )
+
+
+def check_budget(
+    section: str, name: str, value: float, results: dict[str, dict[str, float]]
+) -> None:
+    """Record a time, and fail if it is over the baseline plus the margin."""
+    results[section][name] = round(value, 1)
+    limit = load_baseline()[section].get(name)
+    if RECORD or limit is None:
+        return
+    unit = section.rpartition("_")[2]
+    allowed = max(limit * MARGIN, MIN_MARGIN_MS * PER_MS[unit])
+    assert value <= limit + allowed, (
+        f"{name} took {value:.1f}{unit}, over the baseline of "
+        f"{limit:.1f}{unit} by more than {allowed:.1f}{unit}"
+    )
+
+
+@pytest.mark.parametrize("command", COMMANDS)
+def test_startup_time(
+    command: str,
+    sandbox: Sandbox,
+    results: dict[str, dict[str, float]],
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test the cold and warm start up time of a command."""
+    args = ["-c", RUN_LICE, *COMMANDS[command]]
+    cold = statistics.median(
+        sandbox.run(args, cold=True) for _ in range(COLD_RUNS)
+    )
+    warm = statistics.median(sandbox.run(args) for _ in range(WARM_RUNS))
+
+    with capsys.disabled():
+        sys.stdout.write(
+            f"\nlice {' '.join(COMMANDS[command])}: "
+            f"cold {cold:.1f}ms, warm {warm:.1f}ms\n"
+        )
+
+    check_budget("startup_ms", f"{command}:cold", cold, results)
+    check_budget("startup_ms", f"{command}:warm", warm, results)
+
+
+def test_import_times(
+    sandbox: Sandbox,
+    results: dict[str, dict[str, float]],
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test the time taken to import each of the main modules."""
+    runs = [sandbox.import_times() for _ in range(WARM_RUNS)]
+
+    with capsys.disabled():
+        sys.stdout.write("\ncumulative import times:\n")
+        for module in MODULES:
+            sys.stdout.write(
+                f"  {module:<16} "
+                f"{statistics.median(run[module] for run in runs):>8.0f}us\n"
+            )
+
+    for module in MODULES:
+        median = statistics.median(run[module] for run in runs)
+        check_budget("import_us", module, median, results)
@@ -8,7 +8,13 @@ from typing import TYPE_CHECKING
 
 import pytest
 
+# 'lice' only loads 'rich' when it has something to show, and pyfakefs unloads
+# any modules first imported during a test. Load it up front so every test
+# shares the same 'rich' classes.
+import typer.rich_utils  # noqa: F401
+
 from lice2.api import Lice
+from lice2.cache import template_cache
 
 if TYPE_CHECKING:
     from pyfakefs.fake_filesystem import FakeFilesystem
@@ -48,6 +54,12 @@ def fake_config(fs: FakeFilesystem) -> FakeFilesystem:
     return fs
 
 
+@pytest.fixture(autouse=True)
+def clear_template_cache() -> None:
+    """Make sure no cached templates leak from one test to the next."""
+    template_cache.clear()
+
+
 @pytest.fixture
 def args() -> SimpleNamespace:
     """Fixture to return a default args object."""
@@ -1,8 +1,15 @@
 """Test suite for the programmatic API of lice2."""
 
+import subprocess
+import sys
+from io import StringIO
+
 import pytest
+from pyfakefs.fake_filesystem import FakeFilesystem
+from pytest_mock import MockerFixture
 
-from lice2.api import Lice
+import lice2.api
+from lice2.api import Lice, LiceEvent, add_observer, remove_observer
 from lice2.api.exceptions import (
     HeaderNotFoundError,
     InvalidYearError,
@@ -113,6 +120,23 @@ class TestAPI:
         assert len(licenses) == len(LICENSES)
         assert all(isinstance(license_name, str) for license_name in licenses)
 
+    def test_identify_license(self, lice: Lice) -> None:
+        """Test a license is identified whatever values it was made with."""
+        other = Lice(organization="Other Ltd", project="x", year="1999")
+
+        assert lice.identify_license(other.get_license("bsd3", "py")) == "bsd3"
+        assert lice.identify_license("Not a license.") is None
+
+    def test_similar_licenses(self, lice: Lice) -> None:
+        """Test the licenses most like an edited one are returned."""
+        text = lice.get_license("mit").replace("free of charge", "for a fee")
+
+        similar = lice.similar_licenses(text, top=2)
+
+        assert lice.identify_license(text) is None
+        assert similar[0][0] == "mit"
+        assert len(similar) <= 2  # noqa: PLR2004
+
     def test_get_languages(self, lice: Lice) -> None:
         """Test that get_languages returns a list of languages."""
         languages = lice.get_languages()
@@ -185,3 +209,176 @@ class TestAPI:
             lice.get_header("gpl3", language="unknown_language")
         assert str(exc_info.value) == "Language 'unknown_language' is unknown."
         assert exc_info.value.language_name == "unknown_language"
+
+    def test_render_many(self, lice: Lice) -> None:
+        """Test render_many gives the same text as the single methods."""
+        requests = [
+            ("mit", "", False),
+            ("mit", "py", False),
+            ("apache", "js", True),
+            ("apache", "rs", True),
+            ("apache", "", True),
+            ("mit", "py", False),  # duplicates are fine
+        ]
+
+        results = lice.render_many(requests)
+
+        assert len(results) == 5  # noqa: PLR2004
+        for license_name, language, header in requests:
+            if header:
+                expected = lice.get_header(license_name, language)
+            else:
+                expected = lice.get_license(license_name, language)
+            assert results[license_name, language, header] == expected
+
+    def test_render_many_renders_once(
+        self, lice: Lice, mocker: MockerFixture
+    ) -> None:
+        """Test each template is only rendered once for many languages."""
+        spy = mocker.spy(lice, "_render")
+
+        lice.render_many([("gpl3", lang, True) for lang in LANGS])
+
+        spy.assert_called_once_with("gpl3", header=True)
+
+    def test_render_many_errors(self, lice: Lice) -> None:
+        """Test render_many raises the same errors as the single methods."""
+        with pytest.raises(LicenseNotFoundError):
+            lice.render_many([("mit", "py", False), ("bad", "py", False)])
+        with pytest.raises(HeaderNotFoundError):
+            lice.render_many([("mit", "py", True)])
+        with pytest.raises(LanguageNotFoundError):
+            lice.render_many([("mit", "bad", False)])
+
+    @pytest.mark.parametrize("language", ["", "py", "c"])
+    def test_write_license(self, lice: Lice, language: str) -> None:
+        """Test writing a license gives the same text as 'get_license'."""
+        out = StringIO()
+
+        lice.write_license(out, "afl3", language)
+
+        assert out.getvalue() == lice.get_license("afl3", language)
+
+    def test_write_header(self, lice: Lice) -> None:
+        """Test writing a header gives the same text as 'get_header'."""
+        out = StringIO()
+
+        lice.write_header(out, "gpl3", "rs")
+
+        assert out.getvalue() == lice.get_header("gpl3", "rs")
+
+    def test_write_errors(self, lice: Lice) -> None:
+        """Test nothing is written for a bad license, header or language."""
+        out = StringIO()
+        with pytest.raises(LicenseNotFoundError):
+            lice.write_license(out, "unknown_license")
+        with pytest.raises(HeaderNotFoundError):
+            lice.write_header(out, "mit")
+        with pytest.raises(LanguageNotFoundError):
+            lice.write_license(out, "mit", "unknown_language")
+
+        assert out.getvalue() == ""
+
+    def test_import_skips_cli(self, fs: FakeFilesystem) -> None:
+        """Test using the API doesn't load the command line libraries.
+
+        Nor should it read the user's settings. This needs a fresh
+        interpreter, as the tests have already imported them.
+        """
+        code = (
+            "import sys\n"
+            "from lice2.api import Lice\n"
+            "Lice('Awesome Co.', 'proj').get_header('apache', 'py')\n"
+            "print(' '.join(sorted({m.split('.')[0] for m in sys.modules})))\n"
+            "print('lice2.config' in sys.modules)\n"
+        )
+        fs.pause()
+        try:
+            result = subprocess.run(  # noqa: S603
+                [sys.executable, "-c", code],
+                capture_output=True,
+                check=True,
+                text=True,
+            )
+        finally:
+            fs.resume()
+
+        modules, config_loaded = result.stdout.splitlines()
+        assert {"typer", "rich", "click", "asyncio"}.isdisjoint(modules.split())
+        assert config_loaded == "False"
+
+    def test_unknown_attribute(self) -> None:
+        """Test the lazy imports still raise for unknown names."""
+        with pytest.raises(AttributeError, match="no attribute 'Nope'"):
+            _ = lice2.api.Nope
+
+
+class TestObservers:
+    """Test the observers are told about each call."""
+
+    def test_instance_observer(self, lice: Lice) -> None:
+        """Test an event is sent for every call, with the right details."""
+        events: list[LiceEvent] = []
+        lice.add_observer(events.append)
+
+        text = lice.get_license("mit", "py")
+        lice.get_header("apache")
+        out = StringIO()
+        lice.write_header(out, "apache", "rs")
+
+        assert [event.operation for event in events] == [
+            "get_license",
+            "get_header",
+            "write_header",
+        ]
+        first = events[0]
+        assert first[:5] == ("get_license", "mit", "py", False, False)
+        assert first.size == len(text.encode("utf-8"))
+        assert first.elapsed_ns > 0
+        assert events[1].header
+        assert not events[1].cache_hit
+        assert events[2].cache_hit
+        assert events[2].size == len(out.getvalue().encode("utf-8"))
+
+        lice.remove_observer(events.append)
+        lice.get_license("mit")
+        assert len(events) == 3  # noqa: PLR2004
+
+    def test_render_many_events(self, lice: Lice) -> None:
+        """Test render_many sends one event for each distinct request."""
+        events: list[LiceEvent] = []
+        lice.add_observer(events.append)
+
+        lice.render_many(
+            [("gpl3", "py", True), ("gpl3", "js", True), ("gpl3", "py", True)]
+        )
+
+        assert [(e.operation, e.language, e.cache_hit) for e in events] == [
+            ("render_many", "py", False),
+            ("render_many", "js", True),
+        ]
+
+    def test_process_observer(self, lice: Lice) -> None:
+        """Test a process-wide observer sees calls on every object."""
+        events: list[LiceEvent] = []
+        add_observer(events.append)
+        try:
+            lice.get_license("mit")
+            Lice(organization="Other", project="x").get_license("bsd3")
+        finally:
+            remove_observer(events.append)
+        lice.get_license("mit")
+
+        assert [event.license_name for event in events] == ["mit", "bsd3"]
+
+    def test_no_event_for_errors(self, lice: Lice) -> None:
+        """Test calls that fail don't send an event."""
+        events: list[LiceEvent] = []
+        lice.add_observer(events.append)
+
+        with pytest.raises(LanguageNotFoundError):
+            lice.write_license(StringIO(), "mit", "unknown_language")
+
+        assert events == []
+        with pytest.raises(ValueError, match=r"x not in list"):
+            lice.remove_observer(print)
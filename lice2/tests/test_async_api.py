@@ -0,0 +1,180 @@
+"""Test the asyncio version of the API."""
+
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import pytest
+
+from lice2.api import (
+    AsyncLice,
+    Lice,
+    LiceEvent,
+    add_observer,
+    async_api,
+    remove_observer,
+)
+from lice2.api.exceptions import (
+    HeaderNotFoundError,
+    InvalidYearError,
+    LanguageNotFoundError,
+    LicenseNotFoundError,
+)
+from lice2.constants import LANGS, LICENSES
+
+if TYPE_CHECKING:
+    from pytest_mock import MockerFixture
+
+
+def make_lice(**kwargs: object) -> AsyncLice:
+    """Return an AsyncLice instance for the tests."""
+    return AsyncLice(
+        organization="Awesome Co.",
+        project="my_project",
+        **kwargs,  # type: ignore[arg-type]
+    )
+
+
+class TestAsyncAPI:
+    """Test the AsyncLice class."""
+
+    def test_matches_lice(self, lice: Lice) -> None:
+        """Test the text is the same as from the plain API."""
+
+        async def run() -> list[str]:
+            async with make_lice() as alice:
+                assert alice.organization == "Awesome Co."
+                assert alice.project == "my_project"
+                assert alice.year == lice.year
+                assert await alice.get_licenses() == LICENSES
+                assert await alice.get_languages() == list(LANGS)
+                return [
+                    await alice.get_license("mit"),
+                    await alice.get_license("mit", "py"),
+                    await alice.get_header("apache", "js"),
+                ]
+
+        assert asyncio.run(run()) == [
+            lice.get_license("mit"),
+            lice.get_license("mit", "py"),
+            lice.get_header("apache", "js"),
+        ]
+
+    def test_invalid_year(self) -> None:
+        """Test the year is checked the same way as the plain API."""
+        with pytest.raises(InvalidYearError):
+            make_lice(year="202")
+
+    def test_errors(self) -> None:
+        """Test bad requests raise the same exceptions as the plain API."""
+
+        async def run() -> None:
+            async with make_lice() as alice:
+                with pytest.raises(LicenseNotFoundError):
+                    await alice.get_license("nope")
+                with pytest.raises(HeaderNotFoundError):
+                    await alice.get_header("mit")
+                with pytest.raises(LanguageNotFoundError):
+                    await alice.get_license("mit", "nope")
+                with pytest.raises(LanguageNotFoundError):
+                    await alice.render_many(
+                        [("mit", "py", False), ("mit", "nope", False)]
+                    )
+
+        asyncio.run(run())
+
+    def test_warm_requests_skip_executor(self, mocker: MockerFixture) -> None:
+        """Test text generated before is served without the thread pool."""
+
+        async def run() -> None:
+            async with make_lice() as alice:
+                first = await alice.get_header("apache", "py")
+                spy = mocker.spy(alice, "_get_executor")
+                assert await alice.get_header("apache", "py") == first
+                spy.assert_not_called()
+
+        asyncio.run(run())
+
+    def test_concurrent_loads_coalesced(self, mocker: MockerFixture) -> None:
+        """Test concurrent requests for a cold template share one load."""
+        spy = mocker.spy(async_api, "load_compiled_template")
+
+        async def run() -> dict[tuple[str, str, bool], str]:
+            async with make_lice() as alice:
+                texts = await asyncio.gather(
+                    *(alice.get_header("apache", lang) for lang in LANGS),
+                    *(alice.get_header("apache", "py") for _ in range(5)),
+                )
+                assert texts[-1] == texts[list(LANGS).index("py")]
+                return await alice.render_many(
+                    [("apache", lang, True) for lang in LANGS]
+                )
+
+        texts = asyncio.run(run())
+
+        spy.assert_called_once_with("apache", header=True)
+        assert texts == Lice("Awesome Co.", "my_project").render_many(
+            [("apache", lang, True) for lang in LANGS]
+        )
+
+    def test_text_memory_bounded(self) -> None:
+        """Test only the most recent texts are kept in memory."""
+
+        async def run() -> AsyncLice:
+            async with make_lice(max_texts=2) as alice:
+                await alice.get_license("mit")
+                await alice.get_license("mit", "py")
+                await alice.get_license("mit")
+                await alice.get_license("mit", "js")
+                return alice
+
+        alice = asyncio.run(run())
+        assert list(alice._texts) == [  # noqa: SLF001
+            ("mit", "", False),
+            ("mit", "js", False),
+        ]
+
+    def test_observers(self) -> None:
+        """Test events are sent for cold and warm requests alike."""
+        events: list[LiceEvent] = []
+        process_events: list[LiceEvent] = []
+
+        async def run() -> None:
+            async with make_lice() as alice:
+                alice.add_observer(events.append)
+                await alice.get_header("apache", "py")
+                await alice.get_header("apache", "py")
+                await alice.render_many([("apache", "js", True)])
+                alice.remove_observer(events.append)
+                await alice.get_license("mit")
+
+        add_observer(process_events.append)
+        try:
+            asyncio.run(run())
+        finally:
+            remove_observer(process_events.append)
+
+        assert [(e.operation, e.language, e.cache_hit) for e in events] == [
+            ("get_header", "py", False),
+            ("get_header", "py", True),
+            ("render_many", "js", True),
+        ]
+        assert events[0].size == events[1].size > 0
+        assert process_events[:3] == events
+        assert process_events[3].license_name == "mit"
+
+    def test_own_executor_left_running(self) -> None:
+        """Test an executor passed in is used but not shut down."""
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        async def run() -> str:
+            async with make_lice(executor=executor) as alice:
+                return await alice.get_license("mit")
+
+        try:
+            assert asyncio.run(run()).startswith("The MIT License")
+            assert executor.submit(str, 1).result() == "1"
+        finally:
+            executor.shutdown()
@@ -0,0 +1,273 @@
+"""Test generating many license files from a manifest."""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+from typer.testing import CliRunner
+
+from lice2 import batch
+from lice2.batch import (
+    ERROR,
+    UNCHANGED,
+    WRITTEN,
+    BatchEntry,
+    ManifestError,
+    load_manifest,
+    render_entries,
+    write_entries,
+)
+from lice2.core import app
+
+if TYPE_CHECKING:
+    from pyfakefs.fake_filesystem import FakeFilesystem
+    from pytest_mock import MockerFixture
+
+runner = CliRunner()
+
+MANIFEST = """\
+[defaults]
+license = "mit"
+organization = "Awesome Co."
+
+[[files]]
+path = "packages/foo/LICENSE"
+
+[[files]]
+path = "packages/bar/LICENSE.txt"
+license = "bsd3"
+project = "Bar"
+year = 2019
+
+[[files]]
+path = "packages/baz/license_header.py"
+license = "apache"
+organization = "Baz Ltd."
+"""
+
+
+def entry(path: str, license_name: str = "mit", **values: str) -> BatchEntry:
+    """Return an entry with the usual test values unless given others."""
+    return BatchEntry(
+        Path(path),
+        license_name,
+        values.get("organization"),
+        values.get("project", "lice"),
+        values.get("year", "2024"),
+        values.get("language", ""),
+    )
+
+
+class TestLoadManifest:
+    """Test reading and checking the manifest."""
+
+    def test_load(self, fs: FakeFilesystem) -> None:
+        """Test the defaults and the values from the path are filled in."""
+        fs.create_file("/repo/lice.toml", contents=MANIFEST)
+
+        entries = load_manifest(
+            Path("/repo/lice.toml"), license_name="isc", year="2024"
+        )
+
+        assert entries == [
+            BatchEntry(
+                Path("/repo/packages/foo/LICENSE"),
+                "mit",
+                "Awesome Co.",
+                "foo",
+                "2024",
+                "",
+            ),
+            BatchEntry(
+                Path("/repo/packages/bar/LICENSE.txt"),
+                "bsd3",
+                "Awesome Co.",
+                "Bar",
+                "2019",
+                "txt",
+            ),
+            BatchEntry(
+                Path("/repo/packages/baz/license_header.py"),
+                "apache",
+                "Baz Ltd.",
+                "baz",
+                "2024",
+                "py",
+            ),
+        ]
+
+    def test_defaults_from_options(self, fs: FakeFilesystem) -> None:
+        """Test the license and year given are used without a [defaults]."""
+        fs.create_file("/repo/lice.toml", contents='[[files]]\npath = "L"\n')
+
+        (only,) = load_manifest(
+            Path("/repo/lice.toml"), license_name="isc", year="2001"
+        )
+
+        assert only.license_name == "isc"
+        assert only.year == "2001"
+        assert only.organization is None
+
+    @pytest.mark.parametrize(
+        ("contents", "error"),
+        [
+            ("[[files]\n", "Could not read"),
+            ("[defaults]\nlicense = 'mit'\n", "has no [[files]]"),
+            ("files = 'LICENSE'\n", "has no [[files]]"),
+            ("defaults = 1\n[[files]]\npath = 'L'\n", "must be a table"),
+            ("[[files]]\npath = 'L'\nlicence = 'mit'\n", "Unknown key(s)"),
+            ("[[files]]\nproject = 'x'\n", "has no 'path'"),
+            ("[[files]]\npath = 'L'\nlicense = 'nope'\n", "unknown license"),
+            ("[[files]]\npath = 'L'\nyear = '24'\n", "invalid year"),
+            ("[[files]]\npath = 'L'\nlanguage = 'zz'\n", "unknown language"),
+        ],
+    )
+    def test_invalid(
+        self, fs: FakeFilesystem, contents: str, error: str
+    ) -> None:
+        """Test a manifest with mistakes in it is rejected."""
+        fs.create_file("/repo/lice.toml", contents=contents)
+
+        with pytest.raises(ManifestError, match=re.escape(error)):
+            load_manifest(
+                Path("/repo/lice.toml"), license_name="mit", year="2024"
+            )
+
+    def test_missing(self) -> None:
+        """Test a manifest that doesn't exist is rejected."""
+        with pytest.raises(ManifestError, match="Could not read"):
+            load_manifest(Path("/nope.toml"), license_name="mit", year="2024")
+
+
+class TestRenderAndWrite:
+    """Test rendering the entries and writing them out."""
+
+    def test_render_reuses_text(self, mocker: MockerFixture) -> None:
+        """Test each license is only rendered once for the same values."""
+        format_spy = mocker.spy(batch, "iter_format_license")
+        entries = [
+            entry("/a/LICENSE"),
+            entry("/b/LICENSE"),
+            entry("/c/header.py", language="py"),
+            entry("/d/LICENSE", organization="Other"),
+        ]
+
+        texts = dict(render_entries(entries, organization="Awesome Co."))
+
+        assert format_spy.call_count == 3  # noqa: PLR2004
+        assert texts[entries[0]] is texts[entries[1]]
+        assert "Copyright (c) 2024 Awesome Co." in texts[entries[0]]
+        assert texts[entries[2]].startswith("# The MIT License")
+        assert "Copyright (c) 2024 Other" in texts[entries[3]]
+
+    def test_write(self, fs: FakeFilesystem) -> None:
+        """Test the files are written in order, making their folders."""
+        fs.create_file("/blocked")
+        rendered = [
+            (entry("/out/one/LICENSE"), "one\n"),
+            (entry("/blocked/LICENSE"), "two\n"),
+            (entry("/out/three/LICENSE"), "three\n"),
+            (entry("/out/four/LICENSE"), "four\n"),
+        ]
+        fs.create_file("/out/four/LICENSE", contents="four\n")
+
+        outcomes = [
+            outcome for _, outcome in write_entries(rendered, workers=2)
+        ]
+
+        assert outcomes == [WRITTEN, ERROR, WRITTEN, UNCHANGED]
+        assert Path("/out/one/LICENSE").read_text() == "one\n"
+        assert Path("/out/three/LICENSE").read_text() == "three\n"
+
+
+class TestBatchCommand:
+    """Test the 'lice batch' command."""
+
+    def test_batch(self, fs: FakeFilesystem) -> None:
+        """Test every file in the manifest is generated."""
+        fs.create_file("/repo/lice.toml", contents=MANIFEST)
+
+        result = runner.invoke(
+            app, ["batch", "/repo/lice.toml", "--year", "2024", "--verbose"]
+        )
+
+        assert result.exit_code == 0
+        assert "Wrote 3 license file(s)" in result.stdout
+
+        again = runner.invoke(app, ["batch", "/repo/lice.toml", "-y", "2024"])
+        assert "Wrote 0 license file(s)" in again.stdout
+        assert "3 already up to date" in again.stdout
+        assert "Wrote bsd3: /repo/packages/bar/LICENSE.txt" in result.stdout
+        foo = Path("/repo/packages/foo/LICENSE").read_text()
+        assert "Copyright (c) 2024 Awesome Co." in foo
+        bar = Path("/repo/packages/bar/LICENSE.txt").read_text()
+        assert "Copyright (c) 2019, Awesome Co." in bar
+        assert "Bar" in bar
+        baz = Path("/repo/packages/baz/license_header.py").read_text()
+        assert baz.startswith("#")
+        assert "Baz Ltd." in baz
+
+    def test_batch_guesses_organization_once(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test the organization is only guessed once for all the entries."""
+        guess = mocker.patch(
+            "lice2.helpers.guess_organization", return_value="Guessed"
+        )
+        fs.create_file(
+            "/repo/lice.toml",
+            contents="".join(
+                f'[[files]]\npath = "p{n}/LICENSE"\n' for n in range(5)
+            ),
+        )
+
+        result = runner.invoke(
+            app, ["batch", "/repo/lice.toml", "--license", "mit"]
+        )
+
+        assert result.exit_code == 0
+        guess.assert_called_once()
+        assert "Guessed" in Path("/repo/p4/LICENSE").read_text()
+
+    def test_batch_no_guess_needed(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test nothing is guessed if no template uses the organization."""
+        guess = mocker.patch("lice2.helpers.guess_organization")
+        fs.create_file("/repo/lice.toml", contents='[[files]]\npath = "L"\n')
+
+        result = runner.invoke(
+            app, ["batch", "/repo/lice.toml", "--license", "gpl3"]
+        )
+
+        assert result.exit_code == 0
+        guess.assert_not_called()
+
+    def test_batch_invalid_manifest(self, fs: FakeFilesystem) -> None:
+        """Test a mistake in the manifest is shown as a usage error."""
+        fs.create_file("/repo/lice.toml", contents="[[files]]\nyear = 1\n")
+
+        result = runner.invoke(app, ["batch", "/repo/lice.toml"])
+
+        assert result.exit_code == 2  # noqa: PLR2004
+        assert "has no 'path'" in result.output
+
+    def test_batch_write_error(self, fs: FakeFilesystem) -> None:
+        """Test a file that can't be written fails the command."""
+        fs.create_file("/repo/blocked")
+        fs.create_file(
+            "/repo/lice.toml",
+            contents='[[files]]\npath = "blocked/LICENSE"\n'
+            '[[files]]\npath = "ok/LICENSE"\n',
+        )
+
+        result = runner.invoke(app, ["batch", "/repo/lice.toml", "--org", "Me"])
+
+        assert result.exit_code == 1
+        assert "Could not write: /repo/blocked/LICENSE" in result.stderr
+        assert "Wrote 1 license file(s)" in result.stdout
+        assert "1 failed" in result.stdout
+        assert Path("/repo/ok/LICENSE").is_file()
@@ -0,0 +1,142 @@
+"""Test the process-wide template cache."""
+
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from lice2.cache import TemplateCache, read_package_template, template_cache
+from lice2.helpers import get_template_content, load_compiled_template
+
+
+class CountingLoader:
+    """A fake template loader that counts how often it is called."""
+
+    def __init__(self) -> None:
+        """Start with no calls."""
+        self.calls: list[tuple[str, bool]] = []
+
+    def __call__(self, license_name: str, *, header: bool = False) -> str:
+        """Return a 10 byte template for any license."""
+        self.calls.append((license_name, header))
+        if license_name == "missing":
+            raise FileNotFoundError(license_name)
+        return f"{license_name:<9}\n"[:10]
+
+
+class TestTemplateCache:
+    """Test the 'TemplateCache' class."""
+
+    def test_hits_and_misses(self) -> None:
+        """Test a template is only loaded once and counted correctly."""
+        loader = CountingLoader()
+        cache = TemplateCache(loader)
+
+        entry, hit = cache.lookup("mit")
+        assert hit is False
+        assert cache.lookup("mit") == (entry, True)
+        assert cache.get("mit", header=True) is not entry
+
+        assert loader.calls == [("mit", False), ("mit", True)]
+        stats = cache.stats
+        assert (stats.hits, stats.misses, stats.evictions) == (1, 2, 0)
+        assert stats.entries == len(cache) == 2  # noqa: PLR2004
+        assert stats.bytes_held == 20  # noqa: PLR2004
+        assert ("mit", True) in cache
+
+    def test_lru_eviction_by_entries(self) -> None:
+        """Test the least recently used template is evicted first."""
+        cache = TemplateCache(CountingLoader(), max_entries=2)
+
+        cache.get("a")
+        cache.get("b")
+        cache.get("a")  # 'b' is now the least recently used
+        cache.get("c")
+
+        assert ("a", False) in cache
+        assert ("b", False) not in cache
+        assert cache.stats.evictions == 1
+
+    def test_eviction_by_bytes(self) -> None:
+        """Test the byte limit is respected, and huge entries not cached."""
+        cache = TemplateCache(CountingLoader(), max_bytes=25)
+
+        cache.get("a")
+        cache.get("b")
+        cache.get("c")
+        assert len(cache) == 2  # noqa: PLR2004
+        assert cache.stats.bytes_held == 20  # noqa: PLR2004
+
+        cache.configure(max_bytes=5)
+        assert cache.get("d").text == "d        \n"
+        assert len(cache) == 0
+        assert cache.stats.bytes_held == 0
+
+    def test_configure_evicts(self) -> None:
+        """Test shrinking the cache drops the extra entries."""
+        cache = TemplateCache(CountingLoader())
+        for name in "abcd":
+            cache.get(name)
+
+        cache.configure(max_entries=1)
+
+        assert len(cache) == 1
+        assert cache.peek("d") is not None
+        assert cache.peek("a") is None
+        assert cache.stats.max_entries == 1
+
+    def test_clear_and_reset(self) -> None:
+        """Test clearing the cache and resetting the counters."""
+        cache = TemplateCache(CountingLoader())
+        cache.get("a")
+        cache.get("a")
+
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.stats.bytes_held == 0
+        assert cache.stats.hits == 1
+
+        cache.reset_stats()
+        assert cache.stats[:3] == (0, 0, 0)
+
+    def test_missing_template_not_cached(self) -> None:
+        """Test a missing template raises and is not cached."""
+        cache = TemplateCache(CountingLoader())
+
+        with pytest.raises(FileNotFoundError):
+            cache.get("missing")
+        assert len(cache) == 0
+
+    def test_thread_safety(self) -> None:
+        """Test many threads hammering the cache keep the counters straight."""
+        cache = TemplateCache(CountingLoader(), max_entries=3)
+        names = ["a", "b", "c", "d", "e"]
+
+        def worker() -> None:
+            for _ in range(200):
+                for name in names:
+                    cache.get(name)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = cache.stats
+        assert stats.hits + stats.misses == 8 * 200 * len(names)
+        assert stats.entries == 3  # noqa: PLR2004
+        assert stats.bytes_held == 30  # noqa: PLR2004
+
+    def test_package_templates(self) -> None:
+        """Test the process-wide cache serves the real templates."""
+        template_cache.clear()
+        template_cache.reset_stats()
+
+        text = get_template_content("mit")
+        compiled = load_compiled_template("mit")
+
+        assert text == read_package_template("mit")
+        assert compiled is template_cache.get("mit").compiled
+        assert template_cache.stats.misses == 1
@@ -1,12 +1,31 @@
 """Tests for the command line interface."""
 
-from io import StringIO
+from __future__ import annotations
+
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 from pyperclip import PyperclipException
-from pytest_mock import MockerFixture
 from typer.testing import CliRunner
 
+# the commands import these when they run, and pyfakefs unloads any modules
+# first imported during a test
+import lice2.batch
+import lice2.headers
+import lice2.identify
+import lice2.scan_cache
+import lice2.walker  # noqa: F401
+from lice2.api import Lice
 from lice2.core import app
+from lice2.daemon import DaemonError
+from lice2.helpers import ListFormat
+
+if TYPE_CHECKING:
+    from pyfakefs.fake_filesystem import FakeFilesystem
+    from pytest_mock import MockerFixture
 
 runner = CliRunner()
 
@@ -30,6 +49,14 @@ class TestCLI:
         assert result.exit_code == 0
         mock_list_languages.assert_called_once()
 
+    def test_cli_list_format(self, mocker: MockerFixture) -> None:
+        """Test the '--format' option is passed on to the lists."""
+        mock_list_licenses = mocker.patch("lice2.core.list_licenses")
+        result = runner.invoke(app, ["--licenses", "--format", "JSON"])
+
+        assert result.exit_code == 0
+        mock_list_licenses.assert_called_once_with(ListFormat.JSON)
+
     def test_cli_generate_header(self, mocker: MockerFixture) -> None:
         """Test the CLI generate header option."""
         mock_generate_header = mocker.patch("lice2.core.generate_header")
@@ -50,45 +77,50 @@ class TestCLI:
 
     def test_cli_template_path(self, mocker: MockerFixture) -> None:
         """Test the CLI template_path option."""
-        mock_template_path = mocker.patch("lice2.core.load_file_template")
-        mock_template_path.return_value = StringIO("Mocked template content")
+        mock_template_path = mocker.patch("lice2.core.render_file_template")
+        mock_template_path.return_value = iter(["Mocked template content"])
 
         result = runner.invoke(app, ["--template", "template.txt"])
 
         assert result.exit_code == 0
-        mock_template_path.assert_called_once_with("template.txt")
+        assert result.output == "Mocked template content"
+        mock_template_path.assert_called_once()
+        assert mock_template_path.call_args.args[0] == "template.txt"
 
-    def test_cli_write_to_file_with_extension(
-        self, mocker: MockerFixture
-    ) -> None:
+    def test_cli_write_to_file_with_extension(self) -> None:
         """Test the CLI write to file option with an extension."""
-        mock_open = mocker.mock_open()
-        mocker.patch("pathlib.Path.open", mock_open)
-
-        result = runner.invoke(app, ["--file", "output.py"])
+        result = runner.invoke(app, ["--file", "output.py", "--org", "Me"])
 
         assert result.exit_code == 0
-        mock_open.assert_called_with(mode="w")
-        mock_open().write.assert_called_once()
-        mock_open().close.assert_called()
+        assert result.output == ""
+        text = Path("output.py").read_text()
+        assert text.startswith("#")
+        assert "Me" in text
 
-    def test_cli_write_to_file_without_extension(
-        self, mocker: MockerFixture
-    ) -> None:
+    def test_cli_write_to_file_without_extension(self) -> None:
         """Test the CLI write to file option without extension.
 
-        This test needs improving so we can test the output file name is
-        generated correctly.
+        The extension for the language is added to the file name.
         """
-        mock_open = mocker.mock_open()
-        mocker.patch("pathlib.Path.open", mock_open)
+        result = runner.invoke(
+            app, ["--file", "output", "--language", "js", "--org", "Me"]
+        )
 
-        result = runner.invoke(app, ["--file", "output"])
+        assert result.exit_code == 0
+        assert Path("output.js").read_text().startswith("/*")
+        assert not Path("output").exists()
+
+    def test_cli_write_to_file_unchanged(self, mocker: MockerFixture) -> None:
+        """Test a file that already has the license is left untouched."""
+        args = ["mit", "--file", "LICENSE", "--org", "Me", "--year", "2024"]
+        runner.invoke(app, args)
+        replace = mocker.patch("os.replace")
+
+        result = runner.invoke(app, args)
 
         assert result.exit_code == 0
-        mock_open.assert_called_with(mode="w")
-        mock_open().write.assert_called_once()
-        mock_open().close.assert_called()
+        replace.assert_not_called()
+        assert "2024 Me" in Path("LICENSE").read_text()
 
     def test_cli_write_to_clipboard(self, mocker: MockerFixture) -> None:
         """Test the CLI write to clipboard option."""
@@ -117,6 +149,105 @@ class TestCLI:
         assert "Lice2" in result.output
         assert "Version" in result.output
 
+    def test_cli_usage_without_default_command(self) -> None:
+        """Test 'generate' is only in the usage when it was typed."""
+        help_result = runner.invoke(app, ["-h"], prog_name="lice")
+        error = runner.invoke(app, ["--bogus"], prog_name="lice")
+        typed = runner.invoke(app, ["generate", "--bogus"], prog_name="lice")
+
+        assert help_result.exit_code == 0
+        assert "Usage: lice [OPTIONS]" in help_result.output
+        assert error.exit_code == 2  # noqa: PLR2004
+        assert "Usage: lice [OPTIONS]" in error.output
+        assert "Try 'lice -h' for help." in error.output
+        assert "Usage: lice generate [OPTIONS]" in typed.output
+
+    def test_cli_import_skips_commands(self, fs: FakeFilesystem) -> None:
+        """Test the modules for the other commands aren't loaded at startup.
+
+        This needs a fresh interpreter, as the tests have already imported
+        them.
+        """
+        code = (
+            "import sys\n"
+            "import lice2.core\n"
+            "print(' '.join(sorted(sys.modules)))\n"
+        )
+        fs.pause()
+        try:
+            result = subprocess.run(  # noqa: S603
+                [sys.executable, "-c", code],
+                capture_output=True,
+                check=True,
+                text=True,
+            )
+        finally:
+            fs.resume()
+
+        assert {
+            "concurrent.futures.process",
+            "hashlib",
+            "lice2.batch",
+            "lice2.headers",
+            "lice2.identify",
+            "lice2.scan_cache",
+            "lice2.walker",
+            "lice2.writer",
+        }.isdisjoint(result.stdout.split())
+
+    def test_cli_daemon(self, mocker: MockerFixture) -> None:
+        """Test starting and stopping the daemon."""
+        mock_start = mocker.patch(
+            "lice2.daemon.start_daemon", return_value="/run/lice.sock"
+        )
+        mock_stop = mocker.patch("lice2.daemon.stop_daemon", return_value=True)
+
+        started = runner.invoke(app, ["--daemon"])
+        stopped = runner.invoke(app, ["--stop-daemon"])
+        mock_stop.return_value = False
+        not_running = runner.invoke(app, ["--stop-daemon"])
+
+        assert started.exit_code == 0
+        assert "listening on /run/lice.sock" in started.output
+        mock_start.assert_called_once_with()
+        assert stopped.exit_code == 0
+        assert "Stopped the lice daemon." in stopped.output
+        assert not_running.exit_code == 0
+        assert "not running" in not_running.output
+
+    def test_cli_daemon_error(self, mocker: MockerFixture) -> None:
+        """Test a daemon that could not start fails the command."""
+        mocker.patch(
+            "lice2.daemon.start_daemon",
+            side_effect=DaemonError("A daemon is already running"),
+        )
+
+        result = runner.invoke(app, ["--daemon"])
+
+        assert result.exit_code == 1
+        assert "A daemon is already running" in result.output
+
+    def test_cli_version_does_not_guess_organization(
+        self, mocker: MockerFixture
+    ) -> None:
+        """Test the organization is not looked up just to show the version."""
+        mock_guess = mocker.patch("lice2.helpers.guess_organization")
+
+        result = runner.invoke(app, ["--version"])
+
+        assert result.exit_code == 0
+        mock_guess.assert_not_called()
+
+    def test_cli_no_organization_variable(self, mocker: MockerFixture) -> None:
+        """Test no organization is guessed if the license doesn't use it."""
+        mock_guess = mocker.patch("lice2.helpers.guess_organization")
+
+        result = runner.invoke(app, ["gpl3"])
+
+        assert result.exit_code == 0
+        assert "GNU GENERAL PUBLIC LICENSE" in result.output
+        mock_guess.assert_not_called()
+
     def test_metadata_command(self) -> None:
         """Test the CLI metadata command.
 
@@ -138,3 +269,304 @@ class TestCLI:
         assert result.exit_code == 0
         assert "MIT License" in result.output
         assert "Copyright (c) 2024 Test Org" in result.output
+
+    def test_cli_apply(self, fs: FakeFilesystem) -> None:
+        """Test adding headers to a tree of source files."""
+        fs.create_file("/proj/app.py", contents="import os\n")
+        fs.create_file("/proj/lib/util.js", contents="export {};\n")
+        fs.create_file("/proj/notes.txt", contents="notes\n")
+
+        result = runner.invoke(
+            app,
+            ["apply", "/proj", "--license", "gpl3", "-o", "Org", "-w", "1"],
+        )
+
+        assert result.exit_code == 0
+        assert (
+            "Added the gpl3 header to 2 file(s), 0 already had one, "
+            "1 skipped." in result.output
+        )
+        content = Path("/proj/app.py").read_text()
+        assert content.startswith("#\n# Copyright (C) ")
+        assert content.endswith("\n\nimport os\n")
+
+        result = runner.invoke(
+            app, ["apply", "/proj", "--license", "gpl3", "-w", "1"]
+        )
+
+        assert "to 0 file(s), 2 already had one" in result.output
+
+    def test_cli_apply_legacy_round_trip(self, fs: FakeFilesystem) -> None:
+        """Test a legacy header, which starts with a blank line, is found."""
+        fs.create_file("/proj/e.py", contents="x = 1\n")
+        args = ["/proj/e.py", "--license", "apache", "--legacy", "-w", "1"]
+
+        first = runner.invoke(app, ["apply", *args])
+        content = Path("/proj/e.py").read_text()
+        second = runner.invoke(app, ["apply", *args])
+        check = runner.invoke(app, ["check", *args])
+
+        assert first.exit_code == 0
+        assert content.startswith("\n# Copyright ")
+        assert "to 0 file(s), 1 already had one" in second.output
+        assert Path("/proj/e.py").read_text() == content
+        assert content.count("Copyright") == 1
+        assert check.exit_code == 0
+
+    def test_cli_apply_verbose_and_errors(self, fs: FakeFilesystem) -> None:
+        """Test the verbose listing and the exit code on errors."""
+        fs.create_file("/proj/app.py", contents="import os\n")
+
+        result = runner.invoke(
+            app,
+            [
+                "apply",
+                "/proj/app.py",
+                "/proj/gone.py",
+                "--license",
+                "gpl3",
+                "--verbose",
+                "-w",
+                "1",
+            ],
+        )
+
+        assert result.exit_code == 1
+        assert "Added header: /proj/app.py" in result.output
+        assert "Could not process: /proj/gone.py" in result.output
+
+    def test_cli_apply_no_header(self) -> None:
+        """Test a license without a header is rejected."""
+        result = runner.invoke(app, ["apply", ".", "--license", "mit"])
+
+        assert result.exit_code == 2  # noqa: PLR2004
+        assert "no source headers are available" in result.output
+        assert "mit." in result.output
+
+    def test_cli_apply_default_license_no_header(self) -> None:
+        """Test the user is told to pick a license if the default has none."""
+        result = runner.invoke(app, ["apply", "."])
+
+        assert result.exit_code == 2  # noqa: PLR2004
+        assert "bsd3." in result.output
+        assert "Choose a license" in result.output
+
+    def test_cli_generate_is_default(self) -> None:
+        """Test the 'generate' command can also be named explicitly."""
+        result = runner.invoke(app, ["generate", "mit", "--org", "Test Org"])
+
+        assert result.exit_code == 0
+        assert "MIT License" in result.output
+
+    def test_cli_check(self, fs: FakeFilesystem) -> None:
+        """Test checking a tree for headers, without changing anything."""
+        fs.create_file("/proj/app.py", contents="import os\n")
+        fs.create_file("/proj/notes.txt", contents="notes\n")
+        runner.invoke(
+            app, ["apply", "/proj/app.py", "--license", "gpl3", "-w", "1"]
+        )
+        fs.create_file("/proj/lib/util.js", contents="export {};\n")
+
+        result = runner.invoke(
+            app, ["check", "/proj", "--license", "gpl3", "-w", "1"]
+        )
+
+        assert result.exit_code == 1
+        assert "Missing header: /proj/lib/util.js" in result.output
+        assert "app.py" not in result.output
+        assert (
+            "Checked 2 file(s) for the gpl3 header, 1 missing, 1 skipped."
+            in result.output
+        )
+        assert Path("/proj/lib/util.js").read_text() == "export {};\n"
+
+    def test_cli_check_passes(self, fs: FakeFilesystem) -> None:
+        """Test the check passes once every file has the header."""
+        fs.create_file("/proj/app.py", contents="import os\n")
+        runner.invoke(
+            app, ["apply", "/proj", "--license", "apache", "-o", "A", "-w", "1"]
+        )
+
+        result = runner.invoke(
+            app, ["check", "/proj", "--license", "apache", "-w", "1"]
+        )
+
+        assert result.exit_code == 0
+        assert "1 file(s) for the apache header, 0 missing" in result.output
+
+    def test_cli_update_year(self, fs: FakeFilesystem) -> None:
+        """Test bringing the year in a tree of headers up to date."""
+        fs.create_file("/proj/old.py", contents="import os\n")
+        fs.create_file("/proj/new.py", contents="import sys\n")
+        fs.create_file("/proj/none.js", contents="export {};\n")
+        for name, year in (("old", "2022"), ("new", "2024")):
+            args = ["apply", f"/proj/{name}.py", "--license", "apache"]
+            runner.invoke(app, [*args, "-y", year, "-o", "A", "-w", "1"])
+
+        args = ["update-year", "/proj", "--license", "apache", "-y", "2024"]
+        result = runner.invoke(app, [*args, "-w", "1", "--verbose"])
+
+        assert result.exit_code == 0
+        assert "Updated year: /proj/old.py" in result.output
+        assert (
+            "Updated the year to 2024 in 1 file(s), 1 already up to date, "
+            "1 without the apache header, 0 skipped." in result.output
+        )
+        assert "# Copyright 2022-2024 A\n" in Path("/proj/old.py").read_text()
+
+    def test_cli_update_year_errors(self, fs: FakeFilesystem) -> None:
+        """Test files that can't be read fail the command."""
+        fs.create_dir("/proj")
+
+        result = runner.invoke(
+            app, ["update-year", "/proj/gone.py", "--license", "gpl3"]
+        )
+
+        assert result.exit_code == 1
+        assert "Could not process: /proj/gone.py" in result.output
+
+    def test_cli_update_year_no_year(self) -> None:
+        """Test a license whose header has no year is rejected."""
+        result = runner.invoke(app, ["update-year", ".", "--license", "mpl"])
+
+        assert result.exit_code == 2  # noqa: PLR2004
+        assert "has no year to update" in result.output
+
+    def test_cli_relicense(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test swapping the headers in a tree for another license's."""
+        guess = mocker.patch(
+            "lice2.helpers.guess_organization", return_value="Guessed"
+        )
+        for name, license_name in (("a", "gpl3"), ("b", "wtfpl")):
+            fs.create_file(f"/proj/{name}.py", contents="x = 1\n")
+            args = ["apply", f"/proj/{name}.py", "--license", license_name]
+            runner.invoke(app, [*args, "-y", "2019", "-o", "Old", "-w", "1"])
+        fs.create_file("/proj/c.py", contents="y = 2\n")
+
+        args = ["relicense", "/proj", "--license", "apache", "--from", "gpl3"]
+        result = runner.invoke(app, [*args, "-w", "1", "--verbose"])
+
+        assert result.exit_code == 0
+        assert "Replaced header: /proj/a.py" in result.output
+        assert (
+            "Replaced the header with apache in 1 file(s), 0 already had it, "
+            "2 had no license header, 0 skipped." in result.output
+        )
+        assert "# Copyright 2019 Old\n" in Path("/proj/a.py").read_text()
+        assert "wtfpl.net" in Path("/proj/b.py").read_text()
+        # the guess is only a fallback for headers without an organization
+        guess.assert_called_once()
+
+    def test_cli_relicense_any_and_overrides(self, fs: FakeFilesystem) -> None:
+        """Test any other header is replaced, and the values given win."""
+        fs.create_file("/proj/a.py", contents="x = 1\n")
+        runner.invoke(
+            app,
+            ["apply", "/proj", "--license", "wtfpl", "-o", "Old", "-w", "1"],
+        )
+
+        args = ["relicense", "/proj", "--license", "gpl3", "-o", "New"]
+        result = runner.invoke(app, [*args, "-y", "2024", "-w", "1"])
+
+        assert result.exit_code == 0
+        content = Path("/proj/a.py").read_text()
+        assert "# Copyright (C) 2024  New\n" in content
+        assert "wtfpl.net" not in content
+
+    def test_cli_relicense_errors(self, fs: FakeFilesystem) -> None:
+        """Test bad options, and files that can't be read."""
+        fs.create_dir("/proj")
+
+        bad_from = runner.invoke(
+            app, ["relicense", "/proj", "--license", "gpl3", "--from", "mit"]
+        )
+        bad_year = runner.invoke(
+            app, ["relicense", "/proj", "--license", "gpl3", "-y", "24"]
+        )
+        result = runner.invoke(
+            app, ["relicense", "/proj/gone.py", "--license", "gpl3", "-o", "A"]
+        )
+
+        assert bad_from.exit_code == 2  # noqa: PLR2004
+        assert "no source headers are available for mit" in bad_from.output
+        assert bad_year.exit_code == 2  # noqa: PLR2004
+        assert result.exit_code == 1
+        assert "Could not process: /proj/gone.py" in result.output
+
+    def test_cli_identify(self, fs: FakeFilesystem) -> None:
+        """Test the license files in folders are identified."""
+        lice = Lice(organization="Acme", project="vendored", year="2019")
+        fs.create_file("/v/a/LICENSE", contents=lice.get_license("mit"))
+        fs.create_file("/v/b/COPYING", contents=lice.get_license("gpl3", "c"))
+        fs.create_file("/v/c/LICENSE.md", contents="All rights reserved.\n")
+        fs.create_file("/v/c/main.py", contents="x = 1\n")
+
+        result = runner.invoke(app, ["identify", "/v", "--no-git", "-w", "1"])
+
+        assert result.exit_code == 0
+        assert result.output == (
+            "mit: /v/a/LICENSE\n"
+            "gpl3: /v/b/COPYING\n"
+            "unknown: /v/c/LICENSE.md\n"
+            "Identified 2 of 3 license file(s), 1 unknown.\n"
+        )
+
+    def test_cli_identify_similar(self, fs: FakeFilesystem) -> None:
+        """Test the closest licenses are listed for edited licenses."""
+        text = Lice(organization="Acme", project="x").get_license("bsd3")
+        fs.create_file(
+            "/v/LICENSE", contents=text.replace("binary", "compiled")
+        )
+        fs.create_file("/v/COPYING", contents="All rights reserved.\n")
+
+        result = runner.invoke(
+            app, ["identify", "/v", "--no-git", "-w", "1", "--similar", "2"]
+        )
+
+        assert result.exit_code == 0
+        assert "unknown: /v/COPYING\n" in result.output
+        assert re.search(
+            r"^unknown: /v/LICENSE \(similar to bsd3 0\.\d\d, \w+ 0\.\d\d\)$",
+            result.output,
+            re.MULTILINE,
+        )
+
+    def test_cli_identify_errors(self, fs: FakeFilesystem) -> None:
+        """Test files that can't be read fail the command."""
+        fs.create_dir("/v")
+
+        result = runner.invoke(app, ["identify", "/v/LICENSE", "-w", "1"])
+
+        assert result.exit_code == 1
+        assert "Could not process: /v/LICENSE" in result.output
+        assert "Identified 0 of 0 license file(s)" in result.output
+
+    def test_cli_check_errors(self, fs: FakeFilesystem) -> None:
+        """Test files that can't be read fail the check."""
+        fs.create_dir("/proj")
+
+        result = runner.invoke(
+            app, ["check", "/proj/gone.py", "--license", "apache", "-w", "1"]
+        )
+
+        assert result.exit_code == 1
+        assert "Could not process: /proj/gone.py" in result.output
+        assert "0 missing" in result.output
+
+    def test_cli_check_cache(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test the scan cache is saved, and can be turned off."""
+        mocker.patch.dict("os.environ", {"XDG_CACHE_HOME": "/xdg"})
+        fs.create_file("/proj/app.py", contents="import os\n")
+
+        runner.invoke(app, ["check", "/proj", "--license", "apache", "-w", "1"])
+        mock_save = mocker.patch("lice2.scan_cache.ScanCache.save")
+        runner.invoke(
+            app, ["check", "/proj", "--license", "apache", "--no-cache"]
+        )
+        mock_save.assert_not_called()
+        runner.invoke(app, ["apply", "/proj", "--license", "apache"])
+        mock_save.assert_called_once()
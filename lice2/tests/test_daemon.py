@@ -0,0 +1,314 @@
+"""Test running commands in the background daemon, and the client for it."""
+
+from __future__ import annotations
+
+import io
+import socket
+import stat
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+# the daemon and client only import 'lice2.core' when running a command, and
+# pyfakefs unloads any modules first imported during a test
+import lice2.core  # noqa: F401
+from lice2.cache import template_cache
+from lice2.client import (
+    EXIT,
+    FALLBACK,
+    FRAME,
+    STDOUT,
+    get_socket_path,
+    main,
+    pack_message,
+    run_in_daemon,
+)
+from lice2.daemon import (
+    PACKAGE_DIR,
+    DaemonError,
+    FrameWriter,
+    Server,
+    run_command,
+    start_daemon,
+    stop_daemon,
+    warm_up,
+)
+from lice2.template_index import TEMPLATE_INDEX
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from pyfakefs.fake_filesystem import FakeFilesystem
+    from pytest_mock import MockerFixture
+
+MIT_ARGS = ["mit", "--org", "Acme", "--proj", "demo", "--year", "2020"]
+
+
+@pytest.fixture
+def socket_folder(fs: FakeFilesystem) -> Iterator[Path]:
+    """Return a real temporary folder for the socket.
+
+    Sockets can't be made in the fake filesystem, so it is paused.
+    """
+    fs.pause()
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            yield Path(folder)
+    finally:
+        fs.resume()
+
+
+def read_frames(conn: socket.socket) -> list[tuple[bytes, bytes]]:
+    """Return all the frames sent over a connection, until it closes."""
+    frames = []
+    with conn.makefile("rb") as replies:
+        while header := replies.read(FRAME.size):
+            kind, size = FRAME.unpack(header)
+            frames.append((kind, replies.read(size)))
+    return frames
+
+
+def test_get_socket_path(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the socket is in the runtime folder, or the cache folder."""
+    monkeypatch.delenv("LICE_DAEMON_SOCKET", raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", "/run/user/1000")
+    monkeypatch.setenv("XDG_CACHE_HOME", "/cache")
+
+    assert get_socket_path() == "/run/user/1000/lice/daemon.sock"
+
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    assert get_socket_path() == "/cache/lice/daemon.sock"
+
+    monkeypatch.setenv("LICE_DAEMON_SOCKET", "/tmp/lice.sock")  # noqa: S108
+    assert get_socket_path() == "/tmp/lice.sock"  # noqa: S108
+
+
+class TestRunCommand:
+    """Test running a command the way a child of the daemon does."""
+
+    def test_output(self) -> None:
+        """Test the output goes to the streams, not our own."""
+        stdout = io.BytesIO()
+        stderr = io.BytesIO()
+
+        status = run_command(MIT_ARGS, stdout, stderr)
+
+        assert status == 0
+        assert stdout.getvalue().startswith(b"The MIT License (MIT)\n")
+        assert b"Copyright (c) 2020 Acme" in stdout.getvalue()
+        assert stderr.getvalue() == b""
+
+    def test_error(self) -> None:
+        """Test the exit status and message for a bad license."""
+        stdout = io.BytesIO()
+        stderr = io.BytesIO()
+
+        status = run_command(["not-a-license"], stdout, stderr)
+
+        assert status == 2  # noqa: PLR2004
+        assert b"not found" in stderr.getvalue()
+
+    def test_unexpected_error(self, mocker: MockerFixture) -> None:
+        """Test an exception is reported like Python would, with status 1."""
+        mocker.patch("lice2.core.get_lang", side_effect=RuntimeError("boom"))
+        stderr = io.BytesIO()
+
+        status = run_command(MIT_ARGS, io.BytesIO(), stderr)
+
+        assert status == 1
+        assert b"RuntimeError: boom" in stderr.getvalue()
+
+    def test_frame_writer(self) -> None:
+        """Test each write is sent as a frame of the writer's kind."""
+        ours, theirs = socket.socketpair()
+        with ours, theirs:
+            writer = io.BufferedWriter(FrameWriter(ours, STDOUT))
+            writer.write(b"hello ")
+            writer.write(b"world")
+            writer.flush()
+            ours.shutdown(socket.SHUT_WR)
+
+            assert read_frames(theirs) == [(STDOUT, b"hello world")]
+
+
+class TestServer:
+    """Test the daemon deciding what to do with each request."""
+
+    def request(self, **changes: object) -> dict[str, object]:
+        """Return a request that the server can run, with any changes."""
+        request = {
+            "argv": MIT_ARGS,
+            "cwd": "/",
+            "env": {"HOME": str(Path.home())},
+            "umask": 0o022,
+            "package": str(PACKAGE_DIR),
+        }
+        request.update(changes)
+        return request
+
+    def handle(
+        self, server: Server, message: bytes
+    ) -> tuple[object, list[tuple[bytes, bytes]]]:
+        """Send a message to the server, returning what it did and sent."""
+        ours, theirs = socket.socketpair()
+        with ours, theirs:
+            theirs.sendall(message)
+            outcome = server._handle(ours)  # noqa: SLF001
+            ours.shutdown(socket.SHUT_WR)
+            return outcome, read_frames(theirs)
+
+    def test_socket(self, socket_folder: Path) -> None:
+        """Test the socket can only be used by us, and is removed after."""
+        path = socket_folder / "run" / "lice.sock"
+
+        server = Server(str(path))
+        with pytest.raises(DaemonError, match="already running"):
+            Server(str(path))
+        server.close()
+
+        assert stat.S_IMODE(path.parent.stat().st_mode) == stat.S_IRWXU
+        assert not path.exists()
+
+    def test_stale_socket_replaced(self, socket_folder: Path) -> None:
+        """Test a socket left behind by a daemon that died is replaced."""
+        path = socket_folder / "lice.sock"
+        left = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        left.bind(str(path))
+        left.close()
+
+        server = Server(str(path))
+        server.close()
+
+        assert not path.exists()
+
+    def test_idle(self, socket_folder: Path) -> None:
+        """Test the server stops when idle, without restarting."""
+        server = Server(str(socket_folder / "lice.sock"))
+
+        assert server.serve(idle_timeout=0.01) is False
+        assert not (socket_folder / "lice.sock").exists()
+
+    def test_requests(self, socket_folder: Path, mocker: MockerFixture) -> None:
+        """Test the requests that are not run, and why."""
+        mocker.patch.dict("os.environ", {"HOME": str(Path.home())}, clear=True)
+        server = Server(str(socket_folder / "lice.sock"))
+        try:
+            assert server.can_run(self.request())
+            assert not server.can_run(self.request(package="/other"))
+            assert not server.can_run(self.request(env={"HOME": "/other"}))
+            assert self.handle(
+                server, pack_message(self.request(package="/other"))
+            ) == (None, [(FALLBACK, b"")])
+            assert self.handle(server, pack_message({"stop": True})) == (
+                False,
+                [(EXIT, b"0")],
+            )
+            assert self.handle(server, b"\x00\x00\x00\x02[]") == (None, [])
+            assert self.handle(server, b"\xff\xff\xff\xff") == (None, [])
+
+            mocker.patch("lice2.rendering.get_local_year", return_value="1999")
+            assert server.is_stale()
+            assert self.handle(server, pack_message(self.request())) == (
+                True,
+                [(FALLBACK, b"")],
+            )
+        finally:
+            server.close()
+
+    def test_settings_changed(self, socket_folder: Path) -> None:
+        """Test the server is stale once the settings file changes."""
+        server = Server(str(socket_folder / "lice.sock"))
+        try:
+            assert not server.is_stale()
+            server.settings_stamp = (0, 0)
+            assert server.is_stale()
+        finally:
+            server.close()
+
+
+def test_warm_up() -> None:
+    """Test every template is compiled before the daemon starts."""
+    templates = sum(1 + info.header for info in TEMPLATE_INDEX.values())
+
+    warm_up()
+
+    assert len(template_cache) == templates
+
+
+class TestClient:
+    """Test the client, with and without a daemon running."""
+
+    def test_no_daemon(
+        self, socket_folder: Path, mocker: MockerFixture
+    ) -> None:
+        """Test the command runs here when there is no daemon."""
+        mocker.patch("sys.argv", ["lice", *MIT_ARGS])
+        mocker.patch.dict(
+            "os.environ", {"LICE_DAEMON_SOCKET": str(socket_folder / "x")}
+        )
+        mock_app = mocker.patch("lice2.core.app")
+
+        assert run_in_daemon(MIT_ARGS) is None
+        main()
+
+        mock_app.assert_called_once_with()
+
+    @pytest.mark.parametrize(
+        ("argv", "env"),
+        [
+            (["--stop-daemon"], {}),
+            (["--install-completion"], {}),
+            (MIT_ARGS, {"LICE_NO_DAEMON": "1"}),
+        ],
+    )
+    def test_runs_here(
+        self, argv: list[str], env: dict[str, str], mocker: MockerFixture
+    ) -> None:
+        """Test the commands that are never sent to the daemon."""
+        mocker.patch("sys.argv", ["lice", *argv])
+        mocker.patch.dict("os.environ", env)
+        mock_run = mocker.patch("lice2.client.run_in_daemon")
+        mock_app = mocker.patch("lice2.core.app")
+
+        main()
+
+        mock_run.assert_not_called()
+        mock_app.assert_called_once_with()
+
+    def test_daemon(
+        self,
+        socket_folder: Path,
+        capsysbinary: pytest.CaptureFixture[bytes],
+        mocker: MockerFixture,
+    ) -> None:
+        """Test commands run in a real daemon give the same output."""
+        path = str(socket_folder / "lice.sock")
+        expected = io.BytesIO()
+        run_command(MIT_ARGS, expected, io.BytesIO())
+
+        assert start_daemon(path) == path
+        try:
+            with pytest.raises(DaemonError, match="already running"):
+                start_daemon(path)
+
+            assert run_in_daemon(MIT_ARGS, path) == 0
+            assert capsysbinary.readouterr().out == expected.getvalue()
+
+            assert run_in_daemon(["not-a-license"], path) == 2  # noqa: PLR2004
+            assert b"not found" in capsysbinary.readouterr().err
+
+            mocker.patch("sys.argv", ["lice", *MIT_ARGS, "--file", "out.txt"])
+            mocker.patch.dict("os.environ", {"LICE_DAEMON_SOCKET": path})
+            mocker.patch("os.getcwd", return_value=str(socket_folder))
+            with pytest.raises(SystemExit, match="0"):
+                main()
+            assert (socket_folder / "out.txt").read_bytes() == (
+                expected.getvalue()
+            )
+        finally:
+            assert stop_daemon(path)
+
+        assert not stop_daemon(path)
+        assert run_in_daemon(MIT_ARGS, path) is None
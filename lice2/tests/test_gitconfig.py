@@ -0,0 +1,178 @@
+"""Test the git configuration file reader."""
+
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from lice2 import gitconfig
+from lice2.gitconfig import (
+    RACY_WINDOW_NS,
+    clear_cache,
+    find_git_dir,
+    get_cache_file,
+    get_config_value,
+    read_git_config,
+)
+
+if TYPE_CHECKING:
+    from pyfakefs.fake_filesystem import FakeFilesystem
+    from pytest_mock import MockerFixture
+
+
+@pytest.fixture(autouse=True)
+def clean_git_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Make sure the environment and cache don't leak into the tests."""
+    for name in (
+        "GIT_DIR",
+        "GIT_CONFIG_GLOBAL",
+        "XDG_CONFIG_HOME",
+        "XDG_CACHE_HOME",
+    ):
+        monkeypatch.delenv(name, raising=False)
+    clear_cache()
+
+
+class TestGitConfig:
+    """Test the 'gitconfig' module."""
+
+    def test_no_config(self) -> None:
+        """Test we get None back if there is no git config at all."""
+        assert get_config_value("user.name") is None
+
+    def test_global_config(self, fs: FakeFilesystem) -> None:
+        """Test reading the user name from '~/.gitconfig'."""
+        fs.create_file(
+            Path.home() / ".gitconfig",
+            contents=(
+                "# a comment\n"
+                "[core]\n\teditor = vim\n"
+                '[user]\n\tname = "Grant Ramsay" ; trailing comment\n'
+            ),
+        )
+
+        assert get_config_value("user.name") == "Grant Ramsay"
+        assert get_config_value("User.Name") == "Grant Ramsay"
+        assert get_config_value("core.editor") == "vim"
+
+    def test_xdg_config_is_overridden(
+        self, fs: FakeFilesystem, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Test '~/.gitconfig' takes priority over the XDG config file."""
+        monkeypatch.setenv("XDG_CONFIG_HOME", "/xdg")
+        fs.create_file(
+            "/xdg/git/config", contents="[user]\nname = XDG\nemail = x@y.z\n"
+        )
+        fs.create_file(
+            Path.home() / ".gitconfig", contents="[user]\nname = Home"
+        )
+
+        assert get_config_value("user.name") == "Home"
+        assert get_config_value("user.email") == "x@y.z"
+
+    def test_repo_config(self, fs: FakeFilesystem) -> None:
+        """Test the repository config overrides the global one."""
+        fs.create_file(Path.home() / ".gitconfig", contents="[user]\nname = Me")
+        fs.create_file("/work/repo/.git/config", contents="[user]\nname = Repo")
+        fs.create_dir("/work/repo/src")
+        os.chdir("/work/repo/src")
+
+        assert find_git_dir() == Path("/work/repo/.git")
+        assert get_config_value("user.name") == "Repo"
+
+    def test_worktree_gitdir_file(self, fs: FakeFilesystem) -> None:
+        """Test a '.git' file pointing at the real git directory."""
+        fs.create_file(
+            "/work/main/.git/worktrees/wt/commondir", contents="../..\n"
+        )
+        fs.create_file("/work/main/.git/config", contents="[user]\nname = WT")
+        fs.create_file(
+            "/work/wt/.git", contents="gitdir: /work/main/.git/worktrees/wt\n"
+        )
+        os.chdir("/work/wt")
+
+        assert get_config_value("user.name") == "WT"
+
+    def test_include_path(self, fs: FakeFilesystem) -> None:
+        """Test 'include.path' is followed, relative to the including file."""
+        fs.create_file(
+            Path.home() / ".gitconfig",
+            contents="[user]\nname = Before\n[include]\npath = extra.inc\n",
+        )
+        fs.create_file(Path.home() / "extra.inc", contents="[user]\nname = Inc")
+
+        assert get_config_value("user.name") == "Inc"
+
+    def test_include_if_gitdir(self, fs: FakeFilesystem) -> None:
+        """Test 'includeIf "gitdir:..."' only applies inside that folder."""
+        fs.create_file(
+            Path.home() / ".gitconfig",
+            contents=(
+                "[user]\nname = Personal\n"
+                '[includeIf "gitdir:/work/"]\npath = /work/.gitconfig\n'
+            ),
+        )
+        fs.create_file("/work/.gitconfig", contents="[user]\nname = Work")
+        fs.create_dir("/work/repo/.git")
+        fs.create_dir("/home/repo/.git")
+
+        os.chdir("/home/repo")
+        assert get_config_value("user.name") == "Personal"
+
+        os.chdir("/work/repo")
+        assert get_config_value("user.name") == "Work"
+
+    def test_cache_is_invalidated(self, fs: FakeFilesystem) -> None:
+        """Test a changed config file is picked up again."""
+        config = fs.create_file(
+            Path.home() / ".gitconfig", contents="[user]\nname = Old"
+        )
+        first = read_git_config()
+        assert read_git_config() is first  # served from the cache
+
+        config.set_contents("[user]\nname = Brand New")
+        assert get_config_value("user.name") == "Brand New"
+
+    def test_saved_between_runs(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test a second run takes the value from the cache file.
+
+        Clearing the cache stands in for starting a new process.
+        """
+        config = fs.create_file(
+            Path.home() / ".gitconfig", contents="[user]\nname = Saved\n"
+        )
+        old = time.time_ns() - 2 * RACY_WINDOW_NS
+        os.utime(config.path, ns=(old, old))
+        assert get_config_value("user.name") == "Saved"
+        assert get_cache_file().exists()
+
+        clear_cache()
+        spy = mocker.spy(gitconfig, "_read_config")
+        assert get_config_value("user.name") == "Saved"
+        spy.assert_not_called()
+        assert get_config_value("user.email") is None
+        assert spy.called  # this key wasn't saved
+
+        clear_cache()
+        spy.reset_mock()
+        assert get_config_value("user.email") is None
+        spy.assert_not_called()
+
+        clear_cache()
+        config.set_contents("[user]\nname = Changed\n")
+        os.utime(config.path, ns=(old + 1, old + 1))
+        assert get_config_value("user.name") == "Changed"
+        assert spy.called
+
+    def test_recent_change_not_saved(self, fs: FakeFilesystem) -> None:
+        """Test values from a config file changed just now aren't saved."""
+        fs.create_file(Path.home() / ".gitconfig", contents="[user]\nname = N")
+
+        assert get_config_value("user.name") == "N"
+        assert not get_cache_file().exists()
@@ -0,0 +1,645 @@
+"""Test adding license headers to source files in bulk."""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+import pytest
+
+from lice2.headers import (
+    COPY_CHUNK_SIZE,
+    ERROR,
+    INSERTED,
+    MISSING,
+    POOL_THRESHOLD,
+    PRESENT,
+    REPLACED,
+    SKIPPED,
+    UPDATED,
+    HeaderSpec,
+    RelicenseSpec,
+    apply_headers,
+    build_header_specs,
+    build_relicense_specs,
+    check_headers,
+    default_workers,
+    find_header,
+    header_pattern,
+    insert_header,
+    process_file,
+    read_prefix,
+    relicense_file,
+    relicense_headers,
+    update_year,
+    update_years,
+)
+from lice2.helpers import load_compiled_template
+from lice2.walker import iter_files
+
+if TYPE_CHECKING:
+    from pyfakefs.fake_filesystem import FakeFilesystem
+    from pytest_mock import MockerFixture
+
+CONTEXT = {"year": "2024", "organization": "Awesome Co.", "project": "lice"}
+DEFAULTS = {"organization": "Default", "project": "proj", "year": "2030"}
+
+
+@pytest.fixture
+def specs() -> dict[str, HeaderSpec]:
+    """Return the header specs for the Apache license."""
+    return build_header_specs(
+        load_compiled_template("apache", header=True), CONTEXT
+    )
+
+
+class TestHeaderPattern:
+    """Test recognising existing headers."""
+
+    def test_pattern_matches_any_values(self) -> None:
+        """Test the pattern matches a header with different variables."""
+        compiled = load_compiled_template("gpl3", header=True)
+        pattern = header_pattern(compiled, "py")
+        other = build_header_specs(
+            compiled,
+            {"year": "1999", "organization": "Other Ltd", "project": "x"},
+        )["py"].text
+
+        match = find_header(other, pattern)
+
+        assert match is not None
+        assert match["year"] == "1999"
+        assert match["organization"] == "Other Ltd"
+        assert match["project"] == "x"
+
+    def test_pattern_allows_crlf_and_trailing_space(
+        self, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test line endings and trailing whitespace don't matter."""
+        text = specs["c"].text.replace("\n", "  \r\n")
+
+        assert find_header(text, specs["c"].pattern) is not None
+
+    def test_pattern_needs_header_at_start(
+        self, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test a header further down the file is not counted."""
+        text = "import os\n" + specs["py"].text
+
+        assert find_header(text, specs["py"].pattern) is None
+
+    def test_pattern_empty_variable(self) -> None:
+        """Test an empty variable at the end of a line still matches.
+
+        Formatting strips the trailing space left on the line.
+        """
+        compiled = load_compiled_template("gpl3", header=True)
+        spec = build_header_specs(compiled, {**CONTEXT, "project": ""})["py"]
+
+        assert spec.text.startswith("#\n# Copyright")
+        match = find_header(spec.text, header_pattern(compiled, "py"))
+        assert match is not None
+        assert match["project"] == ""
+
+    def test_pattern_repeated_variable(self) -> None:
+        """Test a variable used twice must have the same value both times."""
+        compiled = load_compiled_template("cc_by", header=True)
+        spec = build_header_specs(compiled, CONTEXT)["py"]
+        text = "\n\n" + spec.text
+
+        assert find_header(text, spec.pattern) is not None
+        assert (
+            find_header(text.replace("lice", "other", 1), spec.pattern) is None
+        )
+
+    def test_specs_are_shared_per_style(
+        self, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test languages with the same comment style share one spec."""
+        assert specs["py"] is specs["sh"]
+        assert specs["c"] is specs["js"]
+        assert specs["py"].text.startswith("# Copyright 2024 Awesome Co.")
+        assert "txt" not in specs
+
+
+class TestInsertHeader:
+    """Test adding a header to a single file."""
+
+    def test_insert_after_shebang(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test the header goes after a shebang line, with a blank line."""
+        fs.create_file("/src/run.py", contents="#!/usr/bin/env python\nrun()\n")
+
+        assert process_file("/src/run.py", specs) == INSERTED
+
+        content = Path("/src/run.py").read_text()
+        assert content == (
+            f"#!/usr/bin/env python\n{specs['py'].text}\nrun()\n"
+        )
+        assert process_file("/src/run.py", specs) == PRESENT
+
+    @pytest.mark.parametrize(
+        ("name", "preamble"), [("run.sh", "#!/bin/sh"), ("index.php", "<?php")]
+    )
+    def test_insert_after_preamble_without_newline(
+        self,
+        fs: FakeFilesystem,
+        specs: dict[str, HeaderSpec],
+        name: str,
+        preamble: str,
+    ) -> None:
+        """Test a file that is only a preamble line keeps it at the top."""
+        fs.create_file(f"/src/{name}", contents=preamble)
+        lang = name.rpartition(".")[2]
+
+        assert process_file(f"/src/{name}", specs) == INSERTED
+        assert Path(f"/src/{name}").read_text() == (
+            f"{preamble}\n{specs[lang].text}\n"
+        )
+        assert process_file(f"/src/{name}", specs) == PRESENT
+
+    def test_insert_keeps_crlf(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test the header uses the same line endings as the file."""
+        fs.create_file("/src/main.c", contents="int main() {}\r\n")
+
+        insert_header("/src/main.c", specs["c"].text)
+
+        content = Path("/src/main.c").read_bytes()
+        assert content.startswith(b"/*\r\n * Copyright 2024 Awesome Co.\r\n")
+        assert b"\n\n" not in content.replace(b"\r\n", b"")
+        assert content.endswith(b" */\r\n\r\nint main() {}\r\n")
+
+    def test_insert_after_php_tag(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test the header goes inside the PHP tag."""
+        fs.create_file("/src/index.php", contents="<?php\necho 1;\n")
+
+        assert process_file("/src/index.php", specs) == INSERTED
+        assert Path("/src/index.php").read_text().startswith("<?php\n/*\n")
+
+    def test_skipped_and_errors(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test empty files, unknown types and unreadable files."""
+        fs.create_file("/src/__init__.py", contents="")
+        fs.create_file("/src/notes.txt", contents="Notes")
+        fs.create_file("/src/bad.py", contents=b"\xff\xfe\x00")
+
+        assert process_file("/src/__init__.py", specs) == SKIPPED
+        assert process_file("/src/notes.txt", specs) == SKIPPED
+        assert process_file("/src/missing.py", specs) == ERROR
+        assert process_file("/src/bad.py", specs) == ERROR
+
+
+class TestBoundedReads:
+    """Test only the start of a file is read to find or replace a header."""
+
+    # bytes that are not valid UTF-8, after the part of the file that is read
+    TAIL = b"data = 1\n" * (2 * COPY_CHUNK_SIZE // 9) + b"\xff\xfe\n"
+
+    def test_prefix_buffer_reused(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test each read uses the same buffer, growing it when needed."""
+        mocker.patch("lice2.headers._buffers", threading.local())
+        fs.create_file("/src/a.py", contents="first file")
+        fs.create_file("/src/b.py", contents="x" * 200)
+
+        def read(path: str, limit: int) -> memoryview:
+            with Path(path).open("rb", buffering=0) as infile:
+                return read_prefix(infile, limit)
+
+        buffer = read("/src/a.py", 100).obj
+        second = read("/src/a.py", 5)
+
+        assert second.tobytes() == b"first"
+        assert second.obj is buffer
+        assert read("/src/b.py", 150).obj is not buffer
+        assert read("/src/a.py", 100).tobytes() == b"first file"
+
+    def test_insert_into_large_file(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test the rest of a large file is copied across untouched."""
+        head = b"#!/usr/bin/env python\n# caf\xc3\xa9\n"
+        fs.create_file("/src/big.py", contents=head + self.TAIL)
+
+        assert process_file("/src/big.py", specs) == INSERTED
+
+        assert Path("/src/big.py").read_bytes() == (
+            b"#!/usr/bin/env python\n"
+            + specs["py"].text.encode()
+            + b"\n# caf\xc3\xa9\n"
+            + self.TAIL
+        )
+        assert process_file("/src/big.py", specs) == PRESENT
+
+    def test_prefix_ends_inside_character(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test a character cut in two by the end of the prefix is no error."""
+        line = "# " + "a" * (specs["py"].limit - 3) + "\u00e9\n"
+        fs.create_file("/src/long.py", contents=line + "run()\n")
+
+        assert process_file("/src/long.py", specs) == INSERTED
+
+        assert Path("/src/long.py").read_text() == (
+            f"{specs['py'].text}\n{line}run()\n"
+        )
+
+    def test_update_year_in_large_file(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test the year is updated without reading all of a large file."""
+        old = header_for("apache", "py", "2020").replace("Awesome", "Caf\u00e9")
+        fs.create_file("/src/big.py", contents=old.encode() + self.TAIL)
+
+        assert update_year("/src/big.py", specs, "2024") == UPDATED
+
+        new = old.replace("2020", "2020-2024")
+        assert Path("/src/big.py").read_bytes() == new.encode() + self.TAIL
+
+
+class TestApplyHeaders:
+    """Test adding headers to a whole tree."""
+
+    def test_apply_headers(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test walking a tree and adding the missing headers."""
+        fs.create_file("/proj/a.py", contents="print(1)\n")
+        fs.create_file("/proj/sub/b.js", contents="let b = 1;\n")
+        fs.create_file("/proj/sub/c.rs", contents=specs["rs"].text + "\nfn x")
+        fs.create_file("/proj/README", contents="readme")
+        fs.create_file("/proj/.git/hooks/d.py", contents="x = 1\n")
+
+        results = dict(apply_headers(iter_files(["/proj"]), specs, workers=1))
+
+        assert results == {
+            "/proj/a.py": INSERTED,
+            "/proj/sub/b.js": INSERTED,
+            "/proj/sub/c.rs": PRESENT,
+            "/proj/README": SKIPPED,
+        }
+
+    def test_apply_headers_process_pool(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test the work is shared over several processes.
+
+        The worker processes can't see the fake filesystem, so this uses a
+        real temporary folder.
+        """
+        fs.pause()
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                for index in range(POOL_THRESHOLD):
+                    Path(folder, f"f{index}.py").write_text(f"x = {index}\n")
+
+                results = dict(
+                    apply_headers(iter_files([folder]), specs, workers=2)
+                )
+
+                assert set(results.values()) == {INSERTED}
+                assert len(results) == POOL_THRESHOLD
+                assert Path(folder, "f7.py").read_text() == (
+                    f"{specs['py'].text}\nx = 7\n"
+                )
+        finally:
+            fs.resume()
+
+    def test_check_headers(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test checking a tree reports missing headers without changes."""
+        fs.create_file("/proj/a.py", contents="print(1)\n")
+        fs.create_file("/proj/b.py", contents=specs["py"].text + "\nx = 1\n")
+        fs.create_file("/proj/c.csv", contents="a,b\n")
+
+        results = dict(check_headers(iter_files(["/proj"]), specs, workers=1))
+
+        assert results == {
+            "/proj/a.py": MISSING,
+            "/proj/b.py": PRESENT,
+            "/proj/c.csv": SKIPPED,
+        }
+        assert Path("/proj/a.py").read_text() == "print(1)\n"
+
+    def test_check_headers_process_pool(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test checking over several processes doesn't change any files."""
+        fs.pause()
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                for index in range(POOL_THRESHOLD * 2):
+                    Path(folder, f"f{index}.c").write_text("int x;\n")
+
+                results = dict(
+                    check_headers(iter_files([folder]), specs, workers=3)
+                )
+
+                assert set(results.values()) == {MISSING}
+                assert Path(folder, "f7.c").read_text() == "int x;\n"
+        finally:
+            fs.resume()
+
+    def test_default_workers(self, mocker: MockerFixture) -> None:
+        """Test the default is one worker per CPU, and at least one."""
+        mocker.patch("lice2.headers.os.cpu_count", return_value=None)
+        assert default_workers() == 1
+
+        mocker.patch("lice2.headers.os.cpu_count", return_value=8)
+        assert default_workers() == 8  # noqa: PLR2004
+
+
+def header_for(
+    license_name: str, lang: str, year: str, *, legacy: bool = False
+) -> str:
+    """Return the formatted header for a language with the given year."""
+    compiled = load_compiled_template(license_name, header=True)
+    context = {**CONTEXT, "year": year}
+    return build_header_specs(compiled, context, legacy=legacy)[lang].text
+
+
+class TestUpdateYear:
+    """Test bringing the year in existing headers up to date."""
+
+    @pytest.mark.parametrize(
+        ("old", "new"),
+        [
+            ("2023", "2023-2024"),
+            ("2019-2023", "2019-2024"),
+            ("2019 - 2023", "2019-2024"),
+            ("2019\u20132022", "2019-2024"),
+        ],
+    )
+    def test_year_updated(
+        self,
+        fs: FakeFilesystem,
+        specs: dict[str, HeaderSpec],
+        old: str,
+        new: str,
+    ) -> None:
+        """Test a single year or a range is brought up to the year given."""
+        fs.create_file(
+            "/src/app.py",
+            contents=f"#!/usr/bin/env python\n{header_for('apache', 'py', old)}"
+            "\nrun()\n",
+        )
+
+        assert update_year("/src/app.py", specs, "2024") == UPDATED
+
+        assert Path("/src/app.py").read_text() == (
+            f"#!/usr/bin/env python\n{header_for('apache', 'py', new)}\nrun()\n"
+        )
+
+    @pytest.mark.parametrize(
+        ("license_name", "lang", "legacy"),
+        [
+            ("gpl3", "f", False),
+            ("gpl3", "pl", False),
+            ("cc_by", "hs", False),
+            ("apache", "java", True),
+        ],
+    )
+    def test_comment_styles(
+        self, fs: FakeFilesystem, license_name: str, lang: str, *, legacy: bool
+    ) -> None:
+        """Test only the year changes, whatever the comment style."""
+        compiled = load_compiled_template(license_name, header=True)
+        specs = build_header_specs(
+            compiled, dict.fromkeys(compiled.variables, ""), legacy=legacy
+        )
+        old = header_for(license_name, lang, "2020", legacy=legacy)
+        fs.create_file(f"/src/code.{lang}", contents=f"{old}\nbody\n")
+
+        assert update_year(f"/src/code.{lang}", specs, "2024") == UPDATED
+
+        content = Path(f"/src/code.{lang}").read_text()
+        assert content == (
+            f"{header_for(license_name, lang, '2020-2024', legacy=legacy)}"
+            "\nbody\n"
+        )
+
+    def test_keeps_crlf(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test the line endings of the file are kept."""
+        header = header_for("apache", "c", "2022").replace("\n", "\r\n")
+        fs.create_file("/src/main.c", contents=f"{header}\r\nint x;\r\n")
+
+        assert update_year("/src/main.c", specs, "2024") == UPDATED
+
+        content = Path("/src/main.c").read_bytes()
+        assert content.startswith(
+            b"/*\r\n * Copyright 2022-2024 Awesome Co.\r\n"
+        )
+        assert content.endswith(b" */\r\n\r\nint x;\r\n")
+
+    def test_outcomes(
+        self,
+        fs: FakeFilesystem,
+        specs: dict[str, HeaderSpec],
+        mocker: MockerFixture,
+    ) -> None:
+        """Test files that are up to date or have no header are left alone."""
+        fs.create_file(
+            "/src/new.py", contents=header_for("apache", "py", "2024")
+        )
+        fs.create_file("/src/none.py", contents="x = 1\n")
+        fs.create_file("/src/empty.py", contents="")
+        fs.create_file(
+            "/src/odd.py", contents=header_for("apache", "py", "present")
+        )
+        fs.create_file("/src/bad.py")
+        Path("/src/bad.py").write_bytes(
+            header_for("apache", "py", "2020").encode() + b"\xff"
+        )
+        replace = mocker.spy(os, "replace")
+
+        assert update_year("/src/new.py", specs, "2024") == PRESENT
+        assert update_year("/src/none.py", specs, "2024") == MISSING
+        assert update_year("/src/empty.py", specs, "2024") == SKIPPED
+        assert update_year("/src/odd.py", specs, "2024") == SKIPPED
+        assert update_year("/src/notes.txt", specs, "2024") == SKIPPED
+        assert update_year("/src/gone.py", specs, "2024") == ERROR
+        assert update_year("/src/bad.py", specs, "2024") == ERROR
+        replace.assert_not_called()
+
+    def test_update_years_process_pool(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test updating a tree over several processes.
+
+        The worker processes can't see the fake filesystem, so this uses a
+        real temporary folder.
+        """
+        fs.pause()
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                old = header_for("apache", "py", "2023")
+                for index in range(POOL_THRESHOLD):
+                    Path(folder, f"f{index}.py").write_text(f"{old}\nx = 1\n")
+                Path(folder, "notes.csv").write_text("a,b\n")
+
+                results = dict(
+                    update_years(iter_files([folder]), specs, "2024", workers=2)
+                )
+
+                assert sorted(results.values()) == sorted(
+                    [SKIPPED] + [UPDATED] * POOL_THRESHOLD
+                )
+                assert Path(folder, "f7.py").read_text() == (
+                    f"{header_for('apache', 'py', '2023-2024')}\nx = 1\n"
+                )
+        finally:
+            fs.resume()
+
+
+class TestRelicense:
+    """Test swapping the headers of one license for another."""
+
+    @pytest.fixture
+    def relicense_specs(self) -> dict[str, RelicenseSpec]:
+        """Return the specs to change gpl3 or cc_by headers to apache."""
+        return build_relicense_specs(
+            load_compiled_template("apache", header=True),
+            [
+                load_compiled_template(name, header=True)
+                for name in ("gpl3", "cc_by")
+            ],
+        )
+
+    def relicense(
+        self,
+        path: str,
+        specs: dict[str, RelicenseSpec],
+        overrides: Optional[dict[str, str]] = None,
+    ) -> str:
+        """Change the header in a file to apache."""
+        return relicense_file(
+            path,
+            specs,
+            load_compiled_template("apache", header=True),
+            DEFAULTS,
+            overrides or {},
+        )
+
+    def test_values_carried_over(
+        self, fs: FakeFilesystem, relicense_specs: dict[str, RelicenseSpec]
+    ) -> None:
+        """Test the new header keeps the year and holder of the old one."""
+        old = header_for("gpl3", "py", "2019")
+        fs.create_file(
+            "/src/app.py", contents=f"#!/usr/bin/env python\n{old}\nrun()\n"
+        )
+
+        assert self.relicense("/src/app.py", relicense_specs) == REPLACED
+
+        assert Path("/src/app.py").read_text() == (
+            f"#!/usr/bin/env python\n{header_for('apache', 'py', '2019')}"
+            "\nrun()\n"
+        )
+        assert self.relicense("/src/app.py", relicense_specs) == PRESENT
+
+    def test_overrides_and_defaults(
+        self, fs: FakeFilesystem, relicense_specs: dict[str, RelicenseSpec]
+    ) -> None:
+        """Test the values given win, and fill in for empty old values."""
+        compiled = load_compiled_template("cc_by", header=True)
+        old = build_header_specs(
+            compiled, {"project": "lice", "organization": "", "year": "2018"}
+        )["js"].text
+        fs.create_file("/src/app.js", contents=f"{old}\nrun();\n")
+
+        outcome = self.relicense(
+            "/src/app.js", relicense_specs, {"year": "2024"}
+        )
+
+        assert outcome == REPLACED
+        content = Path("/src/app.js").read_text()
+        assert content.startswith("/*\n * Copyright 2024 Default\n")
+        assert content.endswith(" */\n\nrun();\n")
+
+    def test_keeps_crlf(
+        self, fs: FakeFilesystem, relicense_specs: dict[str, RelicenseSpec]
+    ) -> None:
+        """Test the new header uses the line endings of the old one."""
+        old = header_for("gpl3", "c", "2020").replace("\n", "\r\n")
+        fs.create_file("/src/main.c", contents=f"{old}\r\nint x;\r\n")
+
+        assert self.relicense("/src/main.c", relicense_specs) == REPLACED
+
+        content = Path("/src/main.c").read_bytes()
+        assert content == (
+            header_for("apache", "c", "2020").replace("\n", "\r\n").encode()
+            + b"\r\nint x;\r\n"
+        )
+
+    def test_outcomes(
+        self,
+        fs: FakeFilesystem,
+        relicense_specs: dict[str, RelicenseSpec],
+        mocker: MockerFixture,
+    ) -> None:
+        """Test files without one of the old headers are left alone."""
+        fs.create_file("/src/mit.py", contents=header_for("wtfpl", "py", "1"))
+        fs.create_file("/src/none.py", contents="x = 1\n")
+        fs.create_file("/src/empty.py", contents="")
+        fs.create_file("/src/bad.py")
+        Path("/src/bad.py").write_bytes(
+            header_for("gpl3", "py", "2020").encode() + b"\xff"
+        )
+        replace = mocker.spy(os, "replace")
+
+        assert self.relicense("/src/mit.py", relicense_specs) == MISSING
+        assert self.relicense("/src/none.py", relicense_specs) == MISSING
+        assert self.relicense("/src/empty.py", relicense_specs) == SKIPPED
+        assert self.relicense("/src/notes.txt", relicense_specs) == SKIPPED
+        assert self.relicense("/src/gone.py", relicense_specs) == ERROR
+        assert self.relicense("/src/bad.py", relicense_specs) == ERROR
+        replace.assert_not_called()
+
+    def test_relicense_headers_process_pool(
+        self, fs: FakeFilesystem, relicense_specs: dict[str, RelicenseSpec]
+    ) -> None:
+        """Test relicensing a tree over several processes.
+
+        The worker processes can't see the fake filesystem, so this uses a
+        real temporary folder.
+        """
+        fs.pause()
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                old = header_for("gpl3", "py", "2023")
+                for index in range(POOL_THRESHOLD):
+                    Path(folder, f"f{index}.py").write_text(f"{old}\nx = 1\n")
+                Path(folder, "notes.csv").write_text("a,b\n")
+
+                results = dict(
+                    relicense_headers(
+                        iter_files([folder]),
+                        relicense_specs,
+                        load_compiled_template("apache", header=True),
+                        DEFAULTS,
+                        {},
+                        workers=2,
+                    )
+                )
+
+                assert sorted(results.values()) == sorted(
+                    [SKIPPED] + [REPLACED] * POOL_THRESHOLD
+                )
+                assert Path(folder, "f7.py").read_text() == (
+                    f"{header_for('apache', 'py', '2023')}\nx = 1\n"
+                )
+        finally:
+            fs.resume()
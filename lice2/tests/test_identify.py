@@ -0,0 +1,295 @@
+"""Test working out which bundled license a license file holds."""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from lice2.constants import LANG_CMT, LANGS, LICENSES
+from lice2.headers import ERROR, POOL_THRESHOLD
+from lice2.identify import (
+    MAX_FILE_SIZE,
+    UNKNOWN,
+    find_license_files,
+    get_license_index,
+    identify_file,
+    identify_files,
+    identify_text,
+    normalize_text,
+    similar_licenses,
+)
+from lice2.rendering import format_license, load_compiled_template
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from pyfakefs.fake_filesystem import FakeFilesystem
+    from pytest_mock import MockerFixture
+
+CONTEXT = {
+    "year": "2019-2024",
+    "organization": "Awesome Co. and Friends",
+    "project": "my project",
+}
+
+# one language for each comment style
+STYLE_LANGS = sorted({style: lang for lang, style in LANGS.items()}.values())
+
+
+def license_text(
+    license_name: str, lang: str = "", *, legacy: bool = False
+) -> str:
+    """Return the text of a license, commented for the language."""
+    body = load_compiled_template(license_name).render(CONTEXT)
+    return format_license(StringIO(body), lang, legacy=legacy).getvalue()
+
+
+@pytest.fixture
+def fresh_index() -> Iterator[None]:
+    """Build the index again for this test, and after it."""
+    get_license_index.cache_clear()
+    yield
+    get_license_index.cache_clear()
+
+
+class TestIdentifyText:
+    """Test identifying the license from its text."""
+
+    @pytest.mark.parametrize("license_name", LICENSES)
+    def test_every_license_and_style(self, license_name: str) -> None:
+        """Test each license is found whatever comment style it has."""
+        for lang in STYLE_LANGS:
+            assert identify_text(license_text(license_name, lang)) == (
+                license_name
+            ), lang
+        assert identify_text(license_text(license_name, "py", legacy=True)) == (
+            license_name
+        )
+
+    def test_rewrapped(self) -> None:
+        """Test the case and line breaks don't matter."""
+        text = license_text("mit").upper().replace(" ", "\n  ")
+
+        assert identify_text(text) == "mit"
+
+    def test_changed_text_is_unknown(self) -> None:
+        """Test a license with a word changed or added is not identified."""
+        text = license_text("bsd3")
+
+        assert identify_text(text.replace("binary", "compiled")) is None
+        assert identify_text(f"{text}\nExtra clause.\n") is None
+        assert identify_text("") is None
+
+    def test_fortran_marker_only_on_its_own(self) -> None:
+        """Test the 'C' comment marker doesn't strip 'Copyright'."""
+        assert normalize_text("C Copyright 2024\nC\n") == "copyright 2024"
+        assert normalize_text("/* * Copyright */") == "copyright"
+
+    def test_repeated_variable(
+        self, mocker: MockerFixture, fresh_index: None
+    ) -> None:
+        """Test a variable used twice must have the same value both times."""
+        mocker.patch("lice2.identify.LICENSES", ["own", "plain"])
+        mocker.patch(
+            "lice2.identify.get_template_content",
+            {
+                "own": "{{ organization }} owns it.\n"
+                + "Words. " * 40
+                + "Ask {{ organization }} first.\n",
+                "plain": "No variables here.\n",
+            }.get,
+        )
+        words = "Words. " * 40
+
+        assert get_license_index().others == ("own",)
+        assert identify_text(f"Acme owns it. {words}Ask Acme first.") == "own"
+        assert identify_text(f"Acme owns it. {words}Ask Other first.") is None
+        assert identify_text("/* No variables\n * here. */") == "plain"
+
+
+class TestSimilarLicenses:
+    """Test scoring how like each license an edited one is."""
+
+    def test_reworded_clause(self) -> None:
+        """Test a license with a clause reworded is closest to the original."""
+        text = license_text("bsd3").replace(
+            "Neither the name of", "The name of"
+        )
+
+        similar = similar_licenses(text)
+
+        assert identify_text(text) is None
+        assert len(similar) == 3  # noqa: PLR2004
+        assert similar[0][0] == "bsd3"
+        assert 1 > similar[0][1] > similar[1][1] > similar[2][1] > 0
+
+    @pytest.mark.parametrize("license_name", LICENSES)
+    def test_license_most_like_itself(self, license_name: str) -> None:
+        """Test each license commented for a language is most like itself."""
+        similar = similar_licenses(license_text(license_name, "c"), top=1)
+
+        assert [name for name, _ in similar] == [license_name]
+
+    def test_nothing_similar(self) -> None:
+        """Test a text unlike any license, or too short, has no matches."""
+        assert similar_licenses("Do whatever you like with this code.") == []
+        assert similar_licenses("MIT") == []
+
+    def test_half_a_license(self) -> None:
+        """Test a license cut in half is still found, with a lower score."""
+        text = license_text("gpl3")
+
+        similar = similar_licenses(text[: len(text) // 2], top=1)
+
+        assert similar[0][0] == "gpl3"
+        assert similar[0][1] < 0.6  # noqa: PLR2004
+
+    def test_same_in_every_process(self, fs: FakeFilesystem) -> None:
+        """Test the matches don't depend on the hash seed of the process.
+
+        Half of one license and half of another is close to several, so it
+        shows up any change in the signatures. This needs fresh interpreters,
+        so the fake filesystem is paused.
+        """
+        code = (
+            "from lice2.identify import similar_licenses\n"
+            "from lice2.rendering import get_template_content\n"
+            "bsd3 = get_template_content('bsd3')\n"
+            "mit = get_template_content('mit')\n"
+            "text = bsd3[: len(bsd3) // 2] + mit[len(mit) // 2 :]\n"
+            "print(similar_licenses(text, top=4))\n"
+        )
+        fs.pause()
+        try:
+            outputs = {
+                subprocess.run(  # noqa: S603
+                    [sys.executable, "-c", code],
+                    capture_output=True,
+                    check=True,
+                    text=True,
+                    env={**os.environ, "PYTHONHASHSEED": seed},
+                ).stdout
+                for seed in ("0", "1", "2", "3", "4")
+            }
+        finally:
+            fs.resume()
+
+        assert len(outputs) == 1
+        assert "'bsd3'" in outputs.pop()
+
+
+class TestIdentifyFiles:
+    """Test identifying the licenses in files and folders."""
+
+    def test_identify_file(self, fs: FakeFilesystem) -> None:
+        """Test the outcome for licenses, other files and unreadable ones."""
+        fs.create_file("/v/LICENSE", contents=license_text("apache"))
+        fs.create_file("/v/COPYING", contents=b"\xff\xfe not a license")
+        fs.create_file("/v/BIG", st_size=MAX_FILE_SIZE + 1)
+
+        assert identify_file("/v/LICENSE") == ("apache", ())
+        assert identify_file("/v/COPYING") == (UNKNOWN, ())
+        assert identify_file("/v/BIG", top=3) == (UNKNOWN, ())
+        assert identify_file("/v/missing") == (ERROR, ())
+
+    def test_identify_file_similar(self, fs: FakeFilesystem) -> None:
+        """Test the similar licenses are only found for unknown files."""
+        edited = license_text("mit").replace("free of charge", "for a fee")
+        fs.create_file("/v/LICENSE", contents=license_text("mit"))
+        fs.create_file("/v/COPYING", contents=edited)
+
+        exact = identify_file("/v/LICENSE", top=3)
+        found = identify_file("/v/COPYING", top=3)
+
+        assert exact == ("mit", ())
+        assert found.outcome == UNKNOWN
+        assert found.similar[0][0] == "mit"
+        assert identify_file("/v/COPYING") == (UNKNOWN, ())
+
+    def test_find_license_files(self, fs: FakeFilesystem) -> None:
+        """Test folders are searched for files named like a license.
+
+        Source files whose names only start like a license are skipped.
+        """
+        for name in (
+            "a/LICENSE",
+            "a/src/main.py",
+            "b/licence.md",
+            "b/COPYING.LESSER",
+            "b/COPYING3",
+            "b/UNLICENSE",
+            "b/README",
+            "b/license_checker.py",
+            "b/LicenseManager.java",
+            "b/copying_utils.c",
+            "b/LICENSE.py",
+            "b/LICENSE-MIT.txt",
+            "notes.txt",
+        ):
+            fs.create_file(f"/v/{name}")
+
+        found = list(
+            find_license_files(["/v/a", "/v/b", "/v/notes.txt"], use_git=False)
+        )
+
+        assert found == [
+            "/v/a/LICENSE",
+            "/v/b/COPYING.LESSER",
+            "/v/b/COPYING3",
+            "/v/b/LICENSE-MIT.txt",
+            "/v/b/UNLICENSE",
+            "/v/b/licence.md",
+            "/v/notes.txt",
+        ]
+
+    def test_identify_files_process_pool(self, fs: FakeFilesystem) -> None:
+        """Test the work is shared over several processes.
+
+        The worker processes can't see the fake filesystem, so this uses a
+        real temporary folder.
+        """
+        fs.pause()
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                names = [
+                    LICENSES[i % len(LICENSES)] for i in range(POOL_THRESHOLD)
+                ]
+                for index, name in enumerate(names):
+                    Path(folder, f"LICENSE{index}").write_text(
+                        license_text(name, "py"), encoding="utf-8"
+                    )
+
+                results = dict(
+                    identify_files(
+                        find_license_files([folder], use_git=False),
+                        top=2,
+                        workers=2,
+                    )
+                )
+
+                assert results == {
+                    str(Path(folder, f"LICENSE{index}")): (name, ())
+                    for index, name in enumerate(names)
+                }
+        finally:
+            fs.resume()
+
+
+def test_every_comment_style_covered() -> None:
+    """Test there is a language for each comment style in the tests."""
+    assert {LANGS[lang] for lang in STYLE_LANGS} == set(LANG_CMT)
+
+
+def test_bundled_templates_have_fingerprints() -> None:
+    """Test none of the bundled templates has to be checked for every text."""
+    index = get_license_index()
+
+    assert index.others == ()
+    assert len(index.exact) + len(index.patterns) == len(LICENSES)
@@ -3,7 +3,6 @@
 import io
 import json
 import os
-import subprocess
 from io import StringIO
 from pathlib import Path
 from types import SimpleNamespace
@@ -15,9 +14,11 @@ from pyperclip import PyperclipException
 from pytest_mock import MockerFixture
 
 import lice2
+from lice2.build_index import build_index, render_index, write_index
 from lice2.config import check_default_license
-from lice2.constants import LANGS, LICENSES
+from lice2.constants import LANG_CMT, LANGS, LICENSES, get_license_info
 from lice2.helpers import (
+    ListFormat,
     clean_path,
     extract_vars,
     format_license,
@@ -26,16 +27,21 @@ from lice2.helpers import (
     get_context,
     get_lang,
     get_metadata,
+    get_organization,
     get_suffix,
     guess_organization,
+    iter_format_license,
+    iter_lines,
     list_languages,
     list_licenses,
     list_vars,
     load_file_template,
     load_package_template,
+    render_file_template,
     validate_license,
     validate_year,
 )
+from lice2.template import CompiledTemplate, render_lines
 from lice2.tests.conftest import TEMPLATE_FILE
 
 TEMPLATE_PATH = Path(lice2.__file__).parent / "templates"
@@ -68,6 +74,56 @@ class TestLice:
                     == load_package_template(license_name).getvalue()
                 )
 
+    def test_template_index_is_current(self, fs: FakeFilesystem) -> None:
+        """Test the generated template index matches the bundled templates.
+
+        If this fails, run 'python -m lice2.build_index' to regenerate it.
+        """
+        index_file = Path(lice2.__file__).parent / "template_index.py"
+        fs.add_real_file(index_file)
+        index = build_index(TEMPLATE_PATH)
+
+        assert list(index) == LICENSES
+        for license_name, (variables, header, size) in index.items():
+            info = get_license_info(license_name)
+            assert info.name == license_name
+            assert info.variables == variables
+            assert info.header == header
+            assert info.size == size
+        assert render_index(index) == index_file.read_text()
+
+    def test_write_index(self) -> None:
+        """Test the index module is only rewritten when it has changed."""
+        index_file = Path.home() / "template_index.py"
+
+        assert write_index(TEMPLATE_PATH, index_file) is True
+        assert write_index(TEMPLATE_PATH, index_file) is False
+        assert "TEMPLATE_INDEX: dict[str, LicenseInfo] = {" in (
+            index_file.read_text()
+        )
+
+    def test_template_index_values(self) -> None:
+        """Test the index agrees with loading and scanning the templates."""
+        for license_name in LICENSES:
+            template = load_package_template(license_name)
+            info = get_license_info(license_name)
+            assert list(info.variables) == extract_vars(template)
+            assert info.size == len(template.getvalue().encode("utf-8"))
+            header = TEMPLATE_PATH / f"template-{license_name}-header.txt"
+            assert info.header == header.exists()
+
+    def test_list_licenses_uses_index(
+        self, mocker: MockerFixture, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        """Test listing the licenses does not load any template."""
+        mock_load = mocker.patch("lice2.helpers.load_package_template")
+
+        with pytest.raises(typer.Exit):
+            list_licenses()
+
+        mock_load.assert_not_called()
+        assert "organization, year" in capsys.readouterr().out
+
     def test_extract_vars(self) -> None:
         """Test the 'extract_vars' function."""
         template = StringIO()
@@ -97,6 +153,46 @@ class TestLice:
             assert content == generate_license(template, context).getvalue()
             template.close()  # discard memory
 
+    def test_compiled_template(self) -> None:
+        """Test the 'CompiledTemplate' class."""
+        compiled = CompiledTemplate(TEMPLATE_FILE)
+        context = {
+            "year": "1981",
+            "project": "lice",
+            "organization": "Awesome Co.",
+        }
+
+        assert compiled.variables == ("organization", "project", "year")
+        assert compiled.render(context) == (
+            "This is a template file.\n"
+            "Awesome Co. is the organization.\n"
+            "lice is the project.\n"
+            "1981 is the year.\n"
+        )
+        # rendering again must give the same result, the parts are reused
+        assert compiled.render(context) == compiled.render(context)
+
+    def test_compiled_template_edges(self) -> None:
+        """Test templates starting, ending or without any variables."""
+        context = {"year": "1981"}
+        double = CompiledTemplate("(c) {{ year }}{{ year }}")
+
+        assert CompiledTemplate("{{ year }}").render(context) == "1981"
+        assert double.render(context) == "(c) 19811981"
+        assert CompiledTemplate("No {{vars}}").render({}) == "No {{vars}}"
+        assert CompiledTemplate("").render({}) == ""
+
+    def test_compiled_template_missing_context(self) -> None:
+        """Test the first missing variable (sorted) is reported."""
+        compiled = CompiledTemplate(
+            "{{ year }} {{ project }} {{ organization }}"
+        )
+
+        with pytest.raises(
+            ValueError, match="organization is missing from the template"
+        ):
+            compiled.render({"year": "2024"})
+
     def test_license_header(self) -> None:
         """Test the license header is correct."""
         context = {
@@ -190,6 +286,53 @@ class TestLice:
             for var in var_list:
                 assert var in captured.out
 
+    def test_list_licenses_json(
+        self, capsys: pytest.CaptureFixture[str], mocker: MockerFixture
+    ) -> None:
+        """Test listing the licenses as JSON, without reading any templates."""
+        load = mocker.patch("lice2.rendering.load_package_template")
+        with pytest.raises(typer.Exit) as exc:
+            list_licenses(ListFormat.JSON)
+
+        licenses = json.loads(capsys.readouterr().out)
+
+        assert exc.value.exit_code == 0
+        load.assert_not_called()
+        assert [entry["name"] for entry in licenses] == LICENSES
+        for entry in licenses:
+            info = get_license_info(entry["name"])
+            assert entry["variables"] == list(info.variables)
+            assert entry["header"] is info.header
+
+    def test_list_licenses_tsv(
+        self, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        """Test listing the licenses as tab separated lines."""
+        with pytest.raises(typer.Exit):
+            list_licenses(ListFormat.TSV)
+
+        rows = [
+            line.split("\t") for line in capsys.readouterr().out.splitlines()
+        ]
+
+        assert [row[0] for row in rows] == LICENSES
+        for name, variables, header in rows:
+            info = get_license_info(name)
+            assert variables == ",".join(info.variables)
+            assert header == ("true" if info.header else "false")
+
+    def test_list_languages_machine_formats(
+        self, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        """Test listing the languages as JSON and as one per line."""
+        with pytest.raises(typer.Exit):
+            list_languages(ListFormat.JSON)
+        assert json.loads(capsys.readouterr().out) == sorted(LANGS)
+
+        with pytest.raises(typer.Exit):
+            list_languages(ListFormat.TSV)
+        assert capsys.readouterr().out.splitlines() == sorted(LANGS)
+
     def test_get_suffix(self) -> None:
         """Test the 'get_suffix' function."""
         assert get_suffix("file.py") == "py"
@@ -439,6 +582,70 @@ class TestLice:
 
         assert result.getvalue() == expected
 
+    def test_iter_lines(self) -> None:
+        """Test splitting pieces of text into lines."""
+        assert list(iter_lines(["a\nb", "c\n", "", "\nd\ne"])) == [
+            "a\n",
+            "bc\n",
+            "\n",
+            "d\n",
+            "e",
+        ]
+        assert list(iter_lines(["a\r\nb\rc\n"])) == ["a\r\n", "b\rc\n"]
+        assert list(iter_lines([])) == []
+
+    @pytest.mark.parametrize("lang", ["", "py", "c", "html", "lisp"])
+    @pytest.mark.parametrize("legacy", [True, False])
+    def test_iter_format_license(self, lang: str, *, legacy: bool) -> None:
+        """Test streaming gives the same text as 'format_license'."""
+        text = load_package_template("apache").getvalue()
+
+        streamed = "".join(
+            iter_format_license(
+                iter_lines([text[:100], text[100:]]), lang, legacy=legacy
+            )
+        )
+
+        assert (
+            streamed
+            == format_license(StringIO(text), lang, legacy=legacy).getvalue()
+        )
+
+    def test_iter_format_license_bad_lang(self) -> None:
+        """Test an unknown language fails before anything is produced."""
+        with pytest.raises(KeyError):
+            next(iter_format_license(["text\n"], "nope"))
+
+    def test_render_file_template(self, args: SimpleNamespace) -> None:
+        """Test rendering a template file one line at a time."""
+        lines = render_file_template(str(Path.home() / "template.txt"), args)
+
+        assert list(lines) == [
+            "This is a template file.\n",
+            "Awesome Co. is the organization.\n",
+            "my_project is the project.\n",
+            "2024 is the year.\n",
+        ]
+
+    def test_render_file_template_missing_variable(
+        self, fs: FakeFilesystem, args: SimpleNamespace
+    ) -> None:
+        """Test a missing variable is found before any output is made."""
+        fs.create_file("/big.txt", contents="ok\n" * 1000 + "{{ other }}\n")
+
+        with pytest.raises(ValueError, match="other is missing"):
+            render_file_template("/big.txt", args)
+        with pytest.raises(ValueError, match="path does not exist"):
+            render_file_template("/missing.txt", args)
+
+    def test_render_lines_missing_variable(self) -> None:
+        """Test 'render_lines' checks each variable as it goes."""
+        lines = render_lines(["{{ year }}\n", "{{ other }}\n"], {"year": "1"})
+
+        assert next(lines) == "1\n"
+        with pytest.raises(ValueError, match="other is missing"):
+            next(lines)
+
     def test_load_file_template_path_not_found(self) -> None:
         """Test the 'load_file_template' function with a bad path."""
         with pytest.raises(ValueError, match="path does not exist"):
@@ -455,23 +662,29 @@ class TestLice:
         result = guess_organization()
         assert result == "Awesome Co."
 
-    def test_guess_organization_from_git(self, mocker: MockerFixture) -> None:
+    def test_guess_organization_from_git(
+        self, mocker: MockerFixture, fs: FakeFilesystem
+    ) -> None:
         """Test the 'guess_organization' function.
 
-        Testing when the organization is read from git.
+        Testing when the organization is read from the git config file. This
+        must not start a 'git' process to do so.
         """
         # Mock the settings.organization to be None or empty
         mocker.patch("lice2.helpers.settings", organization=None)
-
-        # Mock subprocess.check_output to return a specific git user.name
         mock_subprocess = mocker.patch("subprocess.check_output")
-        mock_subprocess.return_value = b"Mocked Git User"
+
+        fs.create_file(
+            Path.home() / ".gitconfig",
+            contents="[user]\n\tname = Mocked Git User\n",
+        )
 
         # Call the function under test
         result = guess_organization()
 
         # Assert that the function returns the git user.name
         assert result == "Mocked Git User"
+        mock_subprocess.assert_not_called()
 
     def test_guess_organization_from_user(self, mocker: MockerFixture) -> None:
         """Test the 'guess_organization' function.
@@ -482,11 +695,8 @@ class TestLice:
         # Mock the settings.organization to be None or empty
         mocker.patch("lice2.helpers.settings", organization=None)
 
-        # Mock subprocess.check_output to raise a CalledProcessError
-        mock_subprocess = mocker.patch("subprocess.check_output")
-        mock_subprocess.side_effect = subprocess.CalledProcessError(
-            1, "git config --get user.name"
-        )
+        # there is no git config at all in the fake filesystem
+        mocker.patch("lice2.helpers.get_config_value", return_value=None)
 
         # Mock getpass.getuser to return a specific username
         mock_getuser = mocker.patch("getpass.getuser")
@@ -498,6 +708,24 @@ class TestLice:
         # Assert that the function falls back to the username
         assert result == "Mocked User"
 
+    def test_get_organization_is_lazy(
+        self, args: SimpleNamespace, mocker: MockerFixture
+    ) -> None:
+        """Test the organization is only guessed when actually needed."""
+        mock_guess = mocker.patch(
+            "lice2.helpers.guess_organization", return_value="Guessed Co."
+        )
+        args.organization = None
+
+        context = get_context(args, ["year"])
+        assert "organization" not in context
+        mock_guess.assert_not_called()
+
+        context = get_context(args, ["organization", "year"])
+        assert context["organization"] == "Guessed Co."
+        assert get_organization(args) == "Guessed Co."
+        mock_guess.assert_called_once()
+
     def test_bad_default_license(
         self, mocker: MockerFixture, capsys: pytest.CaptureFixture[str]
     ) -> None:
@@ -547,3 +775,26 @@ class TestLice:
         assert json_result["project"] == "my_project"
         assert licenses in captured.out
         assert languages in captured.out
+
+    def test_get_metadata_details(
+        self, args: SimpleNamespace, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        """Test the metadata has the details of each license and language."""
+        with pytest.raises(typer.Exit):
+            get_metadata(args)
+
+        metadata = json.loads(capsys.readouterr().out)
+
+        assert list(metadata["license_info"]) == LICENSES
+        assert metadata["license_info"]["apache"] == {
+            "variables": ["organization", "year"],
+            "header": True,
+            "size": get_license_info("apache").size,
+        }
+        assert metadata["license_info"]["mit"]["header"] is False
+        assert list(metadata["language_info"]) == list(LANGS)
+        assert metadata["language_info"]["py"] == {
+            "comment_style": "unix",
+            "comment": ["", "#", ""],
+        }
+        assert metadata["language_info"]["c"]["comment"] == LANG_CMT["c"]
@@ -0,0 +1,178 @@
+"""Test timing the stages of generating a license."""
+
+from __future__ import annotations
+
+import json
+import pstats
+from io import StringIO
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from typer.testing import CliRunner
+
+from lice2.core import app
+from lice2.profiling import SETTINGS_STAGE, STARTUP_STAGE, Profiler, profiler
+
+if TYPE_CHECKING:
+    import pytest
+    from pyfakefs.fake_filesystem import FakeFilesystem
+    from pytest_mock import MockerFixture
+
+runner = CliRunner()
+
+
+class TestProfiler:
+    """Test the Profiler class itself."""
+
+    def test_stages_add_up(self) -> None:
+        """Test each run of a stage is added to the total for it."""
+        prof = Profiler()
+        for _ in range(3):
+            with prof.stage("render"):
+                _ = [str(n) for n in range(100)]
+
+        results = prof.results()
+
+        assert [stage["name"] for stage in results["stages"]] == ["render"]
+        assert results["stages"][0]["calls"] == 3  # noqa: PLR2004
+        assert results["stages"][0]["time_ms"] > 0
+        assert results["total_ms"] >= results["stages"][0]["time_ms"]
+
+    def test_collect_only_when_reporting(self) -> None:
+        """Test lazy stages are only run to the end if they are reported."""
+        prof = Profiler()
+        lines = iter(["a\n", "b\n"])
+        assert prof.collect("render", lines) is lines
+        assert prof.stages == {}
+
+        prof.configure(table=True)
+        assert prof.collect("render", lines) == ["a\n", "b\n"]
+        assert prof.stages["render"][2] == 1
+
+    def test_startup_excludes_settings(self) -> None:
+        """Test the settings load is not counted in the start up as well."""
+        prof = Profiler()
+        prof.record(SETTINGS_STAGE, 10**9, 0)
+        prof.record("output", 1, 0)
+
+        prof.mark_started(prof.started_ns - 3 * 10**9, prof.started_blocks)
+
+        names = [stage["name"] for stage in prof.results()["stages"]]
+        assert names == [STARTUP_STAGE, SETTINGS_STAGE, "output"]
+        startup = prof.stages[STARTUP_STAGE][0]
+        assert 2 * 10**9 <= startup < 3 * 10**9
+
+    def test_net_live_blocks(self) -> None:
+        """Test the blocks are the net change, not the allocations made."""
+        prof = Profiler()
+        kept = [object() for _ in range(10_000)]
+        with prof.stage("freed"):
+            _ = [object() for _ in range(10_000)]
+            del _
+            kept.clear()
+
+        assert prof.results()["stages"][0]["net_blocks"] < 0
+
+    def test_table(self) -> None:
+        """Test the table has a row for each stage and the total."""
+        prof = Profiler()
+        with prof.stage("template load"):
+            pass
+        out = StringIO()
+
+        prof.write_table(out)
+
+        rows = out.getvalue().splitlines()
+        assert rows[1].split()[0] == "stage"
+        assert rows[1].endswith("net live blocks")
+        assert rows[2].startswith("template load")
+        assert rows[3].startswith("total")
+
+    def test_report_files(self, fs: FakeFilesystem) -> None:
+        """Test the JSON and pstats files are written, then it all resets."""
+        fs.create_dir("/out")
+        prof = Profiler()
+        prof.configure(
+            json_path="/out/profile.json", pstats_path="/out/run.pstats"
+        )
+        with prof.stage("render"):
+            _ = sorted(range(1000), reverse=True)
+
+        prof.report()
+
+        data = json.loads(Path("/out/profile.json").read_text())
+        assert data["stages"][0]["name"] == "render"
+        stats = pstats.Stats("/out/run.pstats").get_stats_profile()
+        assert stats.func_profiles
+        assert not prof.enabled
+        assert prof.stages == {}
+
+    def test_report_write_error(
+        self, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        """Test failing to write the JSON file is not an error."""
+        prof = Profiler()
+        prof.configure(json_path="/missing/profile.json")
+
+        prof.report()
+
+        assert "Could not write the profile" in capsys.readouterr().err
+
+
+class TestProfileOptions:
+    """Test the '--profile' options of the command line.
+
+    The stages from earlier runs are cleared first, as the profiler is shared
+    by the whole process.
+    """
+
+    def setup_method(self) -> None:
+        """Clear the stages recorded by earlier tests."""
+        profiler.reset()
+
+    def test_profile_table(self, mocker: MockerFixture) -> None:
+        """Test '--profile' shows every stage of generating a license."""
+        mocker.patch("lice2.helpers.guess_organization", return_value="Me")
+        report = mocker.spy(profiler, "write_table")
+
+        result = runner.invoke(app, ["apache", "--profile", "-l", "py"])
+
+        assert result.exit_code == 0
+        assert result.stdout.startswith("#")
+        report.assert_called_once()
+        names = [line.split("  ")[0] for line in result.stderr.splitlines()]
+        assert names[2:] == [
+            STARTUP_STAGE,
+            "template load",
+            "organization guess",
+            "render",
+            "format",
+            "output",
+            "total",
+        ]
+        assert not profiler.enabled
+
+    def test_profile_json_header(self, fs: FakeFilesystem) -> None:
+        """Test the stages are written to JSON, even for a header."""
+        fs.create_dir("/out")
+        result = runner.invoke(
+            app,
+            ["apache", "--header", "--org", "Me"],
+            env={"LICE_PROFILE_JSON": "/out/profile.json"},
+        )
+
+        assert result.exit_code == 0
+        data = json.loads(Path("/out/profile.json").read_text())
+        names = {stage["name"] for stage in data["stages"]}
+        assert {"template load", "render", "format", "output"} <= names
+        assert "organization guess" not in names
+
+    def test_not_reported_by_default(self, mocker: MockerFixture) -> None:
+        """Test nothing is reported and the output is streamed as usual."""
+        report = mocker.spy(profiler, "report")
+
+        result = runner.invoke(app, ["mit", "--org", "Me"])
+
+        assert result.exit_code == 0
+        assert result.stderr == ""
+        report.assert_not_called()
@@ -0,0 +1,227 @@
+"""Test the cache of header verdicts kept between runs."""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from lice2 import headers
+from lice2.headers import (
+    INSERTED,
+    MISSING,
+    PRESENT,
+    SKIPPED,
+    HeaderSpec,
+    apply_headers,
+    build_header_specs,
+    check_headers,
+)
+from lice2.helpers import load_compiled_template
+from lice2.scan_cache import (
+    RACY_WINDOW_NS,
+    ScanCache,
+    get_cache_file,
+    get_cache_folder,
+    specs_signature,
+    stat_file,
+)
+
+if TYPE_CHECKING:
+    from pyfakefs.fake_filesystem import FakeFilesystem
+    from pytest_mock import MockerFixture
+
+CONTEXT = {"year": "2024", "organization": "Awesome Co.", "project": "lice"}
+CACHE_FILE = Path("/cache/scan.json")
+
+
+def make_specs(license_name: str) -> dict[str, HeaderSpec]:
+    """Return the header specs for a license."""
+    return build_header_specs(
+        load_compiled_template(license_name, header=True), CONTEXT
+    )
+
+
+def age(*paths: str) -> None:
+    """Move the modification time of the files back out of the racy window."""
+    for path in paths:
+        stat = os.stat(path)  # noqa: PTH116
+        old = stat.st_mtime_ns - 2 * RACY_WINDOW_NS
+        os.utime(path, ns=(old, old))
+
+
+@pytest.fixture
+def specs() -> dict[str, HeaderSpec]:
+    """Return the header specs for the Apache license."""
+    return make_specs("apache")
+
+
+class TestScanCache:
+    """Test the ScanCache class itself."""
+
+    def test_cache_file_location(self, mocker: MockerFixture) -> None:
+        """Test the cache lives in the XDG cache folder, one per folder."""
+        mocker.patch.dict(os.environ, {"XDG_CACHE_HOME": "/xdg"})
+        assert get_cache_folder() == Path("/xdg/lice")
+        assert get_cache_file("/a").parent == Path("/xdg/lice")
+        assert get_cache_file("/a") != get_cache_file("/b")
+
+        mocker.patch.dict(os.environ, {"XDG_CACHE_HOME": ""})
+        assert get_cache_folder() == Path.home() / ".cache/lice"
+
+    def test_round_trip(self, fs: FakeFilesystem) -> None:
+        """Test verdicts are saved and only reused for unchanged files."""
+        fs.create_file("/src/a.py", contents="x = 1\n")
+        age("/src/a.py")
+        stat = stat_file("/src/a.py")
+
+        cache = ScanCache(CACHE_FILE, "sig")
+        cache.record("/src/a.py", stat, PRESENT)
+        cache.save()
+
+        cache = ScanCache(CACHE_FILE, "sig")
+        assert cache.lookup("/src/a.py", stat) == PRESENT
+        assert cache.lookup("/src/b.py", stat) is None
+        assert cache.lookup("/src/a.py", None) is None
+        assert stat_file("/src/b.py") is None
+
+        Path("/src/a.py").write_text("x = 12\n")
+        assert cache.lookup("/src/a.py", stat_file("/src/a.py")) is None
+
+        assert ScanCache(CACHE_FILE, "other").lookup("/src/a.py", stat) is None
+
+    def test_racy_files_not_kept(self, fs: FakeFilesystem) -> None:
+        """Test files changed just before the run are not remembered."""
+        fs.create_file("/src/a.py", contents="x = 1\n")
+
+        cache = ScanCache(CACHE_FILE, "sig")
+        cache.record("/src/a.py", stat_file("/src/a.py"), PRESENT)
+
+        assert not cache.changed
+        assert cache.lookup("/src/a.py", stat_file("/src/a.py")) is None
+
+    def test_unchanged_cache_not_saved(self) -> None:
+        """Test nothing is written if there were no changes."""
+        ScanCache(CACHE_FILE, "sig").save()
+
+        assert not CACHE_FILE.exists()
+
+    def test_bad_cache_file_ignored(self, fs: FakeFilesystem) -> None:
+        """Test a broken cache file is treated as empty."""
+        fs.create_file(CACHE_FILE, contents="{not json")
+
+        assert ScanCache(CACHE_FILE, "sig").files == {}
+
+    def test_save_errors_ignored(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test failing to save the cache is not an error."""
+        fs.create_file("/src/a.py", contents="x = 1\n")
+        age("/src/a.py")
+        cache = ScanCache(CACHE_FILE, "sig")
+        cache.record("/src/a.py", stat_file("/src/a.py"), PRESENT)
+
+        mocker.patch("lice2.scan_cache.json.dump", side_effect=OSError)
+        cache.save()
+
+        assert cache.changed
+        assert list(CACHE_FILE.parent.iterdir()) == []
+
+        fs.create_file("/blocked")
+        cache.path = Path("/blocked/scan.json")
+        cache.save()
+
+        assert cache.changed
+
+    def test_signature(self, specs: dict[str, HeaderSpec]) -> None:
+        """Test the signature changes with the license but not the values."""
+        other_values = build_header_specs(
+            load_compiled_template("apache", header=True),
+            {"year": "1999", "organization": "Other", "project": "x"},
+        )
+
+        assert specs_signature(specs) == specs_signature(other_values)
+        assert specs_signature(specs) != specs_signature(make_specs("gpl3"))
+        legacy = build_header_specs(
+            load_compiled_template("apache", header=True), CONTEXT, legacy=True
+        )
+        assert specs_signature(specs) != specs_signature(legacy)
+
+
+class TestCachedScans:
+    """Test the tree commands reuse the cached verdicts."""
+
+    def test_unchanged_files_not_opened(
+        self,
+        fs: FakeFilesystem,
+        specs: dict[str, HeaderSpec],
+        mocker: MockerFixture,
+    ) -> None:
+        """Test a warm run only opens the files that changed."""
+        fs.create_file("/src/a.py", contents=specs["py"].text + "\nx = 1\n")
+        fs.create_file("/src/b.py", contents="y = 2\n")
+        fs.create_file("/src/c.py", contents="")
+        age("/src/a.py", "/src/b.py", "/src/c.py")
+        paths = ["/src/a.py", "/src/b.py", "/src/c.py"]
+        signature = specs_signature(specs)
+
+        cache = ScanCache(CACHE_FILE, signature)
+        results = dict(check_headers(paths, specs, workers=1, cache=cache))
+        cache.save()
+        assert results == {
+            "/src/a.py": PRESENT,
+            "/src/b.py": MISSING,
+            "/src/c.py": SKIPPED,
+        }
+
+        spy = mocker.spy(headers, "process_file")
+        cache = ScanCache(CACHE_FILE, signature)
+        warm = dict(check_headers(paths, specs, workers=1, cache=cache))
+        assert warm == results
+        spy.assert_not_called()
+
+        Path("/src/a.py").write_text("changed\n")
+        cache = ScanCache(CACHE_FILE, signature)
+        warm = dict(check_headers(paths, specs, workers=1, cache=cache))
+        assert warm["/src/a.py"] == MISSING
+        spy.assert_called_once()
+        assert spy.call_args.args[0] == "/src/a.py"
+
+    def test_apply_still_inserts_missing(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test a cached MISSING verdict doesn't stop a header being added."""
+        fs.create_file("/src/b.py", contents="y = 2\n")
+        age("/src/b.py")
+        signature = specs_signature(specs)
+
+        cache = ScanCache(CACHE_FILE, signature)
+        list(check_headers(["/src/b.py"], specs, workers=1, cache=cache))
+        cache.save()
+
+        cache = ScanCache(CACHE_FILE, signature)
+        results = dict(apply_headers(["/src/b.py"], specs, cache=cache))
+        assert results == {"/src/b.py": INSERTED}
+        # the file was just written, so it is dropped from the cache
+        assert "/src/b.py" not in cache.files
+
+    def test_other_license_rescans(
+        self, fs: FakeFilesystem, specs: dict[str, HeaderSpec]
+    ) -> None:
+        """Test verdicts for one license are not used for another."""
+        fs.create_file("/src/a.py", contents=specs["py"].text + "\nx = 1\n")
+        age("/src/a.py")
+
+        cache = ScanCache(CACHE_FILE, specs_signature(specs))
+        list(check_headers(["/src/a.py"], specs, workers=1, cache=cache))
+        cache.save()
+
+        gpl3 = make_specs("gpl3")
+        cache = ScanCache(CACHE_FILE, specs_signature(gpl3))
+        results = dict(check_headers(["/src/a.py"], gpl3, cache=cache))
+        assert results == {"/src/a.py": MISSING}
+        saved = json.loads(CACHE_FILE.read_text())
+        assert saved["signature"] == specs_signature(specs)
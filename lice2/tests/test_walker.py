@@ -0,0 +1,143 @@
+"""Test finding the source files for the tree-wide commands."""
+
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from lice2.walker import get_extension, git_files, iter_files
+
+if TYPE_CHECKING:
+    from pyfakefs.fake_filesystem import FakeFilesystem
+    from pytest_mock import MockerFixture
+
+
+def ls_files_result(
+    stdout: bytes, returncode: int = 0
+) -> subprocess.CompletedProcess[bytes]:
+    """Return a fake result of running 'git ls-files'."""
+    return subprocess.CompletedProcess([], returncode, stdout, b"")
+
+
+class TestWalker:
+    """Test walking the folders ourselves."""
+
+    def test_iter_files(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test walking skips linked folders and ones that can't be read."""
+        fs.create_file("/proj/b/one.py")
+        fs.create_file("/proj/a.py")
+        fs.create_file("/proj/.git/config")
+        fs.create_symlink("/proj/link", "/proj/b")
+        fs.create_symlink("/proj/file-link.py", "/proj/a.py")
+
+        assert list(iter_files(["/proj/", "/other.py"], use_git=False)) == [
+            "/proj/a.py",
+            "/proj/b/one.py",
+            "/proj/file-link.py",
+            "/other.py",
+        ]
+
+        mocker.patch("lice2.walker.os.scandir", side_effect=PermissionError)
+        assert list(iter_files(["/proj"], use_git=False)) == []
+
+    def test_overlapping_paths(self, fs: FakeFilesystem) -> None:
+        """Test a file found through more than one of the paths is kept once."""
+        fs.create_file("/proj/src/a.py")
+        fs.create_file("/proj/src/b.py")
+        fs.create_file("/proj/c.py")
+        os.chdir("/proj")
+
+        found = iter_files(
+            ["src", "src/a.py", ".", "./src/../c.py", "/proj/src/b.py"],
+            use_git=False,
+        )
+
+        assert list(found) == ["src/a.py", "src/b.py", "./c.py"]
+
+    def test_get_extension(self) -> None:
+        """Test the 'get_extension' function."""
+        assert get_extension("/a/b.c/file.py") == "py"
+        assert get_extension("/a/b.c/Makefile") == ""
+        assert get_extension("/a/.bashrc") == ""
+        assert get_extension("archive.tar.gz") == "gz"
+        assert get_extension("/a/..py") == ""
+        assert get_extension("/a/b..py") == "py"
+
+
+class TestGitFiles:
+    """Test listing the files with git."""
+
+    def test_git_files(self, fs: FakeFilesystem, mocker: MockerFixture) -> None:
+        """Test deleted files are dropped and the rest sorted."""
+        fs.create_dir("/proj")
+        mock_run = mocker.patch(
+            "lice2.walker.subprocess.run",
+            return_value=ls_files_result(
+                b"H src/b.py\0H a.py\0R gone.py\0H gone.py\0? new.py\0"
+            ),
+        )
+
+        assert list(iter_files(["/proj"])) == [
+            "/proj/a.py",
+            "/proj/new.py",
+            "/proj/src/b.py",
+        ]
+        assert mock_run.call_args.args[0][:3] == ["git", "-C", "/proj"]
+
+    def test_fallback_outside_repo(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test the folders are walked if git fails or isn't installed."""
+        fs.create_file("/proj/a.py")
+        mock_run = mocker.patch(
+            "lice2.walker.subprocess.run",
+            return_value=ls_files_result(b"", returncode=128),
+        )
+        assert list(iter_files(["/proj"])) == ["/proj/a.py"]
+
+        mock_run.side_effect = FileNotFoundError
+        assert git_files("/proj") is None
+        assert list(iter_files(["/proj"])) == ["/proj/a.py"]
+
+    @pytest.mark.skipif(shutil.which("git") is None, reason="needs git")
+    def test_real_repository(self, fs: FakeFilesystem) -> None:
+        """Test ignored and deleted files are skipped in a real repository.
+
+        Git can't see the fake filesystem, so this uses a real temporary
+        folder.
+        """
+        fs.pause()
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                subprocess.run(  # noqa: S603
+                    ["git", "init", "-q", folder],  # noqa: S607
+                    check=True,
+                )
+                root = Path(folder)
+                (root / ".gitignore").write_text("node_modules/\n*.log\n")
+                (root / "node_modules/pkg").mkdir(parents=True)
+                (root / "node_modules/pkg/index.js").write_text("x\n")
+                (root / "src").mkdir()
+                (root / "src/app.js").write_text("x\n")
+                (root / "debug.log").write_text("x\n")
+                (root / "old.js").write_text("x\n")
+                subprocess.run(  # noqa: S603
+                    ["git", "-C", folder, "add", "old.js"],  # noqa: S607
+                    check=True,
+                )
+                (root / "old.js").unlink()
+
+                assert git_files(folder) == [
+                    f"{folder}/.gitignore",
+                    f"{folder}/src/app.js",
+                ]
+        finally:
+            fs.resume()
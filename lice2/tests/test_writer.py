@@ -0,0 +1,166 @@
+"""Test writing output files atomically and only when they change."""
+
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from lice2.writer import atomic_write, same_content, write_if_changed
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from pyfakefs.fake_filesystem import FakeFilesystem
+    from pytest_mock import MockerFixture
+
+
+class TestWriter:
+    """Test the functions in the 'writer' module."""
+
+    def test_same_content(self, fs: FakeFilesystem) -> None:
+        """Test files are compared by size, then by their content."""
+        fs.create_file("/out/LICENSE", contents="same\n")
+        path = Path("/out/LICENSE")
+
+        assert same_content(path, b"same\n")
+        assert not same_content(path, b"diff\n")
+        assert not same_content(path, b"longer\n")
+        assert not same_content(Path("/out/missing"), b"same\n")
+
+    def test_size_checked_first(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test a file of a different size is not opened at all."""
+        fs.create_file("/out/LICENSE", contents="short\n")
+        opened = mocker.spy(Path, "open")
+
+        assert not same_content(Path("/out/LICENSE"), b"much longer\n")
+        opened.assert_not_called()
+
+    def test_write_if_changed(self, fs: FakeFilesystem) -> None:
+        """Test a file is only written if its content is different."""
+        fs.create_file("/out/LICENSE", contents="old\n")
+        path = Path("/out/LICENSE")
+        os.utime(path, ns=(1, 1))
+
+        assert write_if_changed(path, b"old\n") is False
+        assert path.stat().st_mtime_ns == 1
+
+        assert write_if_changed(path, b"new\n") is True
+        assert path.read_bytes() == b"new\n"
+        assert write_if_changed(Path("/out/NEW"), b"x") is True
+        assert sorted(p.name for p in Path("/out").iterdir()) == [
+            "LICENSE",
+            "NEW",
+        ]
+
+    def test_write_chunks_if_changed(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test chunks the same as the file are streamed, then thrown away."""
+        fs.create_file("/out/LICENSE", contents="old text\n")
+        path = Path("/out/LICENSE")
+        os.utime(path, ns=(1, 1))
+        replace = mocker.spy(os, "replace")
+
+        assert write_if_changed(path, iter([b"old", b" text\n"])) is False
+        assert path.stat().st_mtime_ns == 1
+        replace.assert_not_called()
+        assert [p.name for p in Path("/out").iterdir()] == ["LICENSE"]
+
+        assert write_if_changed(path, iter([b"old", b" text"])) is True
+        assert path.read_bytes() == b"old text"
+        assert write_if_changed(Path("/out/NEW"), iter([b"x"])) is True
+        assert Path("/out/NEW").read_bytes() == b"x"
+
+    def test_synced_before_replace(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test the temporary file is on disk before it replaces the file."""
+        fs.create_file("/out/LICENSE", contents="old\n")
+        calls = mocker.Mock()
+        mocker.patch("os.fsync", side_effect=lambda _: calls("fsync"))
+        real_replace = os.replace
+        mocker.patch(
+            "os.replace",
+            side_effect=lambda *args: (calls("replace"), real_replace(*args)),
+        )
+
+        atomic_write(Path("/out/LICENSE"), b"new\n")
+
+        assert [c.args[0] for c in calls.call_args_list] == [
+            "fsync",
+            "replace",
+        ]
+
+    def test_keeps_permissions(self, fs: FakeFilesystem) -> None:
+        """Test a replaced file keeps its mode, and a new one gets the usual.
+
+        The fake filesystem ignores the umask for 'os.open', so this uses a
+        real folder.
+        """
+        fs.pause()
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                script = Path(folder, "run.sh")
+                script.write_bytes(b"old\n")
+                script.chmod(0o750)
+                plain = Path(folder, "plain")
+                plain.write_bytes(b"")
+
+                atomic_write(script, b"new\n")
+                atomic_write(Path(folder, "LICENSE"), b"new\n")
+
+                assert script.stat().st_mode & 0o777 == 0o750  # noqa: PLR2004
+                assert (
+                    Path(folder, "LICENSE").stat().st_mode
+                    == plain.stat().st_mode
+                )
+        finally:
+            fs.resume()
+
+    def test_follows_symlink(self, fs: FakeFilesystem) -> None:
+        """Test the target of a symlink is replaced, not the link itself."""
+        fs.create_file("/shared/LICENSE", contents="old\n")
+        fs.create_symlink("/out/LICENSE", "/shared/LICENSE")
+
+        atomic_write(Path("/out/LICENSE"), b"new\n")
+
+        assert Path("/out/LICENSE").is_symlink()
+        assert Path("/shared/LICENSE").read_bytes() == b"new\n"
+
+    def test_failed_write_keeps_original(
+        self, fs: FakeFilesystem, mocker: MockerFixture
+    ) -> None:
+        """Test the original is untouched and no temporary file is left."""
+        fs.create_file("/out/LICENSE", contents="old\n")
+        mocker.patch("os.replace", side_effect=OSError("disk full"))
+
+        with pytest.raises(OSError, match="disk full"):
+            atomic_write(Path("/out/LICENSE"), b"new\n")
+
+        assert Path("/out/LICENSE").read_bytes() == b"old\n"
+        assert [p.name for p in Path("/out").iterdir()] == ["LICENSE"]
+
+    def test_write_chunks(self, fs: FakeFilesystem) -> None:
+        """Test the data can be given as chunks, and a failure part way."""
+        fs.create_file("/out/LICENSE", contents="old\n")
+
+        atomic_write(Path("/out/LICENSE"), iter([b"new", b" ", b"text\n"]))
+
+        assert Path("/out/LICENSE").read_bytes() == b"new text\n"
+
+        def failing() -> Iterator[bytes]:
+            yield b"partial"
+            message = "read failed"
+            raise OSError(message)
+
+        with pytest.raises(OSError, match="read failed"):
+            atomic_write(Path("/out/LICENSE"), failing())
+
+        assert Path("/out/LICENSE").read_bytes() == b"new text\n"
+        assert [p.name for p in Path("/out").iterdir()] == ["LICENSE"]
@@ -0,0 +1,134 @@
+"""Find the source files to work on for the tree-wide commands.
+
+Inside a git repository the files are listed by a single 'git ls-files' call,
+which is much faster than walking the folders and respects '.gitignore', so
+'node_modules', build output and the like are never even looked at. Anywhere
+else we fall back to walking the folders ourselves.
+
+We deliberately use plain 'os' functions and string paths here rather than
+'pathlib', as this can be run over hundreds of thousands of files and the
+'Path' objects add a lot of overhead at that scale.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+from operator import attrgetter
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+# version control folders are never worth looking into
+IGNORED_DIRS = frozenset({".git", ".hg", ".svn"})
+
+# tracked and untracked files that are not ignored, along with the tracked
+# files that have been deleted. With '-t' each path is tagged, so we can tell
+# the deleted ones ('R') apart from the rest
+GIT_LS_FILES = (
+    "ls-files",
+    "-z",
+    "-t",
+    "--cached",
+    "--deleted",
+    "--others",
+    "--exclude-standard",
+)
+
+
+def get_extension(path: str) -> str:
+    """Return the extension of a file name without the dot, or ''.
+
+    Names that only start with a dot, such as '.bashrc', have no extension.
+    """
+    head, dot, ext = path.rpartition(".")
+    if not dot or "/" in ext or os.sep in ext:
+        return ""
+    # this is only slow for the rare names with a dot just before the
+    # extension, where we have to check the name isn't just dots
+    if head[-1:] in {"", "/", os.sep} or (
+        head[-1] == "." and not os.path.basename(head).strip(".")  # noqa: PTH119
+    ):
+        return ""
+    return ext
+
+
+def _walk(folder: str) -> Iterator[str]:
+    """Yield the files in a folder and its sub-folders, sorted by name."""
+    try:
+        with os.scandir(folder) as scan:
+            entries = sorted(scan, key=attrgetter("name"))
+    except OSError:
+        return
+    prefix = folder if folder.endswith(os.sep) else folder + os.sep
+    for entry in entries:
+        if entry.is_dir():
+            # like 'os.walk', don't follow links to other folders
+            if entry.name not in IGNORED_DIRS and not entry.is_symlink():
+                yield from _walk(prefix + entry.name)
+        else:
+            yield prefix + entry.name
+
+
+def git_files(folder: str) -> Optional[list[str]]:
+    """Return the files git knows about under a folder, sorted by name.
+
+    This is every tracked file that still exists, along with any untracked
+    files that are not ignored. Returns None if the folder is not in a git
+    repository, or git is not installed.
+    """
+    try:
+        result = subprocess.run(  # noqa: S603
+            ["git", "-C", folder, *GIT_LS_FILES],  # noqa: S607
+            capture_output=True,
+            check=False,
+        )
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+
+    deleted: set[bytes] = set()
+    found: set[bytes] = set()
+    for entry in result.stdout.split(b"\0"):
+        if entry[:2] == b"R ":
+            deleted.add(entry[2:])
+        elif entry:
+            found.add(entry[2:])
+
+    prefix = folder if folder.endswith(os.sep) else folder + os.sep
+    names = sorted(os.fsdecode(name) for name in found - deleted)
+    if os.sep != "/":  # pragma: no cover
+        names = [name.replace("/", os.sep) for name in names]
+    return [prefix + name for name in names]
+
+
+def _iter_path(path: str, *, use_git: bool) -> Iterable[str]:
+    """Return the files under one path, see 'iter_files'."""
+    if not os.path.isdir(path):  # noqa: PTH112
+        return [path]
+    files = git_files(path) if use_git else None
+    return _walk(path) if files is None else files
+
+
+def iter_files(paths: Iterable[str], *, use_git: bool = True) -> Iterator[str]:
+    """Yield every file under the given paths once, in a stable order.
+
+    Paths that are files are yielded as-is. For folders in a git repository
+    we use the files git knows about if 'use_git' is set, otherwise the
+    folders are walked recursively skipping any version control folders.
+
+    Paths that overlap, such as 'src' and 'src/a.py', would find some files
+    twice, so a file is skipped if it has already been yielded under the same
+    or another spelling of its path. Links are not followed for this.
+    """
+    cwd = os.getcwd()  # noqa: PTH109
+    seen: set[str] = set()
+    for path in paths:
+        for found in _iter_path(path, use_git=use_git):
+            # joining returns 'found' itself if it is already absolute
+            key = os.path.normpath(os.path.join(cwd, found))  # noqa: PTH118
+            if key not in seen:
+                seen.add(key)
+                yield found
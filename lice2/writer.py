@@ -0,0 +1,132 @@
+"""Write output files atomically, leaving them alone if nothing has changed.
+
+Rewriting a file with the same content still bumps its modification time,
+which makes build tools such as Make or Bazel think it has changed. So the
+file on disk is compared first, by size and then by a hash of its content,
+and only written if it is different.
+
+When it is written, it goes to a temporary file in the same folder which is
+flushed to disk and then replaces the original in one step with 'os.replace'.
+A run that is interrupted can then never leave a half written file behind.
+
+Output that arrives in chunks is streamed into the temporary file and hashed
+on the way, then the temporary file is thrown away if the original already
+held the same content.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import secrets
+import stat
+from typing import TYPE_CHECKING, Optional, Union
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+# how much of the existing file to read at a time when hashing it
+CHUNK_SIZE = 64 * 1024
+
+
+def _matches(path: Path, size: int, digest: bytes) -> bool:
+    """Return True if the file at 'path' has this size and SHA-256 digest.
+
+    The size is checked first, so a file that has changed length is never
+    read. A missing file never matches.
+    """
+    try:
+        if path.stat().st_size != size:
+            return False
+        file_digest = hashlib.sha256()
+        with path.open("rb", buffering=0) as infile:
+            while chunk := infile.read(CHUNK_SIZE):
+                file_digest.update(chunk)
+    except OSError:
+        return False
+    return file_digest.digest() == digest
+
+
+def same_content(path: Path, data: bytes) -> bool:
+    """Return True if the file at 'path' holds exactly 'data'.
+
+    The size is checked first, so a file that has changed length is never
+    read. A missing file is never the same.
+    """
+    return _matches(path, len(data), hashlib.sha256(data).digest())
+
+
+def atomic_write(
+    path: Path,
+    data: Union[bytes, Iterable[bytes]],
+    *,
+    if_changed: bool = False,
+) -> bool:
+    """Replace the file at 'path' with 'data' in a single step.
+
+    'data' can be an iterable of chunks, so a large file can be written
+    without all of it being held in memory. With 'if_changed', the chunks
+    are hashed as they are written, and the file is left untouched if it
+    already holds the same content.
+
+    An existing file keeps its permissions, and a new one gets the usual
+    permissions allowed by the umask. If 'path' is a symlink, the file it
+    points to is replaced rather than the link.
+
+    Returns True if the file was written, or False if it was left untouched.
+
+    Raises:
+        OSError: If the file could not be written. The original is left as
+            it was.
+    """
+    if path.is_symlink():
+        path = path.resolve()
+    try:
+        mode: Optional[int] = stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        mode = None
+
+    chunks = [data] if isinstance(data, bytes) else data
+    digest = hashlib.sha256()
+    size = 0
+    temp = path.with_name(f".{path.name}.{secrets.token_hex(4)}.tmp")
+    # created like 'open' would, so the umask applies to a new file
+    fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as outfile:
+            for chunk in chunks:
+                outfile.write(chunk)
+                if if_changed:
+                    digest.update(chunk)
+                    size += len(chunk)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        if if_changed and _matches(path, size, digest.digest()):
+            temp.unlink()
+            return False
+        if mode is not None:
+            temp.chmod(mode)
+        os.replace(temp, path)  # noqa: PTH105
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+    return True
+
+
+def write_if_changed(path: Path, data: Union[bytes, Iterable[bytes]]) -> bool:
+    """Atomically write 'data' to 'path', unless it already holds it.
+
+    'data' in memory is compared before anything is written. Chunks are
+    streamed to a temporary file first, which is only kept if it differs.
+
+    Returns True if the file was written, or False if it was left untouched.
+
+    Raises:
+        OSError: If the file could not be written.
+    """
+    if not isinstance(data, bytes):
+        return atomic_write(path, data, if_changed=True)
+    if same_content(path, data):
+        return False
+    return atomic_write(path, data)